@@ -5,6 +5,7 @@ from pydantic import BaseModel, Field, model_validator
 
 from app.llm import LLM
 from app.schema import Memory, Message
+from app.tracing import tracer
 
 
 class BaseAgent(BaseModel, ABC):
@@ -54,11 +55,12 @@ class BaseAgent(BaseModel, ABC):
 
         Can be extended to include more complex logic, e.g. workflow loops.
         """
-        # Add request to memory first
-        if request:
-            self.update_memory("user", request)
+        with tracer.span("agent.run", agent=self.name):
+            # Add request to memory first
+            if request:
+                self.update_memory("user", request)
 
-        step_result = self.step()
+            step_result = self.step()
 
         return step_result
 
@@ -1,10 +1,14 @@
 from typing import Optional, Dict, Any, List, Union, cast
 
+from pydantic import model_validator
+
 from app.logger import logger
 from app.agents.base import BaseAgent
+from app.config import config
 from app.prompts.agent_prompts import PROMPTS
 from app.prompts.db_info import DB_INFO
 from app.schema import Message
+from app.tools.schema_catalog import load_schema_catalog
 
 
 class DbInfoAgent(BaseAgent):
@@ -20,6 +24,18 @@ including table names and field descriptions. Please answer user questions about
 
     # Table description containing database schema information
     table_description: str = str(DB_INFO["DB_INFO"])
+    # Schema artifact to describe the tables from, None uses [schema] artifact_path
+    schema_artifact: Optional[str] = None
+
+    @model_validator(mode="after")  # type: ignore
+    def load_schema_artifact(self) -> "DbInfoAgent":
+        """Describe the tables of the schema artifact, if any."""
+        path = self.schema_artifact or config.schema_artifact.artifact_path
+        if path and "table_description" not in self.model_fields_set:
+            self.table_description = load_schema_catalog(path).render_db_info(
+                "full", config.schema_artifact.token_budget
+            )
+        return self
 
     def step(self) -> str:
         """Execute a single step to answer database questions."""
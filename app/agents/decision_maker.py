@@ -7,6 +7,7 @@ from app.agents.db_info_agent import DbInfoAgent
 from app.agents.sql_agent import SQLAgent
 from app.schema import Message, Memory
 from app.prompts.agent_prompts import PROMPTS
+from app.tracing import tracer
 
 
 class DecisionMaker(BaseAgent):
@@ -106,10 +107,13 @@ Make decisions based on the nature of the request and the capabilities of availa
 
         # Get and summarize the query
         user_query = last_message.content
-        summarized_query = self.summarize_queries(user_query)
+        with tracer.span("decision_maker.summarize"):
+            summarized_query = self.summarize_queries(user_query)
 
         # Assign to a worker
-        assigned_worker = self.assign_worker(summarized_query)
+        with tracer.span("decision_maker.route") as span:
+            assigned_worker = self.assign_worker(summarized_query)
+            span.set_attribute("worker", assigned_worker.strip())
 
         # Process based on assigned worker
         response = ""
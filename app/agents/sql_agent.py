@@ -1,15 +1,28 @@
+import contextvars
 import difflib
 import json
-from typing import Optional, Dict, Any, List, Tuple, Union
+import re
+import threading
+from typing import Optional, Dict, Any, List, Literal, Tuple, Union
+
+from pydantic import PrivateAttr, model_validator
 
 from app.logger import logger
 from app.agents.base import BaseAgent
+from app.config import config
 from app.prompts.agent_prompts import PROMPTS
 from app.prompts.db_info import DB_INFO
 from app.schema import Message
-from app.tools.database import db_tool
+from app.tools.approximate import approximate_query, describe_error_bounds
+from app.tools.database import DatabaseTool, get_db_tool
+from app.tools.fanout import fanout
+from app.tools.join_graph import JoinEdge, JoinGraph, describe_joins
+from app.tools.result_profile import profile_dataframe
+from app.tools.rollups import rollups
+from app.tools.schema_catalog import load_schema_catalog
 from app.tools.sql_toolbox import fix_sql, extract_sql_from_llm_response
 from app.tools.visualization import make_chart, get_visualization_tool
+from app.tracing import tracer
 
 
 class SQLAgent(BaseAgent):
@@ -28,10 +41,49 @@ class SQLAgent(BaseAgent):
     db_info: str = ""  # database level table descriptions
     table_schema: dict = {}  # table level schema
     helper_info: str = ""  # helper information
+    # Schema artifact to load db_info and table_schema from (see [schema]),
+    # None uses [schema] artifact_path
+    schema_artifact: Optional[str] = None
 
     # Execution control
     max_steps: int = 5  # Maximum attempts to generate or fix SQL code
     max_fix_attempts: int = 3  # Maximum attempts to fix SQL errors
+    profile_token_budget: int = 800  # Token budget of the result profile
+    max_result_rows: Optional[int] = 100_000  # Row cap of fetched results
+    db_target: Optional[str] = None  # Named database target, None = [database]
+    # Targets (shards) to run SQL on concurrently, None = [fanout] targets
+    fanout_targets: Optional[List[str]] = None
+    # Answer aggregates from a table sample first, the exact result follows
+    approximate: bool = False
+    sample_percent: float = 1.0  # Sample size in percent of the table
+    sample_method: Literal["system", "bernoulli"] = "system"
+
+    # Cancels the background exact query of the latest approximate answer
+    _refinement: Optional[threading.Event] = PrivateAttr(default=None)
+    # Foreign keys of the schema artifact, to answer questions across tables
+    _join_graph: Optional[JoinGraph] = PrivateAttr(default=None)
+
+    @model_validator(mode="after")  # type: ignore
+    def load_schema_artifact(self) -> "SQLAgent":
+        """Fill db_info and table_schema from the schema artifact, if any."""
+        path = self.schema_artifact or config.schema_artifact.artifact_path
+        if not path:
+            return self
+        settings = config.schema_artifact
+        catalog = load_schema_catalog(path)
+        if "table_schema" not in self.model_fields_set:
+            self.table_schema = catalog.table_schema(
+                settings.detail, settings.token_budget
+            )
+        if "db_info" not in self.model_fields_set:
+            self.db_info = catalog.render_db_info(token_budget=settings.token_budget)
+        self._join_graph = catalog.join_graph
+        return self
+
+    @property
+    def db(self) -> DatabaseTool:
+        """The database tool of this agent's target."""
+        return get_db_tool(self.db_target)
 
     def step(self) -> str:
         """Execute a single step in the SQL generation workflow."""
@@ -50,17 +102,21 @@ class SQLAgent(BaseAgent):
         user_query = "- " + "\n- ".join(user_queries)
         logger.info(f"User queries: \n{user_query}")
 
-        # Identify the relevant table
-        table_name = self._get_table_name(user_query)
-        if not table_name:
+        # Identify the relevant tables and how to join them
+        with tracer.span("sql_agent.table_select") as span:
+            table_names, joins = self._get_table_names(user_query)
+            span.set_attributes(table=", ".join(table_names), joins=len(joins))
+        if not table_names:
             self.update_memory(
                 "assistant", "I couldn't determine which table to use for your query."
             )
             return "I couldn't determine which table to use for your query."
-        logger.info(f"Table name: \n{table_name}")
+        logger.info(f"Table names: \n{', '.join(table_names)}")
+        table_schema = self._table_schema_prompt(table_names, joins)
 
         # Generate SQL
-        sql_code = self._generate_sql(user_query, table_name)
+        with tracer.span("sql_agent.generate"):
+            sql_code = self._generate_sql(user_query, table_names, table_schema)
         if not sql_code:
             self.update_memory(
                 "assistant", "I failed to generate SQL code for your query."
@@ -68,65 +124,79 @@ class SQLAgent(BaseAgent):
             return "I failed to generate SQL code for your query."
 
         # Excute SQL and fix SQL if there are errors
-        execution_result = db_tool.execute_query(sql_code)
+        self._cancel_refinement()
+        with tracer.span("sql_agent.execute"):
+            execution_result = self._execute_sql(sql_code, self.approximate)
         fix_attempts = 0
         while (
             execution_result["status"] == "error"
+            # Cancelled queries and a busy database are not the SQL's fault
+            and execution_result.get("error_type") not in ("cancelled", "busy")
             and fix_attempts < self.max_fix_attempts
         ):
             fix_attempts += 1
-            sql_code = fix_sql(
-                sql_code,
-                self.table_schema[table_name],
-                execution_result["message"],
-                self.llm,
-            )
-            execution_result = db_tool.execute_query(sql_code)
+            with tracer.span("sql_agent.fix", attempt=fix_attempts):
+                sql_code = fix_sql(
+                    sql_code,
+                    table_schema,
+                    self._fix_error_message(execution_result),
+                    self.llm,
+                )
+                execution_result = self._execute_sql(sql_code)
             logger.info(f"📝 Fix {fix_attempts}: {execution_result}")
-        self.memory.add_df(execution_result["data"])
+        self.memory.add_df(
+            execution_result["data"],
+            estimated=execution_result.get("approximate", False),
+        )
         self.memory.add_sql(execution_result["query"])
+        if execution_result.get("approximate"):
+            self._start_refinement(execution_result["query"])
         logger.info(f"SQL code: \n{sql_code}")
 
         # Format the results into a user-friendly response
-        response = self._format_response(user_query, execution_result)
+        with tracer.span("sql_agent.format"):
+            response = self._format_response(user_query, execution_result)
         logger.info(f"Response: \n{response}")
 
-        # Try to call visualization tool
-        tools = [get_visualization_tool()]
-        ask_tool_response = self.llm.ask_tool(
-            [
-                Message.user(
-                    f"Try to call visualization tool to generate a chart based on the following response: \n{response} \n\nThe column names in the data are: \n{', '.join(self.memory.df_data.columns.tolist())}"
-                ),
-            ],
-            tools=tools,
-        )
-        if ask_tool_response.tool_calls:
-            for tool_call in ask_tool_response.tool_calls:
-                if tool_call.function.name == "make_chart":
-                    try:
-                        # Parse tool call arguments
-                        args = json.loads(tool_call.function.arguments)
-                        data = self.memory.df_data
-                        chart_type = args.get("chart_type")
-                        title = args.get("title")
-                        x_col = args.get("x_col")
-                        y_cols = args.get("y_cols")
-                        logger.info(f"Chart type: {chart_type}")
-                        logger.info(f"Title: {title}")
-                        logger.info(f"X column: {x_col}")
-                        logger.info(f"Y columns: {y_cols}")
-                        # Call tool function
-                        tool_response = make_chart(
-                            data, chart_type, title, x_col, y_cols
-                        )
-                        # Format the response
-                        final_response = f"{response}\n\n{tool_response}"
-                    except Exception as e:
-                        logger.error(f"Error making chart: {e}")
-                        final_response = f"{response}\n\n**Error making chart**: {e}"
-        else:
-            final_response = response
+        with tracer.span("sql_agent.chart"):
+            # Try to call visualization tool
+            tools = [get_visualization_tool()]
+            ask_tool_response = self.llm.ask_tool(
+                [
+                    Message.user(
+                        f"Try to call visualization tool to generate a chart based on the following response: \n{response} \n\nThe column names in the data are: \n{', '.join(self.memory.df_data.columns.tolist())}"
+                    ),
+                ],
+                tools=tools,
+            )
+            if ask_tool_response.tool_calls:
+                for tool_call in ask_tool_response.tool_calls:
+                    if tool_call.function.name == "make_chart":
+                        try:
+                            # Parse tool call arguments
+                            args = json.loads(tool_call.function.arguments)
+                            data = self.memory.df_data
+                            chart_type = args.get("chart_type")
+                            title = args.get("title")
+                            x_col = args.get("x_col")
+                            y_cols = args.get("y_cols")
+                            logger.info(f"Chart type: {chart_type}")
+                            logger.info(f"Title: {title}")
+                            logger.info(f"X column: {x_col}")
+                            logger.info(f"Y columns: {y_cols}")
+                            # Call tool function
+                            tool_response = make_chart(
+                                data, chart_type, title, x_col, y_cols
+                            )
+                            # Format the response
+                            final_response = f"{response}\n\n{tool_response}"
+                        except Exception as e:
+                            logger.error(f"Error making chart: {e}")
+                            final_response = (
+                                f"{response}\n\n**Error making chart**: {e}"
+                            )
+            else:
+                final_response = response
 
         # Store the response in memory
         self.update_memory("assistant", final_response)
@@ -152,11 +222,172 @@ class SQLAgent(BaseAgent):
 
         return "404"  # Table not found
 
-    def _generate_sql(self, query: str, table_name: str) -> str:
-        """Generate SQL code based on the user query and identified table."""
+    def _get_table_names(self, query: str) -> Tuple[List[str], List[JoinEdge]]:
+        """
+        Determine the tables to use and the joins between them.
+
+        Without foreign keys (no schema artifact) a single table is chosen.
+        Otherwise the LLM names the tables holding the needed fields and the
+        join graph adds the tables and joins connecting them.
+
+        Returns:
+            The table names (empty if none matched) and the joins
+        """
+        if not self._join_graph:
+            table_name = self._get_table_name(query)
+            if table_name not in self.table_schema:
+                return [], []
+            return [table_name], []
+
+        prompt = PROMPTS["GET_TABLE_NAMES"].format(db_info=self.db_info, query=query)
+        messages: List[Union[dict, Message]] = [Message.user(prompt)]
+        response = self.llm.ask(messages=messages, stream=False)
+        table_names = self._match_table_names(response)
+        return self._join_graph.connect(table_names)
+
+    def _match_table_names(self, response: str) -> List[str]:
+        """
+        The known tables named in a comma or line separated LLM response.
+
+        Fragments match a table by name, case-insensitively and with or
+        without the schema, or as a near-identical spelling. Other fragments,
+        e.g. explanations, are dropped, as every matched table is joined in.
+        """
+        by_name = {table.lower(): table for table in self.table_schema}
+        for table in self.table_schema:
+            # Unqualified names, e.g. orders for public.orders
+            by_name.setdefault(table.split(".")[-1].lower(), table)
+
+        matched, dropped = [], []
+        for part in re.split(r"[,\n]", response):
+            name = part.strip().strip("`'\"-* ").lower()
+            if not name:
+                continue
+            if name not in by_name:
+                close = difflib.get_close_matches(name, by_name, n=1, cutoff=0.85)
+                if not close:
+                    dropped.append(part.strip())
+                    continue
+                name = close[0]
+            matched.append(by_name[name])
+        if dropped:
+            logger.info(f"No table matches {', '.join(map(repr, dropped))}")
+        return list(dict.fromkeys(matched))
+
+    def _table_schema_prompt(
+        self, table_names: List[str], joins: List[JoinEdge]
+    ) -> str:
+        """The schemas of the tables, followed by the join conditions."""
+        text = "\n\n".join(self.table_schema[name] for name in table_names)
+        if joins:
+            text += "\n\nJoin conditions:\n" + describe_joins(joins)
+        return text
+
+    def _execute_sql(
+        self,
+        sql_code: str,
+        approximate: bool = False,
+        cancel: Optional[threading.Event] = None,
+    ) -> Dict[str, Any]:
+        """Execute SQL on all fan-out targets, or on this agent's target from a
+        fresh rollup table when one answers the query.
+
+        With `approximate`, aggregates without a rollup are answered from a
+        table sample (see `approximate_query`).
+        """
+        targets = (
+            self.fanout_targets
+            if self.fanout_targets is not None
+            else fanout.settings.targets
+        )
+        if targets:
+            result = fanout.execute_query(
+                sql_code, targets, max_rows=self.max_result_rows, cancel=cancel
+            )
+            if result.get("failed_shards"):
+                logger.warning(f"Failed shards: {result['failed_shards']}")
+            return result
+        routed = rollups.rewrite(sql_code, self.db_target)
+        if routed is not None:
+            rollup_sql, entry = routed
+            result = self.db.execute_query(
+                rollup_sql, max_rows=self.max_result_rows, cancel=cancel
+            )
+            if result["status"] == "success":
+                logger.info(f"Answered from rollup {entry.name}: \n{rollup_sql}")
+                return {**result, "query": sql_code, "rollup": entry.name}
+            # E.g. the rollup table was dropped outside of the registry
+            logger.warning(f"Rollup {entry.name} failed: {result['message']}")
+        if approximate:
+            result = approximate_query(
+                self.db, sql_code, self.sample_percent, self.sample_method
+            )
+            if result is not None:
+                logger.info(f"Approximate answer from: \n{result['sample_query']}")
+                return result
+        return self.db.execute_query(
+            sql_code, max_rows=self.max_result_rows, cancel=cancel
+        )
+
+    def _start_refinement(self, sql_code: str) -> None:
+        """Run the exact query in the background and replace the estimate."""
+        cancel = threading.Event()
+        self._refinement = cancel
+        self.memory.refining = True
+
+        def refine():
+            try:
+                with tracer.span("sql_agent.refine"):
+                    result = self._execute_sql(sql_code, cancel=cancel)
+                if cancel.is_set() or self._refinement is not cancel:
+                    return
+                if result["status"] == "success":
+                    self.memory.add_df(result["data"])
+                    logger.info("Replaced the approximate result with the exact one")
+                else:
+                    logger.warning(f"Exact query failed: {result['message']}")
+            except Exception as e:
+                logger.error(f"Error refining the approximate result: {e}")
+            finally:
+                # The frontend polls until the flag is reset; a newer
+                # refinement owns it though
+                if self._refinement is cancel:
+                    self.memory.refining = False
+
+        # The refinement's spans belong to the current trace
+        threading.Thread(
+            target=contextvars.copy_context().run,
+            args=(refine,),
+            name="sql-refine",
+            daemon=True,
+        ).start()
+
+    def _cancel_refinement(self) -> None:
+        """Stop waiting for the exact result of a previous approximate answer."""
+        if self._refinement is not None:
+            self._refinement.set()
+            self._refinement = None
+            self.memory.refining = False
+
+    @staticmethod
+    def _fix_error_message(execution_result: Dict[str, Any]) -> str:
+        """Error message for the fix prompt, with a hint for typed errors."""
+        message = execution_result["message"]
+        error_type = execution_result.get("error_type")
+        if error_type == "timeout":
+            message += "\n" + PROMPTS["TIMEOUT_HINT"]
+        elif error_type == "read_only":
+            message += "\n" + PROMPTS["READ_ONLY_HINT"]
+        return message
+
+    def _generate_sql(
+        self, query: str, table_names: List[str], table_schema: str
+    ) -> str:
+        """Generate SQL code based on the user query and identified tables."""
         prompt = PROMPTS["GENERATE_SQL"].format(
-            table_name=table_name,
-            table_schema=self.table_schema[table_name],
+            table_name=", ".join(f'"{name}"' for name in table_names),
+            dialect=self.db.dialect,
+            table_schema=table_schema,
             helper_info=self.helper_info,
             user_query=query,
         )
@@ -176,10 +407,24 @@ class SQLAgent(BaseAgent):
         # Get the query results
         data = query_result.get("data", "[]")
 
+        formatted_data = profile_dataframe(data, token_budget=self.profile_token_budget)
+        if query_result.get("approximate"):
+            formatted_data += (
+                f"\nNote: these are estimates from a "
+                f"{query_result['sample_percent']:g}% sample of the table; the "
+                f"exact result is being computed. 95% error margins:\n"
+                + describe_error_bounds(query_result)
+            )
+        if query_result.get("truncated"):
+            formatted_data += (
+                f"\nNote: only the first {len(data)} of about "
+                f"{query_result['total_rows_estimate']} rows were fetched."
+            )
+
         # Use LLM to generate insights
         prompt = PROMPTS["ANALYZE_SQL"].format(
             user_query=user_query,
-            formatted_data=data.head(5).to_string(),
+            formatted_data=formatted_data,
         )
 
         messages: List[Union[dict, Message]] = [Message.user(prompt)]
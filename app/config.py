@@ -1,7 +1,7 @@
 import threading
 import tomllib
 from pathlib import Path
-from typing import Dict
+from typing import Dict, List, Literal, Optional
 
 from pydantic import BaseModel, Field
 
@@ -29,11 +29,178 @@ class PGSettings(BaseModel):
     user: str = Field(..., description="Database user")
     password: str = Field(..., description="Database password")
     database: str = Field(..., description="Database name")
+    pool_min_size: int = Field(1, description="Connections kept open in the pool")
+    pool_max_size: int = Field(10, description="Maximum pooled connections")
+    pool_timeout: float = Field(
+        30.0, description="Seconds to wait for a free pooled connection"
+    )
+    pool_health_check_interval: float = Field(
+        30.0, description="Idle seconds after which a connection is re-checked"
+    )
+    fetch_mode: Literal["rows", "copy"] = Field(
+        "rows", description="Default result loading path of execute_query"
+    )
+    replicas: List[str] = Field(
+        default_factory=list, description="DSNs of read replicas for agent SQL"
+    )
+    max_replica_lag: float = Field(
+        30.0, description="Seconds of replication lag before a replica is skipped"
+    )
+    replica_check_interval: float = Field(
+        10.0, description="Seconds between replica health and lag checks"
+    )
+
+
+class CacheSettings(BaseModel):
+    enabled: bool = Field(False, description="Whether query results are cached")
+    ttl: float = Field(300.0, description="Seconds a cached result stays valid")
+    max_bytes: int = Field(
+        256 * 1024 * 1024, description="Memory cap of serialized cached results"
+    )
+    format: Literal["arrow", "parquet"] = Field(
+        "arrow", description="Serialization of cached results"
+    )
+    invalidation: Literal["manual", "poll", "notify"] = Field(
+        "manual", description="How table changes invalidate cached results"
+    )
+    poll_interval: float = Field(
+        5.0, description="Seconds between pg_stat_user_tables polls"
+    )
+    notify_channel: str = Field(
+        "table_changed", description="LISTEN channel carrying changed table names"
+    )
+
+
+class DatabaseSettings(BaseModel):
+    backend: Literal["postgres", "sqlite", "duckdb"] = Field(
+        "postgres", description="Database backend agents run SQL on"
+    )
+    path: Optional[str] = Field(
+        None, description="Database file of sqlite/duckdb (relative to root)"
+    )
+    max_rows: Optional[int] = Field(
+        None, description="Default row cap of execute_query (None = unlimited)"
+    )
+    fetch_batch_size: int = Field(
+        2000, description="Rows per fetchmany batch of streamed results"
+    )
+    compact_results: bool = Field(
+        True, description="Store repeated strings of results as category"
+    )
+    category_threshold: float = Field(
+        0.5, description="Maximum distinct/rows ratio of category columns"
+    )
+    arrow_strings: bool = Field(
+        False, description="Store other result strings as string[pyarrow]"
+    )
+    statement_timeout: Optional[float] = Field(
+        60.0, description="Default seconds before a query is cancelled (None = off)"
+    )
+    work_mem: Optional[str] = Field(
+        None, description="work_mem of agent queries on postgres, e.g. '64MB'"
+    )
+    read_only: bool = Field(True, description="Run agent SQL read-only")
+    pg: Optional[PGSettings] = Field(
+        None, description="Connection of a named postgres target (default: [pg])"
+    )
+    cache: CacheSettings = Field(default_factory=CacheSettings)
+
+
+class TracingSettings(BaseModel):
+    enabled: bool = Field(False, description="Whether finished spans are exported")
+    jsonl_path: Optional[str] = Field(
+        "logs/traces.jsonl", description="JSON-lines span file (relative to root)"
+    )
+    otlp_path: Optional[str] = Field(
+        None, description="OTLP/JSON span file (relative to root)"
+    )
+    service_name: str = Field("miniAgents", description="OTLP service.name")
+
+
+class QueryStatsSettings(BaseModel):
+    enabled: bool = Field(True, description="Whether query statistics are kept")
+    path: Optional[str] = Field(
+        None,
+        description="SQLite stats file shared by processes, relative to root or "
+        "absolute (e.g. under /var/lib); None keeps the stats in memory",
+    )
+    persist_interval: float = Field(
+        60.0, description="Seconds between writes of the stats to `path`"
+    )
+    max_samples: int = Field(
+        500, description="Latest latencies kept per fingerprint for percentiles"
+    )
+
+
+class RollupSettings(BaseModel):
+    enabled: bool = Field(
+        True, description="Whether agent SQL is rewritten to read from rollups"
+    )
+    registry_path: str = Field(
+        "workspace/rollups.json", description="Rollup registry (relative to root)"
+    )
+    max_staleness: float = Field(
+        3600.0, description="Seconds after a refresh during which a rollup is used"
+    )
+    min_calls: int = Field(
+        5, description="Calls of a query shape before the advisor proposes a rollup"
+    )
+
+
+class FanoutSettings(BaseModel):
+    targets: List[str] = Field(
+        default_factory=list,
+        description="Database targets (shards with identical schemas) agent SQL "
+        "runs on; empty runs it on the agent's single target",
+    )
+    max_workers: Optional[int] = Field(
+        None, description="Shards queried concurrently (default: all)"
+    )
+    allow_partial: bool = Field(
+        True, description="Return the merged result of the other shards on failures"
+    )
+    shard_column: Optional[str] = Field(
+        None, description="Column with the target name added to unioned rows"
+    )
+
+
+class SchemaSettings(BaseModel):
+    artifact_path: Optional[str] = Field(
+        None,
+        description="Schema artifact (JSON or .msgpack) written by the schema "
+        "generator, relative to root; None uses the built-in DB_INFO",
+    )
+    detail: Literal["compact", "medium", "full"] = Field(
+        "medium", description="Detail of the table schemas in SQL prompts"
+    )
+    token_budget: int = Field(
+        2000, description="Token budget of a table schema and of the table list"
+    )
+
+
+class ArtifactSettings(BaseModel):
+    enabled: bool = Field(True, description="Whether results and SQL are saved")
+    directory: str = Field("files", description="Directory (relative to root)")
+    format: Literal["parquet", "csv"] = Field(
+        "parquet", description="File format of results (parquet needs pyarrow)"
+    )
+    compression: str = Field("zstd", description="Parquet compression codec")
+    max_queue: int = Field(
+        64, description="Files waiting to be written before new ones are dropped"
+    )
 
 
 class AppConfig(BaseModel):
     llm: Dict[str, LLMSettings]
-    pg: PGSettings
+    pg: Optional[PGSettings] = None
+    database: DatabaseSettings = Field(default_factory=DatabaseSettings)
+    databases: Dict[str, DatabaseSettings] = Field(default_factory=dict)
+    tracing: TracingSettings = Field(default_factory=TracingSettings)
+    query_stats: QueryStatsSettings = Field(default_factory=QueryStatsSettings)
+    rollups: RollupSettings = Field(default_factory=RollupSettings)
+    fanout: FanoutSettings = Field(default_factory=FanoutSettings)
+    schema_artifact: SchemaSettings = Field(default_factory=SchemaSettings)
+    artifacts: ArtifactSettings = Field(default_factory=ArtifactSettings)
 
 
 class Config:
@@ -52,10 +219,18 @@ class Config:
         if not self._initialized:
             with self._lock:
                 if not self._initialized:
+                    # The configuration file is read on first access, so
+                    # importing modules that use `config` has no side effects
                     self._config = None
-                    self._load_initial_config()
                     self._initialized = True
 
+    def _get_config(self) -> AppConfig:
+        if self._config is None:
+            with self._lock:
+                if self._config is None:
+                    self._load_initial_config()
+        return self._config
+
     @staticmethod
     def _get_config_path() -> Path:
         root = PROJECT_ROOT
@@ -87,7 +262,16 @@ class Config:
             "temperature": base_llm.get("temperature", 1.0),
         }
 
-        pg_settings = raw_config.get("pg", {})
+        pg_settings = raw_config.get("pg")
+        database_settings = raw_config.get("database", {})
+        # Named database targets, e.g. [databases.analytics]
+        databases_settings = raw_config.get("databases", {})
+        tracing_settings = raw_config.get("tracing", {})
+        query_stats_settings = raw_config.get("query_stats", {})
+        rollups_settings = raw_config.get("rollups", {})
+        fanout_settings = raw_config.get("fanout", {})
+        schema_settings = raw_config.get("schema", {})
+        artifacts_settings = raw_config.get("artifacts", {})
 
         config_dict = {
             "llm": {
@@ -98,17 +282,68 @@ class Config:
                 },
             },
             "pg": pg_settings,
+            "database": database_settings,
+            "databases": databases_settings,
+            "tracing": tracing_settings,
+            "query_stats": query_stats_settings,
+            "rollups": rollups_settings,
+            "fanout": fanout_settings,
+            "schema_artifact": schema_settings,
+            "artifacts": artifacts_settings,
         }
 
-        self._config = AppConfig(llm=config_dict["llm"], pg=config_dict["pg"])
+        self._config = AppConfig(
+            llm=config_dict["llm"],
+            pg=config_dict["pg"],
+            database=config_dict["database"],
+            databases=config_dict["databases"],
+            tracing=config_dict["tracing"],
+            query_stats=config_dict["query_stats"],
+            rollups=config_dict["rollups"],
+            fanout=config_dict["fanout"],
+            schema_artifact=config_dict["schema_artifact"],
+            artifacts=config_dict["artifacts"],
+        )
 
     @property
     def llm(self) -> Dict[str, LLMSettings]:
-        return self._config.llm
+        return self._get_config().llm
+
+    @property
+    def pg(self) -> Optional[PGSettings]:
+        return self._get_config().pg
+
+    @property
+    def database(self) -> DatabaseSettings:
+        return self._get_config().database
+
+    @property
+    def databases(self) -> Dict[str, DatabaseSettings]:
+        return self._get_config().databases
+
+    @property
+    def tracing(self) -> TracingSettings:
+        return self._get_config().tracing
+
+    @property
+    def query_stats(self) -> QueryStatsSettings:
+        return self._get_config().query_stats
+
+    @property
+    def rollups(self) -> RollupSettings:
+        return self._get_config().rollups
+
+    @property
+    def fanout(self) -> FanoutSettings:
+        return self._get_config().fanout
+
+    @property
+    def schema_artifact(self) -> SchemaSettings:
+        return self._get_config().schema_artifact
 
     @property
-    def pg(self) -> PGSettings:
-        return self._config.pg
+    def artifacts(self) -> ArtifactSettings:
+        return self._get_config().artifacts
 
 
 config = Config()
@@ -1,17 +1,15 @@
 from typing import Dict, List, Literal, Optional, Union
 
-from openai import (
-    APIError,
-    OpenAI,
-    AuthenticationError,
-    OpenAIError,
-    RateLimitError,
-)
 from tenacity import retry, stop_after_attempt, wait_random_exponential
 
 from app.config import LLMSettings, config
 from app.logger import logger
 from app.schema import Message
+from app.startup import lazy_import
+from app.tracing import tracer
+
+# openai takes about half a second to import, load it when the first client is built
+openai = lazy_import("openai")
 
 
 class LLM:
@@ -35,7 +33,7 @@ class LLM:
             self.model = llm_config.model
             self.max_tokens = llm_config.max_tokens
             self.temperature = llm_config.temperature
-            self.client = OpenAI(
+            self.client = openai.OpenAI(
                 api_key=llm_config.api_key, base_url=llm_config.base_url
             )
 
@@ -89,6 +87,17 @@ class LLM:
 
         return formatted_messages
 
+    @staticmethod
+    def _record_usage(span, response) -> None:
+        """Attach token usage of a completion response to the tracing span."""
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            span.set_attributes(
+                prompt_tokens=usage.prompt_tokens,
+                completion_tokens=usage.completion_tokens,
+                total_tokens=usage.total_tokens,
+            )
+
     @retry(
         wait=wait_random_exponential(min=1, max=60),
         stop=stop_after_attempt(6),
@@ -117,57 +126,60 @@ class LLM:
             OpenAIError: If API call fails after retries
             Exception: For unexpected errors
         """
-        try:
-            # Format system and user messages
-            if system_msgs:
-                system_msgs = self.format_messages(system_msgs)
-                messages = system_msgs + self.format_messages(messages)
-            else:
-                messages = self.format_messages(messages)
-
-            if not stream:
-                # Non-streaming request
+        with tracer.span("llm.ask", model=self.model, stream=stream) as span:
+            try:
+                # Format system and user messages
+                if system_msgs:
+                    system_msgs = self.format_messages(system_msgs)
+                    messages = system_msgs + self.format_messages(messages)
+                else:
+                    messages = self.format_messages(messages)
+
+                if not stream:
+                    # Non-streaming request
+                    response = self.client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,  # type: ignore
+                        max_tokens=self.max_tokens,
+                        temperature=temperature or self.temperature,
+                        stream=False,
+                    )
+                    self._record_usage(span, response)
+                    if not response.choices or not response.choices[0].message.content:
+                        raise ValueError("Empty or invalid response from LLM")
+                    return response.choices[0].message.content
+
+                # Streaming request
                 response = self.client.chat.completions.create(
                     model=self.model,
                     messages=messages,  # type: ignore
                     max_tokens=self.max_tokens,
                     temperature=temperature or self.temperature,
-                    stream=False,
+                    stream=True,
                 )
-                if not response.choices or not response.choices[0].message.content:
-                    raise ValueError("Empty or invalid response from LLM")
-                return response.choices[0].message.content
-
-            # Streaming request
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,  # type: ignore
-                max_tokens=self.max_tokens,
-                temperature=temperature or self.temperature,
-                stream=True,
-            )
 
-            collected_messages = []
-            for chunk in response:
-                chunk_message = chunk.choices[0].delta.content or ""
-                collected_messages.append(chunk_message)
-                print(chunk_message, end="", flush=True)
-
-            print()  # Newline after streaming
-            full_response = "".join(collected_messages).strip()
-            if not full_response:
-                raise ValueError("Empty response from streaming LLM")
-            return full_response
-
-        except ValueError as ve:
-            logger.error(f"Validation error: {ve}")
-            raise
-        except OpenAIError as oe:
-            logger.error(f"OpenAI API error: {oe}")
-            raise
-        except Exception as e:
-            logger.error(f"Unexpected error in ask: {e}")
-            raise
+                collected_messages = []
+                for chunk in response:
+                    chunk_message = chunk.choices[0].delta.content or ""
+                    collected_messages.append(chunk_message)
+                    print(chunk_message, end="", flush=True)
+
+                print()  # Newline after streaming
+                full_response = "".join(collected_messages).strip()
+                span.set_attribute("response_chars", len(full_response))
+                if not full_response:
+                    raise ValueError("Empty response from streaming LLM")
+                return full_response
+
+            except ValueError as ve:
+                logger.error(f"Validation error: {ve}")
+                raise
+            except openai.OpenAIError as oe:
+                logger.error(f"OpenAI API error: {oe}")
+                raise
+            except Exception as e:
+                logger.error(f"Unexpected error in ask: {e}")
+                raise
 
     @retry(
         wait=wait_random_exponential(min=1, max=60),
@@ -203,54 +215,60 @@ class LLM:
             OpenAIError: If API call fails after retries
             Exception: For unexpected errors
         """
-        try:
-            # Validate tool_choice
-            if tool_choice not in ["none", "auto", "required"]:
-                raise ValueError(f"Invalid tool_choice: {tool_choice}")
-
-            # Format messages
-            if system_msgs:
-                system_msgs = self.format_messages(system_msgs)
-                messages = system_msgs + self.format_messages(messages)
-            else:
-                messages = self.format_messages(messages)
-
-            # Validate tools if provided
-            if tools:
-                for tool in tools:
-                    if not isinstance(tool, dict) or "type" not in tool:
-                        raise ValueError("Each tool must be a dict with 'type' field")
-
-            # Set up the completion request
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,  # type: ignore
-                temperature=temperature or self.temperature,
-                max_tokens=self.max_tokens,
-                tools=tools,  # type: ignore
-                tool_choice=tool_choice,
-                timeout=timeout,
-                **kwargs,
-            )
-
-            # Check if response is valid
-            if not response.choices or not response.choices[0].message:
-                print(response)
-                raise ValueError("Invalid or empty response from LLM")
-
-            return response.choices[0].message
-
-        except ValueError as ve:
-            logger.error(f"Validation error in ask_tool: {ve}")
-            raise
-        except OpenAIError as oe:
-            if isinstance(oe, AuthenticationError):
-                logger.error("Authentication failed. Check API key.")
-            elif isinstance(oe, RateLimitError):
-                logger.error("Rate limit exceeded. Consider increasing retry attempts.")
-            elif isinstance(oe, APIError):
-                logger.error(f"API error: {oe}")
-            raise
-        except Exception as e:
-            logger.error(f"Unexpected error in ask_tool: {e}")
-            raise
+        with tracer.span("llm.ask_tool", model=self.model) as span:
+            try:
+                # Validate tool_choice
+                if tool_choice not in ["none", "auto", "required"]:
+                    raise ValueError(f"Invalid tool_choice: {tool_choice}")
+
+                # Format messages
+                if system_msgs:
+                    system_msgs = self.format_messages(system_msgs)
+                    messages = system_msgs + self.format_messages(messages)
+                else:
+                    messages = self.format_messages(messages)
+
+                # Validate tools if provided
+                if tools:
+                    for tool in tools:
+                        if not isinstance(tool, dict) or "type" not in tool:
+                            raise ValueError(
+                                "Each tool must be a dict with 'type' field"
+                            )
+
+                # Set up the completion request
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,  # type: ignore
+                    temperature=temperature or self.temperature,
+                    max_tokens=self.max_tokens,
+                    tools=tools,  # type: ignore
+                    tool_choice=tool_choice,
+                    timeout=timeout,
+                    **kwargs,
+                )
+                self._record_usage(span, response)
+
+                # Check if response is valid
+                if not response.choices or not response.choices[0].message:
+                    print(response)
+                    raise ValueError("Invalid or empty response from LLM")
+
+                return response.choices[0].message
+
+            except ValueError as ve:
+                logger.error(f"Validation error in ask_tool: {ve}")
+                raise
+            except openai.OpenAIError as oe:
+                if isinstance(oe, openai.AuthenticationError):
+                    logger.error("Authentication failed. Check API key.")
+                elif isinstance(oe, openai.RateLimitError):
+                    logger.error(
+                        "Rate limit exceeded. Consider increasing retry attempts."
+                    )
+                elif isinstance(oe, openai.APIError):
+                    logger.error(f"API error: {oe}")
+                raise
+            except Exception as e:
+                logger.error(f"Unexpected error in ask_tool: {e}")
+                raise
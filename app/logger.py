@@ -24,7 +24,10 @@ def define_log_level(
 
     _logger.remove()
     _logger.add(sys.stderr, level=print_level)
-    _logger.add(PROJECT_ROOT / f"logs/{log_name}.log", level=logfile_level)
+    # delay: the log file is only created when the first message is written
+    _logger.add(
+        PROJECT_ROOT / f"logs/{log_name}.log", level=logfile_level, delay=True
+    )
     return _logger
 
 
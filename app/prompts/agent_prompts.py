@@ -83,7 +83,8 @@ Requirements:
 2. Include appropriate filtering, grouping, and ordering based on the question
 3. Only use fields that exist in the schema
 4. If have multiple time columns, make sure they are merged into a single column (e.g. year, month, day) and appears in the first column of the result
-5. The table is from Supabase database and the table name is "{table_name}"
+5. The tables are from {dialect} database and the table names are {table_name}
+6. Join tables only with the join conditions given after the table schemas
 
 Return only the SQL query, no explanations.
 """
@@ -96,7 +97,7 @@ PROMPTS[
 User questions:
 {user_query}
 
-Query results(first 5 rows):
+Query result profile:
 {formatted_data}
 
 Please provide:
@@ -133,6 +134,16 @@ Please fix the SQL code to resolve this error. Only return the corrected SQL cod
 """
 
 
+PROMPTS[
+    "TIMEOUT_HINT"
+] = """The query was too slow and was cancelled by the statement timeout. Rewrite it to do less work: filter rows as early as possible, aggregate before joining, select only the needed columns, and avoid cross joins and correlated subqueries."""
+
+
+PROMPTS[
+    "READ_ONLY_HINT"
+] = """The database is read-only. Only SELECT queries are allowed, rewrite the request as a SELECT query."""
+
+
 PROMPTS[
     "GET_TABLE_NAME"
 ] = """Based on the following table descriptions and user query, determine which table should be used:
@@ -146,3 +157,18 @@ First, analyze what information the user is looking for.
 Then, determine which table contains the necessary fields to answer the query.
 Respond with just the table name, nothing else.
 """
+
+
+PROMPTS[
+    "GET_TABLE_NAMES"
+] = """Based on the following table descriptions and user query, determine which tables should be used:
+
+Table descriptions:
+{db_info}
+
+User query: {query}
+
+First, analyze what information the user is looking for.
+Then, determine which tables contain the necessary fields to answer the query. Prefer a single table if it has all of them; tables that are only needed to join others are added automatically.
+Respond with just the table names separated by commas, nothing else.
+"""
@@ -2,11 +2,12 @@ import datetime
 import uuid
 from enum import Enum
 from typing import Any, List, Literal, Optional, Union
-import os
 
 import pandas as pd
 from pydantic import BaseModel, Field
 
+from app.tools.artifact_writer import artifact_writer
+
 
 class Function(BaseModel):
     name: str
@@ -115,6 +116,8 @@ class Memory(BaseModel):
     max_messages: int = Field(default=100)
     sql_codes: str = Field(default="")
     df_data: pd.DataFrame = Field(default_factory=pd.DataFrame)
+    df_estimated: bool = Field(default=False)  # df_data is a sample estimate
+    refining: bool = Field(default=False)  # exact result is being computed
 
     model_config = {"arbitrary_types_allowed": True}
 
@@ -137,6 +140,8 @@ class Memory(BaseModel):
         self.messages.clear()
         self.sql_codes = ""
         self.df_data = pd.DataFrame()
+        self.df_estimated = False
+        self.refining = False
 
     def get_recent_messages(self, n: int) -> List[Message]:
         """Get n most recent messages"""
@@ -155,24 +160,20 @@ class Memory(BaseModel):
         ]
 
     def add_sql(self, sql: str) -> None:
-        """Add a SQL file to memory and save it to a file"""
+        """Add a SQL file to memory and save it to a file in the background"""
         self.sql_codes = sql
-        # 确保文件目录存在
-        os.makedirs("files", exist_ok=True)
-        with open(f"files/{self.unique_id}_sql.sql", "w") as f:
-            f.write(sql)
+        artifact_writer.write_text(f"{self.unique_id}_sql.sql", sql)
 
     def curr_sql(self) -> str:
         """Get the current SQL file"""
         return self.sql_codes
 
-    def add_df(self, df: pd.DataFrame) -> None:
-        """Add a DataFrame to memory and save it to a file"""
+    def add_df(self, df: pd.DataFrame, estimated: bool = False) -> None:
+        """Add a DataFrame to memory and save it to a file in the background"""
         self.df_data = df
-        # 确保文件目录存在
-        os.makedirs("files", exist_ok=True)
-        with open(f"files/{self.unique_id}_df.csv", "w") as f:
-            df.to_csv(f, index=False)
+        self.df_estimated = estimated
+        # Parquet (or CSV) encoding of large results is left to the writer thread
+        artifact_writer.write_df(f"{self.unique_id}_df", df)
 
     def curr_df(self) -> pd.DataFrame:
         """Get the current DataFrame"""
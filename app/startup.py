@@ -0,0 +1,88 @@
+import argparse
+import importlib.util
+import subprocess
+import sys
+from pathlib import Path
+from types import ModuleType
+from typing import List, Tuple
+
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    Import a top-level module lazily.
+
+    The module object is returned immediately and only executed on first
+    attribute access, so heavy optional dependencies (openai, pyarrow, ...)
+    do not slow down importing the modules that reference them.
+
+    Raises:
+        ImportError: If the module is not installed
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None or spec.loader is None:
+        raise ImportError(f"No module named '{name}'")
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def import_time_report(module: str = "app.agents") -> List[Tuple[str, float, float]]:
+    """
+    Measure how long importing a module takes, per imported module.
+
+    The import runs in a fresh interpreter with `-X importtime`, so modules
+    already loaded in the current process do not hide their cost.
+
+    Args:
+        module: Dotted name of the module to import
+
+    Returns:
+        List of (module name, self seconds, cumulative seconds), slowest first
+
+    Raises:
+        ImportError: If the module cannot be imported
+    """
+    project_root = Path(__file__).resolve().parent.parent
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        cwd=project_root,
+    )
+    if proc.returncode != 0:
+        raise ImportError(
+            f"Importing {module} failed:\n{proc.stderr.splitlines()[-1:]}"
+        )
+
+    timings = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        timings.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6))
+    return sorted(timings, key=lambda t: t[2], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report import time per module")
+    parser.add_argument("modules", nargs="*", default=["app.agents"])
+    parser.add_argument("--top", type=int, default=15, help="Modules to list")
+    args = parser.parse_args()
+
+    for module in args.modules:
+        timings = import_time_report(module)
+        total = next((t[2] for t in timings if t[0] == module), 0.0)
+        print(f"import {module}: {total * 1000:.1f} ms")
+        print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+        for name, self_s, cumulative_s in timings[: args.top]:
+            print(f"{cumulative_s * 1000:14.1f} {self_s * 1000:9.1f}  {name}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
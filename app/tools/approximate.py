@@ -0,0 +1,241 @@
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.logger import logger
+from app.tools.database import DatabaseTool
+from app.tools.sql_shapes import (
+    AggregateQuery,
+    Measure,
+    apply_order_and_limit,
+    output_column_names,
+    parse_aggregate,
+    quote_identifier,
+)
+
+# z value of a two-sided 95% confidence interval
+_Z95 = 1.96
+
+SAMPLE_METHODS = ("system", "bernoulli")
+
+
+def _sumsq_name(measure: Measure) -> str:
+    return f"sumsq_{measure.name[len(measure.func) + 1:]}"
+
+
+def _sample_measures(query: AggregateQuery) -> List[Measure]:
+    """Base measures of the query plus the counts needed for error bounds."""
+    measures = dict.fromkeys(query.base_measures())
+    # Sampled rows per group, to tell an empty sample
+    measures.setdefault(Measure("count"), None)
+    for measure in list(measures):
+        if measure.func == "sum":
+            measures.setdefault(Measure("count", measure.column), None)
+    return list(measures)
+
+
+def sample_sql(
+    query: AggregateQuery, percent: float, method: str, dialect: str
+) -> Optional[str]:
+    """
+    The partial aggregate of a query over a random sample of its table.
+
+    Besides the base measures it returns the sum of squares of every summed
+    column (`sumsq_<column>`), for the variance of the estimates.
+
+    Args:
+        query: The parsed aggregate query
+        percent: Sample size in percent of the table
+        method: "system" samples whole pages (fast, but rows of a page are
+            correlated), "bernoulli" samples single rows
+        dialect: Backend name; SQLite has no TABLESAMPLE and samples rows
+            with `random()` in the WHERE clause
+
+    Returns:
+        The SQL, or None if the dialect cannot sample
+    """
+    dims = list({dim.expression: dim for dim in query.group_by}.values())
+    columns = [f"{dim.expression} AS {quote_identifier(dim.name)}" for dim in dims]
+    for measure in _sample_measures(query):
+        columns.append(f"{measure.expression()} AS {quote_identifier(measure.name)}")
+        if measure.func == "sum":
+            column = quote_identifier(measure.column)
+            columns.append(
+                f"SUM(1.0 * {column} * {column}) AS "
+                f"{quote_identifier(_sumsq_name(measure))}"
+            )
+
+    source, conditions = query.from_sql, []
+    if query.where_sql:
+        conditions.append(f"({query.where_sql})")
+    if dialect == "postgres":
+        source += f" TABLESAMPLE {method.upper()} ({percent:g})"
+    elif dialect == "duckdb":
+        source += f" TABLESAMPLE {method}({percent:g}%)"
+    elif dialect == "sqlite":
+        conditions.append(f"abs(random() % 1000000) < {round(percent * 10000)}")
+    else:
+        return None
+
+    sql = f"SELECT {', '.join(columns)} FROM {source}"
+    if conditions:
+        sql += f" WHERE {' AND '.join(conditions)}"
+    if dims:
+        sql += f" GROUP BY {', '.join(dim.expression for dim in dims)}"
+    return sql
+
+
+def estimate(
+    query: AggregateQuery,
+    sample: pd.DataFrame,
+    fraction: float,
+    dialect: str,
+    column_names: Optional[Callable[[], List[str]]] = None,
+) -> Dict[str, pd.DataFrame]:
+    """
+    Estimate a query's result from the partial aggregates of a sample.
+
+    SUM and COUNT are scaled by the sampling fraction (Horvitz-Thompson
+    estimates), AVG is the sample mean. MIN and MAX are the sample's values,
+    which can only understate the range, and get no bound.
+
+    Args:
+        query: The parsed aggregate query
+        sample: Result of `sample_sql`
+        fraction: Sampled fraction of the table (0-1]
+        dialect: Backend name, to name the columns like the database would
+        column_names: Returns the exact query's column names where the
+            dialect's naming rules do not tell them (see `output_column_names`)
+
+    Returns:
+        Dict with "data" (the estimates) and "error_bounds" (half-widths of
+        95% confidence intervals, NaN where there is no bound), which share
+        their columns and index
+    """
+    scale = 1.0 / fraction
+    # Variance factor of scaled totals under Bernoulli sampling
+    factor = (1.0 - fraction) / fraction**2
+
+    data, bounds = [], []
+    names = output_column_names(query, dialect, column_names)
+    for item, name in zip(query.items, names):
+        if item.dimension is not None:
+            value = sample[item.dimension.name]
+            bound = pd.Series(np.nan, index=sample.index)
+        elif item.measure.func in ("sum", "count"):
+            measure = item.measure
+            partial = sample[measure.name].astype("float64")
+            value = partial * scale
+            if measure.func == "sum":
+                sumsq = sample[_sumsq_name(measure)].astype("float64")
+                bound = _Z95 * np.sqrt(factor * sumsq)
+            else:
+                bound = _Z95 * np.sqrt(factor * partial)
+                value = value.round().astype("int64")
+        elif item.measure.func == "avg":
+            total, count = item.measure.base_measures()
+            sums = sample[total.name].astype("float64")
+            counts = sample[count.name].astype("float64")
+            value = sums / counts.where(counts != 0)
+            sumsq = sample[_sumsq_name(total)].astype("float64")
+            variance = (sumsq - sums * value) / (counts - 1).where(counts > 1)
+            bound = _Z95 * np.sqrt(variance.clip(lower=0) / counts * (1 - fraction))
+        else:
+            value = sample[item.measure.name]
+            bound = pd.Series(np.nan, index=sample.index)
+        data.append(value.rename(name))
+        bounds.append(bound.rename(name))
+
+    df = pd.concat(data, axis=1)
+    df = apply_order_and_limit(query, df)
+    error_bounds = pd.concat(bounds, axis=1).loc[df.index]
+    return {
+        "data": df.reset_index(drop=True),
+        "error_bounds": error_bounds.reset_index(drop=True),
+    }
+
+
+def approximate_query(
+    db: DatabaseTool,
+    sql_query: str,
+    percent: float = 1.0,
+    method: str = "system",
+    timeout: Optional[float] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Answer an aggregate query approximately from a random sample of its table.
+
+    Only single-table SUM/COUNT/MIN/MAX/AVG group-bys are supported. Groups
+    without sampled rows are missing from the estimate.
+
+    Args:
+        db: Database to query
+        sql_query: The exact query
+        percent: Sample size in percent of the table
+        method: "system" or "bernoulli" (see `sample_sql`)
+        timeout: Statement timeout of the sample query
+
+    Returns:
+        Dict like `DatabaseTool.execute_query` with `query` set to the exact
+        query, plus `approximate`, `error_bounds`, `sample_percent` and
+        `sample_query`; None if the query cannot be approximated or the
+        sample was empty
+    """
+    if method not in SAMPLE_METHODS:
+        raise ValueError(f"Unknown sample method '{method}'")
+    query = parse_aggregate(sql_query)
+    if query is None:
+        return None
+    dialect = db.settings.backend
+    sampled = sample_sql(query, percent, method, dialect)
+    if sampled is None:
+        return None
+
+    # 0 fetches every group, whatever `database.max_rows`
+    result = db.execute_query(sampled, max_rows=0, timeout=timeout)
+    if result["status"] != "success":
+        logger.warning(f"Sample query failed, not approximating: {result['message']}")
+        return None
+    sample = result["data"]
+    if sample.empty or not sample[Measure("count").name].fillna(0).any():
+        # Too small a table or sample, the estimate would be meaningless
+        return None
+
+    estimates = estimate(
+        query, sample, percent / 100, dialect, lambda: db.column_names(sql_query)
+    )
+    df = estimates["data"]
+    return {
+        "status": "success",
+        "data": df,
+        "query": sql_query,
+        "message": (
+            f"Approximate result from a {percent:g}% {method} sample "
+            f"(error bounds are 95% confidence half-widths)"
+        ),
+        "truncated": False,
+        "total_rows_estimate": len(df),
+        "memory_bytes": int(df.memory_usage(deep=True).sum()),
+        "approximate": True,
+        "error_bounds": estimates["error_bounds"],
+        "sample_percent": percent,
+        "sample_query": sampled,
+    }
+
+
+def describe_error_bounds(result: Dict[str, Any]) -> str:
+    """Summarize an approximate result's error bounds, one line per column."""
+    data, bounds = result["data"], result["error_bounds"]
+    lines = []
+    for position, name in enumerate(data.columns):
+        bound = bounds.iloc[:, position]
+        if bound.isna().all():
+            continue
+        values = pd.to_numeric(data.iloc[:, position], errors="coerce").abs()
+        relative = (bound / values.where(values != 0)).max()
+        if pd.isna(relative):
+            lines.append(f"- {name}: ±{bound.max():.4g} at most")
+        else:
+            lines.append(f"- {name}: ±{relative * 100:.1f}% at most")
+    return "\n".join(lines)
@@ -0,0 +1,209 @@
+import atexit
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Deque, Dict, Optional, Union
+
+import pandas as pd
+
+from app.config import PROJECT_ROOT, ArtifactSettings, config
+from app.logger import logger
+from app.startup import lazy_import
+from app.tools.query_stats import percentile
+
+try:
+    pa = lazy_import("pyarrow")
+except ImportError:  # pyarrow is optional, results are then written as CSV
+    pa = None
+
+# Write latencies kept for the percentiles
+_MAX_LATENCIES = 1000
+
+
+@dataclass
+class _Job:
+    payload: Union[pd.DataFrame, str]
+    enqueued_at: float
+
+
+class ArtifactWriter:
+    """Writes query results and SQL of agent memories in a background thread.
+
+    Writes are queued and never block the caller: a file that is already
+    waiting is replaced by its newer content, and when `max_queue` files are
+    waiting, new ones are dropped with a warning. Results are written as
+    compressed Parquet (or CSV), files are replaced atomically, and pending
+    writes are flushed when the process exits.
+
+    DataFrames are written as they are when their turn comes, callers must
+    not modify them in place after handing them over.
+    """
+
+    def __init__(self, settings: Optional[ArtifactSettings] = None):
+        # Settings are resolved on first use, like the database tool
+        self._settings = settings
+        self._pending: "OrderedDict[Path, _Job]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._busy = False
+        self._stop = False
+        self._thread: Optional[threading.Thread] = None
+        self._latencies: Deque[float] = deque(maxlen=_MAX_LATENCIES)
+        self._waits: Deque[float] = deque(maxlen=_MAX_LATENCIES)
+        self._counts = {"written": 0, "replaced": 0, "dropped": 0, "failed": 0}
+        self._bytes = 0
+
+    @property
+    def settings(self) -> ArtifactSettings:
+        return self._settings or config.artifacts
+
+    @property
+    def directory(self) -> Path:
+        return PROJECT_ROOT / self.settings.directory
+
+    def df_path(self, name: str) -> Path:
+        """Path of a result named `name`, with the configured format's suffix."""
+        suffix = "parquet" if self.settings.format == "parquet" and pa else "csv"
+        return self.directory / f"{name}.{suffix}"
+
+    def write_df(self, name: str, df: pd.DataFrame) -> Optional[Path]:
+        """Queue a result for writing to `df_path(name)`."""
+        return self._enqueue(self.df_path(name), df)
+
+    def write_text(self, filename: str, text: str) -> Optional[Path]:
+        """Queue a text file (e.g. SQL) for writing to the directory."""
+        return self._enqueue(self.directory / filename, text)
+
+    def _enqueue(self, path: Path, payload: Union[pd.DataFrame, str]) -> Optional[Path]:
+        """
+        Queue a file, without waiting for it to be written.
+
+        Returns:
+            The path the file will be written to, None if it was dropped
+        """
+        if not self.settings.enabled:
+            return None
+        with self._cond:
+            if path in self._pending:
+                # Only the latest content of a file matters
+                self._pending[path] = _Job(payload, self._pending[path].enqueued_at)
+                self._counts["replaced"] += 1
+                return path
+            if len(self._pending) >= self.settings.max_queue:
+                self._counts["dropped"] += 1
+                logger.warning(f"Artifact queue is full, not writing {path}")
+                return None
+            self._pending[path] = _Job(payload, time.perf_counter())
+            if self._thread is None or not self._thread.is_alive():
+                # Started on first use, or again after `close`
+                if self._thread is None:
+                    atexit.register(self.close)
+                self._stop = False
+                self._thread = threading.Thread(
+                    target=self._write_loop, name="artifact-writer", daemon=True
+                )
+                self._thread.start()
+            self._cond.notify()
+        return path
+
+    def _write_loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._stop:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                path, job = self._pending.popitem(last=False)
+                self._busy = True
+            try:
+                self._write(path, job)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _write(self, path: Path, job: _Job) -> None:
+        started = time.perf_counter()
+        tmp_path = path.with_name(path.name + ".tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if isinstance(job.payload, str):
+                tmp_path.write_text(job.payload, encoding="utf-8")
+            elif path.suffix == ".parquet":
+                try:
+                    job.payload.to_parquet(
+                        tmp_path, index=False, compression=self.settings.compression
+                    )
+                except (TypeError, ValueError, pa.ArrowException) as e:
+                    # e.g. object columns mixing types, which CSV takes as text
+                    logger.warning(f"Writing {path} as CSV instead of Parquet: {e}")
+                    path = path.with_suffix(".csv")
+                    job.payload.to_csv(tmp_path, index=False)
+            else:
+                job.payload.to_csv(tmp_path, index=False)
+            size = tmp_path.stat().st_size
+            tmp_path.replace(path)
+            if not isinstance(job.payload, str):
+                # An older result of the same name in the other format
+                other = ".csv" if path.suffix == ".parquet" else ".parquet"
+                path.with_suffix(other).unlink(missing_ok=True)
+        except Exception as e:
+            logger.warning(f"Could not write {path}: {e}")
+            with self._cond:
+                self._counts["failed"] += 1
+            return
+
+        finished = time.perf_counter()
+        with self._cond:
+            self._counts["written"] += 1
+            self._bytes += size
+            self._latencies.append((finished - started) * 1000)
+            self._waits.append((finished - job.enqueued_at) * 1000)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until all queued files are written.
+
+        Returns:
+            False if the timeout expired first
+        """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: not self._pending and not self._busy, timeout
+            )
+
+    def close(self, timeout: Optional[float] = 30.0) -> None:
+        """Write the queued files and stop the writer thread."""
+        if not self.flush(timeout):
+            logger.warning(f"{len(self._pending)} artifacts were not written")
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Write metrics of this process.
+
+        Returns:
+            Dict with the written, replaced, dropped and failed file counts,
+            queued files, bytes written, and p50/p95/max of the write time
+            (`write_*_ms`) and of the time from queueing to written
+            (`latency_*_ms`)
+        """
+        with self._cond:
+            latencies, waits = list(self._latencies), list(self._waits)
+            stats: Dict[str, Any] = {
+                **self._counts,
+                "queued": len(self._pending),
+                "bytes": self._bytes,
+            }
+        for prefix, values in (("write", latencies), ("latency", waits)):
+            stats[f"{prefix}_p50_ms"] = percentile(values, 50)
+            stats[f"{prefix}_p95_ms"] = percentile(values, 95)
+            stats[f"{prefix}_max_ms"] = max(values, default=0.0)
+        return stats
+
+
+# Create a singleton instance
+artifact_writer = ArtifactWriter()
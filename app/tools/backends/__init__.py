@@ -0,0 +1,42 @@
+from typing import Optional
+
+from app.config import DatabaseSettings, PGSettings
+from app.tools.backends.base import DatabaseBackend
+
+
+def create_backend(
+    settings: DatabaseSettings, pg: Optional[PGSettings] = None
+) -> DatabaseBackend:
+    """
+    Create the database backend selected by `database.backend`.
+
+    Backend modules are imported on demand, so psycopg2 and duckdb are only
+    required when their backend is used.
+
+    Args:
+        settings: The `[database]` settings
+        pg: Connection settings of the postgres backend
+
+    Returns:
+        DatabaseBackend: The backend instance
+
+    Raises:
+        ValueError: If the postgres backend is selected without `[pg]` settings
+    """
+    if settings.backend == "sqlite":
+        from app.tools.backends.sqlite_backend import SQLiteBackend
+
+        return SQLiteBackend(settings)
+    if settings.backend == "duckdb":
+        from app.tools.backends.duckdb_backend import DuckDBBackend
+
+        return DuckDBBackend(settings)
+
+    if pg is None:
+        raise ValueError("The postgres backend requires a [pg] config section")
+    from app.tools.backends.postgres_backend import PostgresBackend
+
+    return PostgresBackend(settings, pg)
+
+
+__all__ = ["DatabaseBackend", "create_backend"]
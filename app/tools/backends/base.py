@@ -0,0 +1,254 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import pandas as pd
+
+from app.config import DatabaseSettings
+from app.logger import logger
+from app.tools.pg_types import compact_dataframe
+
+# `error_type` of failed results, so callers can react without parsing messages
+ERROR = "error"
+TIMEOUT = "timeout"  # the statement timeout cancelled the query
+CANCELLED = "cancelled"  # the caller cancelled the query
+READ_ONLY = "read_only"  # the query tried to write
+BUSY = "busy"  # no connection was available
+
+
+class QueryTimeoutError(Exception):
+    """Raised when a streamed query exceeds the statement timeout."""
+
+
+class QueryCancelledError(Exception):
+    """Raised when a streamed query is cancelled by the caller."""
+
+
+class DatabaseBackend(ABC):
+    """Abstract interface of the databases `DatabaseTool` can run agent SQL on.
+
+    Backends return the same result dict from `execute`, so the SQLAgent fix
+    loop behaves identically on every engine. Subclasses implement query
+    execution, streaming, schema introspection and EXPLAIN.
+    """
+
+    # Human readable name of the SQL dialect, used in SQL generation prompts
+    dialect: str = ""
+
+    def __init__(self, settings: DatabaseSettings):
+        self.settings = settings
+
+    @property
+    @abstractmethod
+    def sqlalchemy_url(self) -> str:
+        """SQLAlchemy URL of the database, e.g. for `SchemaGenerator`."""
+
+    @abstractmethod
+    def execute(
+        self,
+        sql_query: str,
+        max_rows: Optional[int] = None,
+        fetch_mode: Optional[str] = None,
+        timeout: Optional[float] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> Dict[str, Any]:
+        """Execute a SELECT query and return the result dict.
+
+        Args:
+            sql_query: The SQL query to execute
+            max_rows: Fetch at most this many rows (None fetches everything)
+            fetch_mode: Backend specific result loading path
+            timeout: Seconds after which the query is cancelled (None = no limit)
+            cancel: Event the caller sets to cancel the running query
+
+        Returns:
+            Dict containing status, data, query and message, plus
+            `truncated` and `total_rows_estimate` for successful queries and
+            `error_type` for failed ones
+        """
+
+    @abstractmethod
+    def stream(self, sql_query: str, batch_size: int) -> Iterator[pd.DataFrame]:
+        """Yield the result of a SELECT query in DataFrame chunks."""
+
+    @abstractmethod
+    def get_tables(self) -> List[str]:
+        """List the tables (and views) agents can query."""
+
+    @abstractmethod
+    def get_columns(self, table_name: str) -> List[Dict[str, Any]]:
+        """List the columns of a table as dicts with name, type and nullable."""
+
+    @abstractmethod
+    def explain(self, sql_query: str) -> str:
+        """Return the query plan of a query as text."""
+
+    def column_names(self, sql_query: str) -> List[str]:
+        """Names of a query's result columns, as `execute` returns them.
+
+        Raises:
+            ValueError: If the query fails
+        """
+        body = sql_query.strip().rstrip(";")
+        # Without rows, the database only plans the query
+        result = self.execute(f"SELECT * FROM ({body}) AS _names_q LIMIT 0")
+        if result["status"] != "success":
+            raise ValueError(result["message"])
+        return list(result["data"].columns)
+
+    def execute_write(self, statements: List[str]) -> None:
+        """Run DDL/DML statements in one transaction, bypassing `read_only`.
+
+        Only for maintenance jobs such as rollup refreshes, never for agent SQL.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support writes")
+
+    def table_change_counters(self) -> Dict[str, int]:
+        """Return a counter per table that moves whenever its rows change."""
+        raise NotImplementedError(f"{type(self).__name__} does not track table changes")
+
+    def listen(
+        self, channel: str, callback: Callable[[str], None], stop: threading.Event
+    ) -> None:
+        """Pass payloads of change notifications to `callback` until `stop` is set."""
+        raise NotImplementedError(
+            f"{type(self).__name__} does not support change notifications"
+        )
+
+    def test_connection(self) -> str:
+        """Test the database connection and return status information."""
+        result = self.execute("SELECT 1 AS test")
+        if result["status"] != "success":
+            return f"Database connection error: {result['message']}"
+        value = result["data"].iloc[0, 0] if not result["data"].empty else None
+        if value == 1:
+            return "Database connection successful. Test query returned: 1"
+        return f"Connection established but unexpected result: {value}"
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return backend specific connection metrics."""
+        return {}
+
+    def close(self) -> None:
+        """Close all database connections."""
+
+    def _success_result(
+        self,
+        sql_query: str,
+        df: pd.DataFrame,
+        truncated: bool = False,
+        total_rows: Optional[int] = None,
+        raw_bytes: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """Compact the result's dtypes and build the result dict.
+
+        Args:
+            raw_bytes: Size of the result before any dtype mapping, to report
+                the memory saved (defaults to the size of `df`)
+        """
+        if raw_bytes is None:
+            raw_bytes = int(df.memory_usage(deep=True).sum())
+        if self.settings.compact_results:
+            df, _ = compact_dataframe(
+                df,
+                category_threshold=self.settings.category_threshold,
+                arrow_strings=self.settings.arrow_strings,
+            )
+        memory_bytes = int(df.memory_usage(deep=True).sum())
+        memory_saved = raw_bytes - memory_bytes
+        logger.debug(
+            f"Result uses {memory_bytes} bytes ({memory_saved} bytes saved by "
+            f"dtype mapping)"
+        )
+
+        message = "SELECT query executed successfully"
+        if truncated:
+            message += f" (first {len(df)} of ~{total_rows} rows)"
+        return {
+            "status": "success",
+            "data": df,
+            "query": sql_query,
+            "message": message,
+            "truncated": truncated,
+            "total_rows_estimate": max(total_rows or 0, len(df)),
+            "memory_bytes": memory_bytes,
+            "memory_saved_bytes": memory_saved,
+        }
+
+    @staticmethod
+    def _error_result(
+        sql_query: str, message: str, error_type: str = ERROR
+    ) -> Dict[str, Any]:
+        return {
+            "status": "error",
+            "data": pd.DataFrame([]),
+            "query": sql_query,
+            "message": message,
+            "error_type": error_type,
+        }
+
+    @staticmethod
+    def _timeout_message(timeout: Optional[float]) -> str:
+        limit = f" of {timeout:g}s" if timeout else ""
+        return f"Query exceeded the statement timeout{limit} and was cancelled"
+
+    @staticmethod
+    @contextmanager
+    def _interrupt_on(
+        interrupt: Callable[[], None],
+        cancel: Optional[threading.Event] = None,
+        timeout: Optional[float] = None,
+    ) -> Iterator[Dict[str, bool]]:
+        """
+        Call `interrupt` from a watcher thread when `cancel` is set or
+        `timeout` seconds have passed, until the `with` block ends.
+
+        Yields:
+            Dict telling whether the query was `cancelled` or `timed_out`
+        """
+        fired = {"cancelled": False, "timed_out": False}
+        if cancel is None and not timeout:
+            yield fired
+            return
+
+        done = threading.Event()
+        deadline = time.monotonic() + timeout if timeout else None
+
+        def watch():
+            while not done.wait(0.05):
+                if cancel is not None and cancel.is_set():
+                    fired["cancelled"] = True
+                elif deadline is not None and time.monotonic() >= deadline:
+                    fired["timed_out"] = True
+                else:
+                    continue
+                interrupt()
+                return
+
+        watcher = threading.Thread(target=watch, daemon=True)
+        watcher.start()
+        try:
+            yield fired
+        finally:
+            # Never interrupt the connection once the query is done
+            done.set()
+            watcher.join()
+
+    def _call_with_timeout(
+        self, interrupt: Callable[[], None], call: Callable[[], Any], timeout
+    ) -> Any:
+        """
+        Run `call`, e.g. a stream's next fetch, interrupted after `timeout`.
+
+        Raises:
+            QueryTimeoutError: If the timeout interrupted the call
+        """
+        with self._interrupt_on(interrupt, timeout=timeout) as fired:
+            try:
+                return call()
+            except Exception as e:
+                if fired["timed_out"]:
+                    raise QueryTimeoutError(self._timeout_message(timeout)) from e
+                raise
@@ -0,0 +1,208 @@
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import duckdb
+import pandas as pd
+
+from app.config import PROJECT_ROOT, DatabaseSettings
+from app.tools.backends.base import CANCELLED, READ_ONLY, TIMEOUT, DatabaseBackend
+from app.tools.sql_parse import is_read_only_query
+
+# DuckDB produces results in vectors of this many rows
+_VECTOR_SIZE = 2048
+
+_READ_ONLY_MESSAGE = "Only single SELECT queries can run on a read-only database"
+
+
+class DuckDBBackend(DatabaseBackend):
+    """DuckDB backend for local analytical file databases.
+
+    Results are materialized column-wise with `fetch_df`, without building
+    Python row tuples. Each thread queries through its own cursor of a single
+    shared database connection.
+    """
+
+    dialect = "DuckDB"
+
+    def __init__(self, settings: DatabaseSettings):
+        super().__init__(settings)
+        path = settings.path or ":memory:"
+        if path != ":memory:" and not Path(path).is_absolute():
+            path = str(PROJECT_ROOT / path)
+        self.path = path
+        self._connection: Optional[duckdb.DuckDBPyConnection] = None
+        self._connection_read_only = False
+        # Bumped when the shared connection is replaced, to renew thread cursors
+        self._generation = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @property
+    def sqlalchemy_url(self) -> str:
+        # Requires the duckdb_engine SQLAlchemy dialect
+        return f"duckdb:///{self.path}"
+
+    @property
+    def connection(self) -> duckdb.DuckDBPyConnection:
+        """The cursor of the calling thread, opened on first use."""
+        cursor = getattr(self._local, "cursor", None)
+        if cursor is None or self._local.generation != self._generation:
+            with self._lock:
+                if self._connection is None:
+                    # In-memory and new databases cannot be opened read-only
+                    read_only = (
+                        self.settings.read_only
+                        and self.path != ":memory:"
+                        and Path(self.path).exists()
+                    )
+                    self._connection = duckdb.connect(self.path, read_only=read_only)
+                    self._connection_read_only = read_only
+                cursor = self._connection.cursor()
+                self._local.generation = self._generation
+            self._local.cursor = cursor
+        return cursor
+
+    def execute(
+        self,
+        sql_query: str,
+        max_rows: Optional[int] = None,
+        fetch_mode: Optional[str] = None,
+        timeout: Optional[float] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> Dict[str, Any]:
+        """Execute the query; `fetch_mode` is ignored (results are columnar).
+
+        Timeouts and cancellation interrupt the thread's cursor from a watcher
+        thread. In-memory and new databases cannot be opened read-only, so
+        with `read_only` only single SELECT/WITH queries run on them.
+        """
+        body = sql_query.strip().rstrip(";")
+        cursor = self.connection
+        if self._writable_while_read_only(body):
+            return self._error_result(sql_query, _READ_ONLY_MESSAGE, READ_ONLY)
+        with self._interrupt_on(cursor.interrupt, cancel, timeout) as fired:
+            try:
+                if max_rows is None:
+                    df = cursor.execute(body).fetch_df()
+                    truncated, total_rows = False, len(df)
+                else:
+                    # One extra row tells whether the result was truncated
+                    df = cursor.execute(
+                        f"SELECT * FROM ({body}) AS _capped_q LIMIT {max_rows + 1}"
+                    ).fetch_df()
+                    truncated = len(df) > max_rows
+                    total_rows = len(df)
+                    if truncated:
+                        df = df.iloc[:max_rows]
+                        total_rows = cursor.execute(
+                            f"SELECT COUNT(*) FROM ({body}) AS _count_q"
+                        ).fetchone()[0]
+            except duckdb.Error as e:
+                if fired["cancelled"]:
+                    return self._error_result(
+                        sql_query, "Query was cancelled", CANCELLED
+                    )
+                if fired["timed_out"]:
+                    return self._error_result(
+                        sql_query, self._timeout_message(timeout), TIMEOUT
+                    )
+                if "read-only" in str(e):
+                    return self._error_result(sql_query, str(e), READ_ONLY)
+                return self._error_result(sql_query, str(e))
+        return self._success_result(sql_query, df, truncated, int(total_rows))
+
+    def _writable_while_read_only(self, sql_query: str) -> bool:
+        """Whether a query could write through a connection that should not."""
+        return (
+            self.settings.read_only
+            and not self._connection_read_only
+            and not is_read_only_query(sql_query)
+        )
+
+    def execute_write(self, statements: List[str]) -> None:
+        """Run the statements in one transaction.
+
+        A file cannot be open read-only and read-write in one process, so a
+        read-only shared connection is closed and the statements run on a
+        short-lived read-write connection; the shared connection is reopened
+        on next use. Queries running meanwhile fail. Writing still fails if
+        another process has the file open.
+        """
+        with self._lock:
+            if self._connection is not None and self._connection_read_only:
+                self._connection.close()
+                self._connection = None
+                self._generation += 1
+            if self._connection is None:
+                connection = duckdb.connect(self.path)
+                cursor = connection.cursor()
+            else:
+                connection = None
+                cursor = self._connection.cursor()
+            try:
+                cursor.execute("BEGIN TRANSACTION")
+                try:
+                    for statement in statements:
+                        cursor.execute(statement)
+                    cursor.execute("COMMIT")
+                except duckdb.Error:
+                    cursor.execute("ROLLBACK")
+                    raise
+            finally:
+                cursor.close()
+                if connection is not None:
+                    connection.close()
+
+    def stream(self, sql_query: str, batch_size: int) -> Iterator[pd.DataFrame]:
+        """Fetch vectors in chunks; the statement timeout applies to every chunk."""
+        cursor = self.connection
+        if self._writable_while_read_only(sql_query):
+            raise ValueError(_READ_ONLY_MESSAGE)
+        timeout = self.settings.statement_timeout
+        cursor = self._call_with_timeout(
+            cursor.interrupt, lambda: cursor.execute(sql_query), timeout
+        )
+        vectors = max(1, batch_size // _VECTOR_SIZE)
+        while True:
+            chunk = self._call_with_timeout(
+                cursor.interrupt, lambda: cursor.fetch_df_chunk(vectors), timeout
+            )
+            if chunk.empty:
+                break
+            yield chunk
+
+    def get_tables(self) -> List[str]:
+        rows = self.connection.execute(
+            "SELECT table_schema, table_name FROM information_schema.tables "
+            "WHERE table_schema NOT IN ('information_schema', 'pg_catalog') "
+            "ORDER BY table_schema, table_name"
+        ).fetchall()
+        return [f"{schema}.{table}" for schema, table in rows]
+
+    def get_columns(self, table_name: str) -> List[Dict[str, Any]]:
+        schema, _, table = table_name.rpartition(".")
+        rows = self.connection.execute(
+            "SELECT column_name, data_type, is_nullable = 'YES' "
+            "FROM information_schema.columns "
+            "WHERE table_schema = ? AND table_name = ? ORDER BY ordinal_position",
+            [schema or "main", table],
+        ).fetchall()
+        return [
+            {"name": name, "type": data_type, "nullable": nullable}
+            for name, data_type, nullable in rows
+        ]
+
+    def explain(self, sql_query: str) -> str:
+        rows = self.connection.execute(f"EXPLAIN {sql_query}").fetchall()
+        # (explain_key, explain_value)
+        return "\n".join(row[1] for row in rows)
+
+    def close(self) -> None:
+        """Close the database connection and the cursors of all threads."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+            self._generation += 1
+        self._local = threading.local()
@@ -0,0 +1,497 @@
+import functools
+import json
+import os
+import select
+import threading
+import uuid
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+import psycopg2
+import psycopg2.errors
+from psycopg2 import extensions, sql
+
+from app.config import DatabaseSettings, PGSettings
+from app.logger import logger
+from app.tools.backends.base import (
+    BUSY,
+    CANCELLED,
+    READ_ONLY,
+    TIMEOUT,
+    DatabaseBackend,
+    QueryTimeoutError,
+)
+from app.tools.connection_pool import ConnectionPool, PoolTimeoutError
+from app.tools.replica_router import PRIMARY, ReplicaRouter, is_connection_error
+from app.tools.pg_types import COPY_NULL, parse_copy_csv, to_native_dtypes
+
+
+class PostgresBackend(DatabaseBackend):
+    """PostgreSQL/Supabase backend.
+
+    Every query borrows its own connection from a thread-safe pool, so agents
+    running in different threads or Streamlit sessions never share a
+    transaction.
+    """
+
+    dialect = "Supabase (PostgreSQL)"
+
+    def __init__(self, settings: DatabaseSettings, pg: PGSettings):
+        super().__init__(settings)
+        self.pg = pg
+        self._pool: Optional[ConnectionPool] = None
+        self._router: Optional[ReplicaRouter] = None
+        self._pool_lock = threading.Lock()
+
+    @property
+    def sqlalchemy_url(self) -> str:
+        return (
+            f"postgresql+psycopg2://{self.pg.user}:{self.pg.password}"
+            f"@{self.pg.host}:{self.pg.port}/{self.pg.database}"
+        )
+
+    @property
+    def pool(self) -> ConnectionPool:
+        """The connection pool, created on first use."""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ConnectionPool(
+                        connect=self._connect,
+                        min_size=self.pg.pool_min_size,
+                        max_size=self.pg.pool_max_size,
+                        timeout=self.pg.pool_timeout,
+                        health_check_interval=self.pg.pool_health_check_interval,
+                    )
+        return self._pool
+
+    @property
+    def router(self) -> Optional[ReplicaRouter]:
+        """The read replica router, created on first use (None without replicas)."""
+        if not self.pg.replicas:
+            return None
+        if self._router is None:
+            primary = self.pool
+            with self._pool_lock:
+                if self._router is None:
+                    replicas = {}
+                    for i, dsn in enumerate(self.pg.replicas, start=1):
+                        host = extensions.parse_dsn(dsn).get("host", "")
+                        replicas[f"replica{i}:{host}"] = ConnectionPool(
+                            connect=functools.partial(self._connect, dsn),
+                            # An unreachable replica must not fail startup
+                            min_size=0,
+                            max_size=self.pg.pool_max_size,
+                            timeout=self.pg.pool_timeout,
+                            health_check_interval=self.pg.pool_health_check_interval,
+                        )
+                    self._router = ReplicaRouter(
+                        primary,
+                        replicas,
+                        max_lag=self.pg.max_replica_lag,
+                        check_interval=self.pg.replica_check_interval,
+                    )
+        return self._router
+
+    def _read_pool(self) -> Tuple[str, ConnectionPool]:
+        """Pool of the next read-only query: a replica if one qualifies."""
+        router = self.router
+        if router is None or not self.settings.read_only:
+            return PRIMARY, self.pool
+        return router.choose()
+
+    def _connect(self, dsn: Optional[str] = None):
+        """Open a new PostgreSQL connection (to a replica if `dsn` is given)."""
+        if dsn:
+            connection = psycopg2.connect(dsn)
+        else:
+            connection = psycopg2.connect(
+                host=self.pg.host,
+                database=self.pg.database,
+                port=self.pg.port,
+                user=self.pg.user,
+                password=self.pg.password,
+            )
+        # Autocommit mode to avoid transaction blocks
+        connection.autocommit = False
+        return connection
+
+    def execute(
+        self,
+        sql_query: str,
+        max_rows: Optional[int] = None,
+        fetch_mode: Optional[str] = None,
+        timeout: Optional[float] = None,
+        cancel: Optional[threading.Event] = None,
+        attempts: int = 2,
+    ) -> Dict[str, Any]:
+        """Run the query on a pooled connection, reconnecting once if it was lost.
+
+        Read-only queries run on the least busy healthy replica when replicas
+        are configured; if the replica fails, the retry goes to the primary.
+        The timeout is enforced by the server (`statement_timeout`) and
+        cancellation sends a cancel request for the running statement.
+
+        Args:
+            fetch_mode: "rows" to fetch Python tuples, or "copy" to bulk load
+                the result through `COPY ... TO STDOUT` into native dtypes
+                (defaults to `pg.fetch_mode`)
+        """
+        fetch_mode = fetch_mode or self.pg.fetch_mode
+        for attempt in range(1, attempts + 1):
+            target = PRIMARY
+            try:
+                # Creating a pool connects, which fails like a query
+                target, pool = self._read_pool()
+                with pool.connection() as connection:
+                    try:
+                        self._apply_limits(connection, timeout)
+                        with self._interrupt_on(connection.cancel, cancel):
+                            if fetch_mode == "copy":
+                                return self._run_copy_query(
+                                    connection, sql_query, max_rows
+                                )
+                            if max_rows is not None:
+                                return self._run_capped_query(
+                                    connection, sql_query, max_rows
+                                )
+                            return self._run_query(connection, sql_query)
+                    except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                        if not connection.closed or attempt == attempts:
+                            raise
+                        # The pool discards the closed connection on return
+                        logger.warning(f"Database connection lost, retrying: {e}")
+                        if target != PRIMARY:
+                            self.router.mark_failed(target, e)
+            except PoolTimeoutError as e:
+                if target != PRIMARY and attempt < attempts:
+                    continue  # The saturated replica is skipped on the retry
+                return self._error_result(sql_query, f"Database is busy: {e}", BUSY)
+            except psycopg2.errors.QueryCanceled as e:
+                if cancel is not None and cancel.is_set():
+                    return self._error_result(
+                        sql_query, "Query was cancelled", CANCELLED
+                    )
+                if timeout:
+                    return self._error_result(
+                        sql_query, self._timeout_message(timeout), TIMEOUT
+                    )
+                return self._error_result(sql_query, str(e), TIMEOUT)
+            except psycopg2.errors.ReadOnlySqlTransaction as e:
+                return self._error_result(sql_query, str(e), READ_ONLY)
+            except Exception as e:
+                if target != PRIMARY and is_connection_error(e) and attempt < attempts:
+                    # e.g. the replica refused the connection
+                    self.router.mark_failed(target, e)
+                    continue
+                # The pool rolls back any open transaction on return
+                return self._error_result(sql_query, str(e))
+        return self._error_result(sql_query, "Database connection lost")
+
+    def _apply_limits(self, connection, timeout: Optional[float] = None) -> None:
+        """Limit the transaction the next query runs in, in one round trip."""
+        statements = []
+        if self.settings.read_only:
+            statements.append("SET TRANSACTION READ ONLY")
+        if timeout:
+            # Without a timeout the server default (or role setting) applies
+            statements.append(f"SET LOCAL statement_timeout = {int(timeout * 1000)}")
+        if self.settings.work_mem:
+            statements.append("SET LOCAL work_mem = %(work_mem)s")
+        if statements:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "; ".join(statements), {"work_mem": self.settings.work_mem}
+                )
+
+    def _run_query(self, connection, sql_query: str) -> Dict[str, Any]:
+        """Execute the query on the given connection and fetch the result."""
+        # Create a new cursor for each query to avoid transaction issues
+        with connection.cursor() as cursor:
+            cursor.execute(sql_query)
+            try:
+                # Try to fetch results (for SELECT queries)
+                result = cursor.fetchall()
+                df = pd.DataFrame(
+                    result, columns=[desc[0] for desc in cursor.description]
+                )
+
+                description = cursor.description
+
+                # Commit the transaction
+                connection.commit()
+
+                return self._typed_result(sql_query, df, description)
+            except psycopg2.ProgrammingError:
+                # This happens for non-SELECT queries (INSERT, UPDATE, etc.)
+                # so we don't need to commit the transaction
+                connection.rollback()
+                return self._error_result(
+                    sql_query, "non-SELECT queries (INSERT, UPDATE, etc.)"
+                )
+
+    def _run_capped_query(
+        self, connection, sql_query: str, max_rows: int
+    ) -> Dict[str, Any]:
+        """Fetch at most `max_rows` rows in batches from a server-side cursor."""
+        rows = []
+        with connection.cursor(name=self._cursor_name()) as cursor:
+            cursor.execute(sql_query)
+            # Fetch one extra row to tell whether the result was truncated
+            while len(rows) <= max_rows:
+                batch = cursor.fetchmany(
+                    min(self.settings.fetch_batch_size, max_rows + 1 - len(rows))
+                )
+                if not batch:
+                    break
+                rows.extend(batch)
+            description = cursor.description
+
+        truncated = len(rows) > max_rows
+        df = pd.DataFrame(rows[:max_rows], columns=[desc[0] for desc in description])
+        total_rows = (
+            self._estimate_rows(connection, sql_query) if truncated else len(df)
+        )
+        connection.commit()
+
+        return self._typed_result(sql_query, df, description, truncated, total_rows)
+
+    def _run_copy_query(
+        self, connection, sql_query: str, max_rows: Optional[int]
+    ) -> Dict[str, Any]:
+        """Bulk load the result with `COPY (query) TO STDOUT` as CSV."""
+        body = sql_query.strip().rstrip(";")
+        if max_rows is not None:
+            # One extra row tells whether the result was truncated
+            body = f"SELECT * FROM ({body}) AS _copy_q LIMIT {max_rows + 1}"
+
+        # Resolve column names and types without running the query
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT * FROM ({body}) AS _copy_q LIMIT 0")
+            description = cursor.description
+        names = [desc[0] for desc in description]
+        if len(set(names)) != len(names):
+            # CSV columns are matched by name, duplicates need the tuple path
+            if max_rows is not None:
+                return self._run_capped_query(connection, sql_query, max_rows)
+            return self._run_query(connection, sql_query)
+
+        df = self._copy_to_dataframe(connection, body, description)
+        truncated = max_rows is not None and len(df) > max_rows
+        if truncated:
+            df = df.iloc[:max_rows]
+        total_rows = (
+            self._estimate_rows(connection, sql_query) if truncated else len(df)
+        )
+        connection.commit()
+
+        return self._typed_result(sql_query, df, description, truncated, total_rows)
+
+    def _typed_result(
+        self,
+        sql_query: str,
+        df: pd.DataFrame,
+        description,
+        truncated: bool = False,
+        total_rows: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """Convert the result to native dtypes by type OID, then build the result."""
+        raw_bytes = int(df.memory_usage(deep=True).sum())
+        df = to_native_dtypes(df, description)
+        return self._success_result(sql_query, df, truncated, total_rows, raw_bytes)
+
+    @staticmethod
+    def _copy_to_dataframe(connection, body: str, description) -> pd.DataFrame:
+        """Pipe COPY output from a writer thread straight into the CSV parser."""
+        read_fd, write_fd = os.pipe()
+        errors = []
+
+        def produce():
+            try:
+                with os.fdopen(write_fd, "wb") as writer:
+                    with connection.cursor() as cursor:
+                        cursor.copy_expert(
+                            f"COPY ({body}) TO STDOUT "
+                            f"WITH (FORMAT csv, NULL '{COPY_NULL}')",
+                            writer,
+                        )
+            except Exception as e:
+                errors.append(e)
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+        try:
+            with os.fdopen(read_fd, "rb") as reader:
+                df = parse_copy_csv(reader, description)
+        finally:
+            producer.join()
+        if errors:
+            raise errors[0]
+        return df
+
+    def stream(self, sql_query: str, batch_size: int) -> Iterator[pd.DataFrame]:
+        """Fetch rows in batches from a named server-side cursor.
+
+        The pooled connection is held until the iterator is exhausted or closed.
+        """
+        _, pool = self._read_pool()
+        with pool.connection() as connection:
+            # The statement timeout applies to every fetched batch
+            timeout = self.settings.statement_timeout
+            try:
+                self._apply_limits(connection, timeout)
+                with connection.cursor(name=self._cursor_name()) as cursor:
+                    cursor.itersize = batch_size
+                    cursor.execute(sql_query)
+                    batch = cursor.fetchmany(batch_size)
+                    while batch:
+                        # Categories are not applied per chunk, they would not
+                        # survive concatenation of chunks with different values
+                        yield to_native_dtypes(
+                            pd.DataFrame(
+                                batch, columns=[desc[0] for desc in cursor.description]
+                            ),
+                            cursor.description,
+                        )
+                        batch = cursor.fetchmany(batch_size)
+            except psycopg2.errors.QueryCanceled as e:
+                raise QueryTimeoutError(self._timeout_message(timeout)) from e
+            connection.commit()
+
+    def get_tables(self) -> List[str]:
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT table_schema, table_name FROM information_schema.tables "
+                    "WHERE table_schema NOT IN ('pg_catalog', 'information_schema') "
+                    "ORDER BY table_schema, table_name"
+                )
+                rows = cursor.fetchall()
+            connection.commit()
+        return [f"{schema}.{table}" for schema, table in rows]
+
+    def get_columns(self, table_name: str) -> List[Dict[str, Any]]:
+        schema, _, table = table_name.rpartition(".")
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT column_name, data_type, is_nullable = 'YES' "
+                    "FROM information_schema.columns "
+                    "WHERE table_schema = %s AND table_name = %s "
+                    "ORDER BY ordinal_position",
+                    (schema or "public", table),
+                )
+                rows = cursor.fetchall()
+            connection.commit()
+        return [
+            {"name": name, "type": data_type, "nullable": nullable}
+            for name, data_type, nullable in rows
+        ]
+
+    def explain(self, sql_query: str) -> str:
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN {sql_query.strip().rstrip(';')}")
+                plan = "\n".join(row[0] for row in cursor.fetchall())
+            connection.commit()
+        return plan
+
+    def execute_write(self, statements: List[str]) -> None:
+        """Run the statements on the primary in one transaction, without limits."""
+        with self.pool.connection() as connection:
+            try:
+                with connection.cursor() as cursor:
+                    for statement in statements:
+                        cursor.execute(statement)
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+
+    def table_change_counters(self) -> Dict[str, int]:
+        """Rows inserted, updated and deleted per table since the stats reset.
+
+        The statistics collector reports changes with a small delay, so the
+        cache TTL still bounds how stale a result can get.
+        """
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT relname, n_tup_ins + n_tup_upd + n_tup_del "
+                    "FROM pg_stat_user_tables"
+                )
+                rows = cursor.fetchall()
+            connection.commit()
+        counters: Dict[str, int] = {}
+        for table, changes in rows:
+            # Tables with the same name in several schemas share one counter
+            counters[table] = counters.get(table, 0) + int(changes)
+        return counters
+
+    def listen(
+        self, channel: str, callback: Callable[[str], None], stop: threading.Event
+    ) -> None:
+        """LISTEN on `channel` with a dedicated connection until `stop` is set.
+
+        Tables announce their changes with a trigger such as
+        `PERFORM pg_notify('table_changed', TG_TABLE_NAME)`.
+        """
+        connection = self._connect()
+        connection.autocommit = True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(sql.SQL("LISTEN {}").format(sql.Identifier(channel)))
+            while not stop.is_set():
+                # Wake up regularly to check the stop event
+                if select.select([connection], [], [], 1.0) == ([], [], []):
+                    continue
+                connection.poll()
+                while connection.notifies:
+                    callback(connection.notifies.pop(0).payload)
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _cursor_name() -> str:
+        return f"stream_{uuid.uuid4().hex}"
+
+    @staticmethod
+    def _estimate_rows(connection, sql_query: str) -> int:
+        """Estimate the total row count of a query from the planner."""
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {sql_query.strip().rstrip(';')}")
+                plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]["Plan"]["Plan Rows"])
+        except (psycopg2.Error, LookupError, TypeError, ValueError):
+            return 0
+
+    def test_connection(self) -> str:
+        try:
+            with self.pool.connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1 AS test")
+                    result = cursor.fetchone()
+                    if result and result[0] == 1:
+                        return "Database connection successful. Test query returned: 1"
+                    else:
+                        return f"Connection established but unexpected result: {result}"
+        except Exception as e:
+            return f"Database connection error: {str(e)}"
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return connection pool metrics, and replica routing if configured."""
+        metrics = self.pool.metrics()
+        if self._router is not None:
+            metrics["routing"] = self._router.metrics()
+        return metrics
+
+    def close(self) -> None:
+        """Close all pooled database connections."""
+        if self._router:
+            self._router.close()
+            self._router = None
+        if self._pool:
+            self._pool.closeall()
@@ -0,0 +1,207 @@
+import sqlite3
+import threading
+import weakref
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from app.config import PROJECT_ROOT, DatabaseSettings
+from app.tools.backends.base import CANCELLED, READ_ONLY, TIMEOUT, DatabaseBackend
+
+
+class SQLiteBackend(DatabaseBackend):
+    """SQLite backend for local file databases.
+
+    sqlite3 connections must not be shared between threads, so every thread
+    gets its own connection to the database file. Connections of threads
+    that have exited are closed when the next one is opened. Without a
+    `path`, the threads share one in-memory database (a named shared-cache
+    database), which lives until `close`.
+    """
+
+    dialect = "SQLite"
+
+    def __init__(self, settings: DatabaseSettings):
+        super().__init__(settings)
+        self._keep_alive: Optional[sqlite3.Connection] = None
+        if settings.path in (None, ":memory:"):
+            # A plain :memory: connection would be a separate, empty database
+            # per thread and per `execute_write`
+            self.path = f"file:sqlite_backend_{id(self)}?mode=memory&cache=shared"
+            self._uri = True
+            # The database is dropped when its last connection closes
+            self._keep_alive = self._connect()
+        else:
+            path = settings.path
+            if not Path(path).is_absolute():
+                path = str(PROJECT_ROOT / path)
+            self.path = path
+            self._uri = False
+        self._local = threading.local()
+        # Connections with the thread using them
+        self._connections: List[
+            Tuple["weakref.ref[threading.Thread]", sqlite3.Connection]
+        ] = []
+        self._lock = threading.Lock()
+
+    @property
+    def sqlalchemy_url(self) -> str:
+        if self._uri:
+            return f"sqlite:///{self.path}&uri=true"
+        return f"sqlite:///{self.path}"
+
+    def _connect(self, **kwargs) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, uri=self._uri, **kwargs)
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """The connection of the calling thread, opened on first use."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._connect(check_same_thread=False)
+            if self.settings.read_only:
+                connection.execute("PRAGMA query_only = ON")
+            self._local.connection = connection
+            with self._lock:
+                self._close_exited()
+                self._connections.append(
+                    (weakref.ref(threading.current_thread()), connection)
+                )
+        return connection
+
+    def _close_exited(self) -> None:
+        """Close the connections of exited threads, e.g. of a finished pool."""
+        open_connections = []
+        for thread_ref, connection in self._connections:
+            thread = thread_ref()
+            if thread is not None and thread.is_alive():
+                open_connections.append((thread_ref, connection))
+            else:
+                connection.close()
+        self._connections = open_connections
+
+    def execute(
+        self,
+        sql_query: str,
+        max_rows: Optional[int] = None,
+        fetch_mode: Optional[str] = None,
+        timeout: Optional[float] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> Dict[str, Any]:
+        """Execute the query; `fetch_mode` is ignored (there is no COPY).
+
+        Timeouts and cancellation interrupt the connection from a watcher
+        thread (`sqlite3.Connection.interrupt`).
+        """
+        connection = self.connection
+        with self._interrupt_on(connection.interrupt, cancel, timeout) as fired:
+            try:
+                cursor = connection.execute(sql_query)
+                if cursor.description is None:
+                    connection.rollback()
+                    return self._error_result(
+                        sql_query, "non-SELECT queries (INSERT, UPDATE, etc.)"
+                    )
+                columns = [desc[0] for desc in cursor.description]
+                if max_rows is None:
+                    rows = cursor.fetchall()
+                else:
+                    # Fetch one extra row to tell whether the result was truncated
+                    rows = cursor.fetchmany(max_rows + 1)
+                cursor.close()
+                truncated = max_rows is not None and len(rows) > max_rows
+                df = pd.DataFrame(
+                    rows[:max_rows] if truncated else rows, columns=columns
+                )
+                total_rows = self._count_rows(sql_query) if truncated else len(df)
+                connection.commit()
+            except sqlite3.Error as e:
+                connection.rollback()
+                if fired["cancelled"]:
+                    return self._error_result(
+                        sql_query, "Query was cancelled", CANCELLED
+                    )
+                if fired["timed_out"]:
+                    return self._error_result(
+                        sql_query, self._timeout_message(timeout), TIMEOUT
+                    )
+                if "readonly" in str(e):
+                    return self._error_result(sql_query, str(e), READ_ONLY)
+                return self._error_result(sql_query, str(e))
+        return self._success_result(sql_query, df, truncated, total_rows)
+
+    def _count_rows(self, sql_query: str) -> int:
+        """Count the rows of a truncated query (SQLite has no row estimates)."""
+        try:
+            cursor = self.connection.execute(
+                f"SELECT COUNT(*) FROM ({sql_query.strip().rstrip(';')})"
+            )
+            return int(cursor.fetchone()[0])
+        except sqlite3.Error:
+            return 0
+
+    def execute_write(self, statements: List[str]) -> None:
+        """Run the statements in one transaction on a separate writable connection."""
+        connection = self._connect(isolation_level=None)
+        try:
+            connection.execute("BEGIN")
+            for statement in statements:
+                connection.execute(statement)
+            connection.execute("COMMIT")
+        except sqlite3.Error:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+
+    def stream(self, sql_query: str, batch_size: int) -> Iterator[pd.DataFrame]:
+        """Fetch rows in batches; the statement timeout applies to every batch."""
+        connection = self.connection
+        timeout = self.settings.statement_timeout
+        cursor = self._call_with_timeout(
+            connection.interrupt, lambda: connection.execute(sql_query), timeout
+        )
+        try:
+            columns = [desc[0] for desc in cursor.description]
+            while True:
+                batch = self._call_with_timeout(
+                    connection.interrupt, lambda: cursor.fetchmany(batch_size), timeout
+                )
+                if not batch:
+                    break
+                yield pd.DataFrame(batch, columns=columns)
+        finally:
+            cursor.close()
+
+    def get_tables(self) -> List[str]:
+        cursor = self.connection.execute(
+            "SELECT name FROM sqlite_master WHERE type IN ('table', 'view') "
+            "AND name NOT LIKE 'sqlite_%' ORDER BY name"
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+    def get_columns(self, table_name: str) -> List[Dict[str, Any]]:
+        table = table_name.replace('"', '""')
+        cursor = self.connection.execute(f'PRAGMA table_info("{table}")')
+        # (cid, name, type, notnull, default, pk)
+        return [
+            {"name": row[1], "type": row[2], "nullable": not row[3]}
+            for row in cursor.fetchall()
+        ]
+
+    def explain(self, sql_query: str) -> str:
+        cursor = self.connection.execute(f"EXPLAIN QUERY PLAN {sql_query}")
+        return "\n".join(row[-1] for row in cursor.fetchall())
+
+    def close(self) -> None:
+        """Close the connections of all threads (dropping an in-memory database)."""
+        with self._lock:
+            for _, connection in self._connections:
+                connection.close()
+            self._connections.clear()
+            if self._keep_alive is not None:
+                self._keep_alive.close()
+                self._keep_alive = None
+        self._local = threading.local()
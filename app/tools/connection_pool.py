@@ -0,0 +1,263 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, Optional, Tuple
+
+import psycopg2
+from psycopg2 import extensions
+
+from app.logger import logger
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection could be checked out within the timeout."""
+
+
+class ConnectionPool:
+    """A thread-safe pool of psycopg2 connections.
+
+    Connections are created on demand up to `max_size`, and callers block for
+    at most `timeout` seconds when all of them are checked out. Connections are
+    health-checked when borrowed and transparently replaced when broken; a
+    background thread refills the pool to `min_size` after discarding
+    connections.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        min_size: int = 1,
+        max_size: int = 10,
+        timeout: float = 30.0,
+        health_check_interval: float = 30.0,
+    ):
+        """
+        Initialize the connection pool.
+
+        Args:
+            connect: Factory returning a new psycopg2 connection
+            min_size: Number of connections opened at startup, and kept open
+                by replacing discarded ones
+            max_size: Maximum number of open connections
+            timeout: Seconds to wait for a free connection before giving up
+            health_check_interval: Connections idle for longer than this are
+                checked with `SELECT 1` before being handed out (0 = always)
+        """
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(
+                f"Invalid pool size: min_size={min_size}, max_size={max_size}"
+            )
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+
+        self._idle: Deque[Tuple[Any, float]] = deque()  # (connection, idle since)
+        self._size = 0  # open connections, idle or checked out
+        self._closed = False
+        self._refilling = False  # whether a refill thread is running
+        self._cond = threading.Condition()
+
+        self._stats = {
+            "connections_created": 0,
+            "connections_discarded": 0,
+            "checkouts": 0,
+            "checkout_timeouts": 0,
+            "health_check_failures": 0,
+            "wait_time_total_s": 0.0,
+            "wait_time_max_s": 0.0,
+        }
+
+        for _ in range(min_size):
+            self._idle.append((self._connect(), time.monotonic()))
+            self._size += 1
+            self._stats["connections_created"] += 1
+
+    def _is_healthy(self, conn: Any, idle_since: float) -> bool:
+        """Check a connection before handing it out."""
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn: Any) -> None:
+        """Close a connection and release its slot. Caller holds the lock."""
+        try:
+            conn.close()
+        except Exception:
+            pass
+        self._size -= 1
+        self._stats["connections_discarded"] += 1
+
+    def getconn(self, timeout: Optional[float] = None) -> Any:
+        """
+        Check out a healthy connection.
+
+        Args:
+            timeout: Seconds to wait for a free connection (defaults to pool timeout)
+
+        Returns:
+            A psycopg2 connection, which must be returned with `putconn`
+
+        Raises:
+            PoolTimeoutError: If no connection became available in time
+        """
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        while True:
+            conn, idle_since = self._reserve(deadline, timeout)
+
+            # Connect and health-check without holding the lock
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._stats["connections_created"] += 1
+            elif not self._is_healthy(conn, idle_since):
+                # Reconnect: drop the broken connection and try again
+                logger.warning("Discarding broken database connection")
+                with self._cond:
+                    self._stats["health_check_failures"] += 1
+                    self._discard(conn)
+                continue
+
+            waited = time.monotonic() - started
+            with self._cond:
+                self._stats["checkouts"] += 1
+                self._stats["wait_time_total_s"] += waited
+                self._stats["wait_time_max_s"] = max(
+                    self._stats["wait_time_max_s"], waited
+                )
+            return conn
+
+    def _reserve(self, deadline: float, timeout: float) -> Tuple[Any, float]:
+        """Take an idle connection, or reserve a slot for a new one (None)."""
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise psycopg2.InterfaceError("connection pool is closed")
+                if self._idle:
+                    return self._idle.pop()
+                if self._size < self.max_size:
+                    self._size += 1
+                    return None, 0.0
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["checkout_timeouts"] += 1
+                    raise PoolTimeoutError(
+                        f"No database connection available within {timeout:.1f}s "
+                        f"({self._size}/{self.max_size} in use)"
+                    )
+                self._cond.wait(remaining)
+
+    def putconn(self, conn: Any, discard: bool = False) -> None:
+        """
+        Return a connection to the pool.
+
+        Args:
+            conn: Connection obtained from `getconn`
+            discard: Close the connection instead of keeping it
+        """
+        if not discard and not conn.closed:
+            try:
+                # Never hand out a connection with an open transaction
+                status = conn.get_transaction_status()
+                if status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+
+        with self._cond:
+            discarded = discard or conn.closed or self._closed
+            if discarded:
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+            refill = discarded and self._start_refill()
+        if refill:
+            threading.Thread(
+                target=self._refill, name="pg-pool-refill", daemon=True
+            ).start()
+
+    def _start_refill(self) -> bool:
+        """Whether to start a refill thread. Caller holds the lock."""
+        if self._refilling or self._closed or self._size >= self.min_size:
+            return False
+        self._refilling = True
+        return True
+
+    def _refill(self) -> None:
+        """Open idle connections until `min_size` connections are open."""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    self._refilling = False
+                    return
+                # Reserve the slot, connecting happens without the lock
+                self._size += 1
+            try:
+                conn = self._connect()
+            except Exception as e:
+                logger.warning(f"Could not replace a database connection: {e}")
+                with self._cond:
+                    self._size -= 1
+                    self._refilling = False
+                    self._cond.notify_all()
+                return
+            with self._cond:
+                self._stats["connections_created"] += 1
+                if self._closed:
+                    self._discard(conn)
+                else:
+                    self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None) -> Iterator[Any]:
+        """Borrow a connection for the duration of a `with` block."""
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+        finally:
+            # Broken connections (conn.closed) are discarded by putconn
+            self.putconn(conn)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return pool size and usage counters."""
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": idle,
+                "in_use": self._size - idle,
+                **self._stats,
+            }
+
+    def closeall(self) -> None:
+        """Close all idle connections and refuse further checkouts."""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._discard(conn)
+            self._cond.notify_all()
@@ -1,97 +1,312 @@
-from typing import Dict, Any, Optional
-import json
+from typing import Dict, Any, Iterator, List, Optional
+import threading
+import time
 import pandas as pd
-import psycopg2
-from app.config import config
+from app.config import DatabaseSettings, config
+from app.logger import logger
+from app.tools.backends import DatabaseBackend, create_backend
+from app.tools.backends.base import CANCELLED, TIMEOUT
+from app.tools.query_cache import QueryCache, cache_key
+from app.tools.query_stats import query_stats
+from app.tools.sql_parse import referenced_tables
+from app.tracing import sql_fingerprint, tracer
 
 
 class DatabaseTool:
-    """A tool for handling database operations with PostgreSQL/Supabase."""
-
-    def __init__(self):
-        # Initialize the PostgreSQL connection
-        self.pg_connection = psycopg2.connect(
-            host=config.pg.host,
-            database=config.pg.database,
-            port=config.pg.port,
-            user=config.pg.user,
-            password=config.pg.password,
-        )
-        # Autocommit mode to avoid transaction blocks
-        self.pg_connection.autocommit = False
+    """A tool for handling database operations.
+
+    Queries run on the backend selected by `database.backend` (PostgreSQL/
+    Supabase, SQLite or DuckDB), which all return the same result dict.
+    """
+
+    def __init__(
+        self,
+        settings: Optional[DatabaseSettings] = None,
+        backend: Optional[DatabaseBackend] = None,
+    ):
+        # Settings and connections are resolved on first use, so importing
+        # this module neither reads the config nor touches the database
+        self._settings = settings
+        self._backend = backend
+        self._backend_lock = threading.Lock()
+        self._cache: Optional[QueryCache] = None
+        self._stats_lock = threading.Lock()
+        self._interruptions = {TIMEOUT: 0, CANCELLED: 0}
+
+    @property
+    def settings(self) -> DatabaseSettings:
+        if self._backend is not None:
+            return self._backend.settings
+        return self._settings or config.database
+
+    @property
+    def backend(self) -> DatabaseBackend:
+        """The database backend, created on first use."""
+        if self._backend is None:
+            with self._backend_lock:
+                if self._backend is None:
+                    settings = self.settings
+                    self._backend = create_backend(settings, settings.pg or config.pg)
+        return self._backend
+
+    @property
+    def cache(self) -> Optional[QueryCache]:
+        """The result cache, created on first use (None if disabled)."""
+        cache_settings = self.settings.cache
+        if not cache_settings.enabled:
+            return None
+        if self._cache is None:
+            backend = self.backend
+            with self._backend_lock:
+                if self._cache is None:
+                    cache = QueryCache(
+                        ttl=cache_settings.ttl,
+                        max_bytes=cache_settings.max_bytes,
+                        format=cache_settings.format,
+                    )
+                    if cache_settings.invalidation == "poll":
+                        cache.start_polling(
+                            backend.table_change_counters,
+                            cache_settings.poll_interval,
+                        )
+                    elif cache_settings.invalidation == "notify":
+                        cache.start_listening(
+                            lambda callback, stop: backend.listen(
+                                cache_settings.notify_channel, callback, stop
+                            )
+                        )
+                    self._cache = cache
+        return self._cache
+
+    @property
+    def dialect(self) -> str:
+        """Name of the SQL dialect queries must be written in."""
+        return self.backend.dialect
+
+    @property
+    def sqlalchemy_url(self) -> str:
+        """SQLAlchemy URL of the database, e.g. for `SchemaGenerator`."""
+        return self.backend.sqlalchemy_url
 
-    def execute_query(self, sql_query: str) -> Dict[str, Any]:
-        """Execute SQL query against PostgreSQL database.
+    def execute_query(
+        self,
+        sql_query: str,
+        max_rows: Optional[int] = None,
+        fetch_mode: Optional[str] = None,
+        timeout: Optional[float] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> Dict[str, Any]:
+        """Execute SQL query against the database.
 
         Args:
             sql_query: The SQL query to execute
+            max_rows: Fetch at most this many rows (defaults to
+                `database.max_rows`; None there or 0 fetches everything)
+            fetch_mode: "rows" to fetch Python tuples, or "copy" to bulk load
+                the result through `COPY ... TO STDOUT` into native dtypes
+                (postgres only, defaults to `pg.fetch_mode`)
+            timeout: Seconds after which the query is cancelled (defaults to
+                `database.statement_timeout`; 0 disables the limit)
+            cancel: Event another thread sets to cancel the running query
 
         Returns:
-            Dict containing status, data, and query information
+            Dict containing status, data, and query information. Successful
+            results also carry `truncated` and `total_rows_estimate`, and
+            `cached` when served from the result cache. Failed results carry
+            an `error_type` such as "timeout" or "cancelled".
         """
-        try:
-            # Create a new cursor for each query to avoid transaction issues
-            with self.pg_connection.cursor() as cursor:
-                cursor.execute(sql_query)
-                try:
-                    # Try to fetch results (for SELECT queries)
-                    result = cursor.fetchall()
-                    # # Convert result to JSON-serializable format
-                    # serialized_result = json.dumps(
-                    #     result, default=str, ensure_ascii=False
-                    # )
-                    df = pd.DataFrame(
-                        result, columns=[desc[0] for desc in cursor.description]
+        if max_rows is None:
+            max_rows = self.settings.max_rows
+        if max_rows == 0:
+            max_rows = None
+        if timeout is None:
+            timeout = self.settings.statement_timeout
+        started = time.perf_counter()
+        with tracer.span(
+            "db.execute",
+            sql_fingerprint=sql_fingerprint(sql_query),
+            backend=self.settings.backend,
+            fetch_mode=fetch_mode or "default",
+        ) as span:
+            cache = self.cache
+            if cache is not None:
+                key = cache_key(sql_query, max_rows, fetch_mode)
+                result = cache.get(key)
+                span.set_attribute("cache_hit", result is not None)
+                if result is not None:
+                    span.set_attributes(status="success", rows=len(result["data"]))
+                    query_stats.record(
+                        sql_query,
+                        (time.perf_counter() - started) * 1000,
+                        rows=len(result["data"]),
+                        cached=True,
                     )
+                    return result
+                epoch = cache.epoch()
 
-                    # Commit the transaction
-                    self.pg_connection.commit()
-
-                    return {
-                        "status": "success",
-                        "data": df,
-                        "query": sql_query,
-                        "message": "SELECT query executed successfully",
-                    }
-                except psycopg2.ProgrammingError:
-                    # This happens for non-SELECT queries (INSERT, UPDATE, etc.)
-                    # so we don't need to commit the transaction
-                    self.pg_connection.rollback()
-                    return {
-                        "status": "error",
-                        "data": pd.DataFrame([]),
-                        "query": sql_query,
-                        "message": "non-SELECT queries (INSERT, UPDATE, etc.)",
-                    }
-        except Exception as e:
-            # Ensure any transaction is rolled back on error
-            self.pg_connection.rollback()
-            return {
-                "status": "error",
-                "data": pd.DataFrame([]),
-                "query": sql_query,
-                "message": str(e),
-            }
+            result = self.backend.execute(
+                sql_query, max_rows, fetch_mode, timeout=timeout, cancel=cancel
+            )
+            if cache is not None:
+                cache.put(key, sql_query, result, epoch)
+            error_type = result.get("error_type")
+            if error_type in self._interruptions:
+                logger.warning(f"Query {error_type}: {result['message']}")
+                with self._stats_lock:
+                    self._interruptions[error_type] += 1
+            span.set_attributes(
+                status=result["status"],
+                error_type=error_type or "",
+                rows=len(result["data"]),
+                truncated=result.get("truncated", False),
+                memory_bytes=result.get("memory_bytes", 0),
+            )
+        query_stats.record(
+            sql_query,
+            (time.perf_counter() - started) * 1000,
+            rows=len(result["data"]),
+            bytes=result.get("memory_bytes", 0),
+            error=result["status"] != "success",
+        )
+        return result
+
+    def stream_query(
+        self, sql_query: str, batch_size: Optional[int] = None
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Stream the result of a SELECT query as DataFrame chunks.
+
+        Rows are fetched in batches (from a named server-side cursor on
+        PostgreSQL), so memory stays bounded by the batch size and the first
+        chunk is available before the rest of the result has been transferred.
+        The connection is held until the iterator is exhausted or closed.
+
+        Args:
+            sql_query: The SELECT query to execute
+            batch_size: Rows per chunk (defaults to `database.fetch_batch_size`)
+
+        Yields:
+            pd.DataFrame: The next chunk of rows
+
+        Raises:
+            QueryTimeoutError: If running the query or fetching a chunk takes
+                longer than `database.statement_timeout`
+        """
+        batch_size = batch_size or self.settings.fetch_batch_size
+        chunks = self.backend.stream(sql_query, batch_size)
+        # The span only covers the first chunk: spans must not stay open
+        # across yields, where they would leak into the caller
+        with tracer.span("db.stream", sql_fingerprint=sql_fingerprint(sql_query)):
+            first = next(chunks, None)
+        if first is None:
+            return
+        yield first
+        yield from chunks
+
+    def get_tables(self) -> List[str]:
+        """List the tables (and views) of the database."""
+        return self.backend.get_tables()
+
+    def get_columns(self, table_name: str) -> List[Dict[str, Any]]:
+        """List the columns of a table as dicts with name, type and nullable."""
+        return self.backend.get_columns(table_name)
+
+    def explain(self, sql_query: str) -> str:
+        """Return the query plan of a query as text."""
+        return self.backend.explain(sql_query)
+
+    def column_names(self, sql_query: str) -> List[str]:
+        """Names of a query's result columns, without fetching its rows."""
+        return self.backend.column_names(sql_query)
+
+    def execute_write(self, statements: List[str]) -> None:
+        """
+        Run maintenance statements (DDL/DML) in one transaction.
+
+        Unlike `execute_query` this bypasses `read_only` and runs on the
+        primary; it is meant for jobs such as rollup refreshes, never for
+        agent-generated SQL. Cached results of the written tables are dropped.
+
+        Args:
+            statements: SQL statements to run in order
+        """
+        self.backend.execute_write(statements)
+        tables = set()
+        for statement in statements:
+            tables |= referenced_tables(statement)
+        self.invalidate_tables(*tables)
+
+    def invalidate_tables(self, *tables: str) -> int:
+        """
+        Drop cached results that read any of the given tables.
+
+        Call this after writing to a table outside of the agents, unless the
+        cache is invalidated by polling or notifications.
+
+        Returns:
+            int: Number of dropped results
+        """
+        cache = self.cache
+        return cache.invalidate(*tables) if cache is not None else 0
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Return hit ratio, bytes served and size of the result cache."""
+        cache = self.cache
+        return cache.stats() if cache is not None else {}
 
     def test_connection(self) -> str:
         """Test the database connection and return status information."""
         try:
-            with self.pg_connection.cursor() as cursor:
-                cursor.execute("SELECT 1 AS test")
-                result = cursor.fetchone()
-                if result and result[0] == 1:
-                    return "Database connection successful. Test query returned: 1"
-                else:
-                    return f"Connection established but unexpected result: {result}"
+            return self.backend.test_connection()
         except Exception as e:
-            self.pg_connection.rollback()
             return f"Database connection error: {str(e)}"
 
+    def metrics(self) -> Dict[str, Any]:
+        """Return backend connection metrics (e.g. the postgres pool) and
+        the number of timed out and cancelled queries."""
+        with self._stats_lock:
+            interruptions = {
+                "timeouts": self._interruptions[TIMEOUT],
+                "cancellations": self._interruptions[CANCELLED],
+            }
+        return {**self.backend.metrics(), **interruptions}
+
     def close(self):
-        """Close the database connection."""
-        if self.pg_connection:
-            self.pg_connection.close()
+        """Close all database connections."""
+        if self._cache:
+            self._cache.close()
+            self._cache = None
+        if self._backend:
+            self._backend.close()
 
 
 # Create a singleton instance
 db_tool = DatabaseTool()
+
+_targets: Dict[str, DatabaseTool] = {}
+_targets_lock = threading.Lock()
+
+
+def get_db_tool(target: Optional[str] = None) -> DatabaseTool:
+    """
+    Get the DatabaseTool of a named database target.
+
+    Args:
+        target: Name of a `[databases.<name>]` config section; None or
+            "default" selects `[database]`
+
+    Returns:
+        DatabaseTool: The shared tool of the target
+
+    Raises:
+        ValueError: If no such target is configured
+    """
+    if not target or target == "default":
+        return db_tool
+    with _targets_lock:
+        if target not in _targets:
+            settings = config.databases.get(target)
+            if settings is None:
+                raise ValueError(f"Unknown database target '{target}'")
+            _targets[target] = DatabaseTool(settings)
+        return _targets[target]
@@ -0,0 +1,327 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from app.config import FanoutSettings, config
+from app.logger import logger
+from app.tools.backends.base import ERROR
+from app.tools.database import get_db_tool
+from app.tools.sql_shapes import (
+    AggregateQuery,
+    apply_order_and_limit,
+    apply_union_order_and_limit,
+    output_column_names,
+    parse_aggregate,
+    parse_union,
+    partial_aggregate_sql,
+)
+from app.tracing import sql_fingerprint, tracer
+
+
+class FanoutExecutor:
+    """Runs a query on several database targets concurrently and merges results.
+
+    Meant for data split across databases with identical schemas (shards).
+    Single-table SUM/COUNT/MIN/MAX/AVG group-bys are executed as partial
+    aggregates on every shard and re-aggregated, so they return the same
+    result as on one database; ORDER BY and LIMIT are applied after merging.
+    Queries without grouping, aggregates or DISTINCT return the union of the
+    shards' rows, sorted and limited again. Other queries are refused, as
+    merging their per-shard results would give a wrong answer.
+    """
+
+    def __init__(self, settings: Optional[FanoutSettings] = None):
+        # Settings are resolved on first use, like the database tool
+        self._settings = settings
+
+    @property
+    def settings(self) -> FanoutSettings:
+        return self._settings or config.fanout
+
+    def execute_query(
+        self,
+        sql_query: str,
+        targets: Optional[List[str]] = None,
+        max_rows: Optional[int] = None,
+        timeout: Optional[float] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> Dict[str, Any]:
+        """
+        Execute a query on every target and merge the results.
+
+        Args:
+            sql_query: The SQL query to execute
+            targets: Database targets (defaults to `fanout.targets`)
+            max_rows: Row cap of the merged result; partial aggregates are
+                fetched in full, unioned shards return up to this many rows
+                (plus the OFFSET) each
+            timeout: Statement timeout of every shard's query
+            cancel: Event another thread sets to cancel all shards' queries
+
+        Returns:
+            Dict like `DatabaseTool.execute_query`, plus `merge` ("aggregate"
+            or "union"), `shards` (target, status, duration_ms, rows and
+            message per shard) and `failed_shards`. With `fanout.allow_partial`
+            the result succeeds as long as one shard succeeded, with `partial`
+            set. Queries that cannot be merged fail without running.
+        """
+        targets = targets or self.settings.targets
+        if not targets:
+            raise ValueError("No fan-out targets configured")
+        query = parse_aggregate(sql_query)
+        union = None if query else parse_union(sql_query)
+        if query is None and union is None:
+            logger.warning("Query cannot be merged across shards, not running it")
+            return self._merge_error(
+                sql_query,
+                "Query cannot be merged across shards: only single-table "
+                "SUM/COUNT/MIN/MAX/AVG of columns with GROUP BY, or queries "
+                "without GROUP BY, HAVING, DISTINCT and aggregates are supported",
+            )
+        if query is not None:
+            shard_sql = partial_aggregate_sql(query)
+            # Every group's partials are needed, 0 fetches all rows
+            shard_rows = 0
+        else:
+            shard_sql = union.shard_sql
+            shard_rows = None if max_rows is None else max_rows + union.offset
+
+        with tracer.span(
+            "db.fanout",
+            sql_fingerprint=sql_fingerprint(sql_query),
+            shards=len(targets),
+            merge="aggregate" if query else "union",
+        ) as span:
+            results = self._run_shards(targets, shard_sql, shard_rows, timeout, cancel)
+            shards = [
+                {
+                    "target": target,
+                    "status": result["status"],
+                    "duration_ms": duration_ms,
+                    "rows": len(result["data"]),
+                    "message": result["message"],
+                }
+                for target, (result, duration_ms) in zip(targets, results)
+            ]
+            succeeded = [
+                (target, result)
+                for target, (result, _) in zip(targets, results)
+                if result["status"] == "success"
+            ]
+            failed = [
+                shard["target"] for shard in shards if shard["status"] != "success"
+            ]
+            span.set_attributes(failed_shards=len(failed))
+            for shard in shards:
+                logger.info(
+                    f"Shard {shard['target']}: {shard['status']} in "
+                    f"{shard['duration_ms']:.0f} ms, {shard['rows']} rows"
+                )
+
+            if not succeeded or (failed and not self.settings.allow_partial):
+                first_error = next(
+                    result for result, _ in results if result["status"] != "success"
+                )
+                return {
+                    **first_error,
+                    "query": sql_query,
+                    "message": "; ".join(
+                        f"{shard['target']}: {shard['message']}"
+                        for shard in shards
+                        if shard["status"] != "success"
+                    ),
+                    "shards": shards,
+                    "failed_shards": failed,
+                }
+
+            if query is not None:
+                db = get_db_tool(succeeded[0][0])
+                df = merge_aggregates(
+                    query,
+                    [result["data"] for _, result in succeeded],
+                    db.settings.backend,
+                    lambda: db.column_names(sql_query),
+                )
+            else:
+                df = apply_union_order_and_limit(union, self._union(succeeded))
+                if df is None:
+                    span.set_attributes(status="error")
+                    return self._merge_error(
+                        sql_query,
+                        "Query cannot be merged across shards: ORDER BY "
+                        "expressions must be selected columns",
+                        shards,
+                        failed,
+                    )
+                df = df.reset_index(drop=True)
+            rows = len(df)
+            truncated = query is None and any(
+                result.get("truncated") for _, result in succeeded
+            )
+            if max_rows is not None and rows > max_rows:
+                df = df.iloc[:max_rows]
+                truncated = True
+            span.set_attributes(status="success", rows=len(df))
+
+        message = (
+            f"Query executed on {len(succeeded)} of {len(targets)} shards "
+            f"({'re-aggregated' if query else 'rows unioned'})"
+        )
+        if failed:
+            message += f"; failed shards: {', '.join(failed)}"
+        return {
+            "status": "success",
+            "data": df,
+            "query": sql_query,
+            "message": message,
+            "truncated": truncated,
+            "total_rows_estimate": (
+                rows
+                if query or union.tail
+                else sum(
+                    result.get("total_rows_estimate", 0) for _, result in succeeded
+                )
+            ),
+            "memory_bytes": int(df.memory_usage(deep=True).sum()),
+            "merge": "aggregate" if query else "union",
+            "partial": bool(failed),
+            "shards": shards,
+            "failed_shards": failed,
+        }
+
+    def _run_shards(
+        self,
+        targets: List[str],
+        sql_query: str,
+        max_rows: Optional[int],
+        timeout: Optional[float],
+        cancel: Optional[threading.Event],
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """Run the query on every target, returning (result, duration_ms) each."""
+
+        def run(target: str) -> Tuple[Dict[str, Any], float]:
+            started = time.perf_counter()
+            try:
+                result = get_db_tool(target).execute_query(
+                    sql_query, max_rows=max_rows, timeout=timeout, cancel=cancel
+                )
+            except Exception as e:
+                # E.g. an unknown target or an unreachable server
+                result = {
+                    "status": "error",
+                    "data": pd.DataFrame(),
+                    "query": sql_query,
+                    "message": f"Error executing query: {str(e)}",
+                }
+            return result, (time.perf_counter() - started) * 1000
+
+        max_workers = self.settings.max_workers or len(targets)
+        with ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="fanout"
+        ) as executor:
+            # A context copy per shard, so its spans belong to the fan-out span
+            futures = [
+                executor.submit(contextvars.copy_context().run, run, target)
+                for target in targets
+            ]
+            return [future.result() for future in futures]
+
+    @staticmethod
+    def _merge_error(
+        sql_query: str,
+        message: str,
+        shards: Optional[List[Dict[str, Any]]] = None,
+        failed: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        return {
+            "status": "error",
+            "data": pd.DataFrame([]),
+            "query": sql_query,
+            "message": message,
+            "error_type": ERROR,
+            "shards": shards or [],
+            "failed_shards": failed or [],
+        }
+
+    def _union(self, results: List[Tuple[str, Dict[str, Any]]]) -> pd.DataFrame:
+        frames = []
+        for target, result in results:
+            df = result["data"]
+            if self.settings.shard_column:
+                df = df.assign(**{self.settings.shard_column: target})
+            frames.append(df)
+        return pd.concat(frames, ignore_index=True)
+
+
+def _sum(series: pd.Series):
+    # SUM over only NULLs is NULL in SQL
+    return series.sum(min_count=1)
+
+
+def merge_aggregates(
+    query: AggregateQuery,
+    frames: List[pd.DataFrame],
+    dialect: str = "postgres",
+    column_names: Optional[Callable[[], List[str]]] = None,
+) -> pd.DataFrame:
+    """
+    Re-aggregate the partial results of several shards.
+
+    Args:
+        query: The parsed aggregate query
+        frames: Results of `partial_aggregate_sql(query)` per shard
+        dialect: Backend name, to name the columns like the database would
+        column_names: Returns the original query's column names where the
+            dialect's naming rules do not tell them (see `output_column_names`)
+
+    Returns:
+        The result of the original query over all shards
+    """
+    partials = pd.concat(frames, ignore_index=True)
+    dims = list(dict.fromkeys(dim.name for dim in query.group_by))
+    funcs = {
+        m.name: _sum if m.func in ("sum", "count") else m.func
+        for m in query.base_measures()
+    }
+    if dims:
+        merged = (
+            partials.groupby(dims, dropna=False, observed=True, sort=False)
+            .agg(funcs)
+            .reset_index()
+        )
+    else:
+        # A single group, even without rows (COUNT(*) is then 0)
+        merged = pd.DataFrame(
+            {
+                name: [
+                    func(partials[name]) if callable(func) else partials[name].agg(func)
+                ]
+                for name, func in funcs.items()
+            }
+        )
+
+    columns = []
+    names = output_column_names(query, dialect, column_names)
+    for item, name in zip(query.items, names):
+        if item.dimension is not None:
+            column = merged[item.dimension.name]
+        elif item.measure.func == "avg":
+            total, count = item.measure.base_measures()
+            column = merged[total.name] / merged[count.name].where(
+                merged[count.name] != 0
+            )
+        else:
+            column = merged[item.measure.name]
+            if item.measure.func == "count":
+                column = column.fillna(0).astype("int64")
+        columns.append(column.rename(name))
+    df = pd.concat(columns, axis=1) if columns else pd.DataFrame()
+    return apply_order_and_limit(query, df).reset_index(drop=True)
+
+
+# Create a singleton instance
+fanout = FanoutExecutor()
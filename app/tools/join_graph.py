@@ -0,0 +1,158 @@
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from app.logger import logger
+
+
+@dataclass(frozen=True)
+class JoinEdge:
+    """A join between two tables along a foreign key, in either direction."""
+
+    left: str
+    left_columns: Tuple[str, ...]
+    right: str
+    right_columns: Tuple[str, ...]
+
+    def reversed(self) -> "JoinEdge":
+        return JoinEdge(self.right, self.right_columns, self.left, self.left_columns)
+
+    def condition(self) -> str:
+        """The join condition, e.g. `public.orders.user_id = public.users.id`."""
+        return " AND ".join(
+            f"{self.left}.{left} = {self.right}.{right}"
+            for left, right in zip(self.left_columns, self.right_columns)
+        )
+
+
+class JoinGraph:
+    """Tables as nodes and foreign keys as edges, for finding join paths.
+
+    Paths are the shortest in number of joins. The breadth-first search tree
+    of every table is computed on first use and kept, so repeated questions
+    about the same tables cost a dictionary lookup.
+    """
+
+    def __init__(self, edges: Iterable[JoinEdge]):
+        self._adjacent: Dict[str, List[JoinEdge]] = {}
+        for edge in edges:
+            if edge.left == edge.right:
+                # Self references (e.g. manager_id) join no other table
+                continue
+            self._adjacent.setdefault(edge.left, []).append(edge)
+            self._adjacent.setdefault(edge.right, []).append(edge.reversed())
+        self._trees: Dict[str, Dict[str, Optional[JoinEdge]]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_catalog(cls, catalog) -> "JoinGraph":
+        """The graph of the foreign keys of a `SchemaCatalog`."""
+        edges = []
+        for name, table in catalog.tables.items():
+            for fk in table.get("foreign_keys", []):
+                if fk["referred_table"] not in catalog.tables:
+                    # Keys to tables outside the catalog, e.g. ignored ones
+                    continue
+                edges.append(
+                    JoinEdge(
+                        name,
+                        tuple(fk["columns"]),
+                        fk["referred_table"],
+                        tuple(fk["referred_columns"]),
+                    )
+                )
+        return cls(edges)
+
+    def __bool__(self) -> bool:
+        return bool(self._adjacent)
+
+    def _search(self, sources: Set[str]) -> Dict[str, Optional[JoinEdge]]:
+        """Breadth-first search, mapping reached tables to the edge reaching them."""
+        parents: Dict[str, Optional[JoinEdge]] = {s: None for s in sources}
+        queue = deque(sources)
+        while queue:
+            table = queue.popleft()
+            for edge in self._adjacent.get(table, []):
+                if edge.right not in parents:
+                    parents[edge.right] = edge
+                    queue.append(edge.right)
+        return parents
+
+    def _tree(self, source: str) -> Dict[str, Optional[JoinEdge]]:
+        with self._lock:
+            tree = self._trees.get(source)
+        if tree is None:
+            tree = self._search({source})
+            with self._lock:
+                self._trees[source] = tree
+        return tree
+
+    @staticmethod
+    def _path(parents: Dict[str, Optional[JoinEdge]], target: str) -> List[JoinEdge]:
+        path = []
+        edge = parents[target]
+        while edge is not None:
+            path.append(edge)
+            edge = parents[edge.left]
+        return path[::-1]
+
+    def shortest_path(self, source: str, target: str) -> Optional[List[JoinEdge]]:
+        """The joins leading from one table to another, None if unconnected."""
+        tree = self._tree(source)
+        if target not in tree:
+            return None
+        return self._path(tree, target)
+
+    def connect(self, tables: List[str]) -> Tuple[List[str], List[JoinEdge]]:
+        """
+        Join a set of tables with few joins.
+
+        Starting from the first table, the nearest table not yet joined is
+        added along its shortest path, which may pass through tables that
+        were not asked for (e.g. many-to-many link tables). This is the
+        usual greedy approximation of the smallest connecting tree.
+
+        Returns:
+            The tables to use, the requested ones first in their order, then
+            the intermediate ones; and the joins between them. Tables without
+            a path to the others are kept, without joins.
+        """
+        tables = list(dict.fromkeys(tables))
+        if len(tables) < 2:
+            return tables, []
+        if len(tables) == 2:
+            path = self.shortest_path(tables[0], tables[1])
+            if path is None:
+                logger.info(f"No join path between {tables[0]} and {tables[1]}")
+                return tables, []
+            return self._with_intermediate(tables, path), path
+
+        joined = {tables[0]}
+        edges: List[JoinEdge] = []
+        remaining = set(tables[1:])
+        while remaining:
+            parents = self._search(joined)
+            reachable = [t for t in tables if t in remaining and t in parents]
+            if not reachable:
+                logger.info(f"No join path to {', '.join(sorted(remaining))}")
+                break
+            # Nearest table first, by path length
+            target = min(reachable, key=lambda t: len(self._path(parents, t)))
+            for edge in self._path(parents, target):
+                edges.append(edge)
+                joined.add(edge.right)
+            remaining -= joined
+        return self._with_intermediate(tables, edges), edges
+
+    @staticmethod
+    def _with_intermediate(tables: List[str], edges: List[JoinEdge]) -> List[str]:
+        on_path = [t for edge in edges for t in (edge.left, edge.right)]
+        return list(dict.fromkeys(tables + on_path))
+
+
+def describe_joins(edges: List[JoinEdge]) -> str:
+    """Join conditions for the SQL prompt, one per line."""
+    return "\n".join(
+        f"- {edge.left} JOIN {edge.right} ON {edge.condition()}" for edge in edges
+    )
@@ -0,0 +1,189 @@
+from typing import IO, Any, Dict, List, Sequence, Tuple
+
+import pandas as pd
+
+from app.startup import lazy_import
+
+try:
+    pa = lazy_import("pyarrow")
+except ImportError:  # pyarrow is optional, pandas' C parser is the fallback
+    pa = None
+
+
+# NULL marker used in COPY output, so that NULL and empty strings differ
+COPY_NULL = "\\N"
+
+# PostgreSQL type OIDs (pg_type.oid) grouped by the pandas kind they map to
+PG_TYPE_KINDS: Dict[int, str] = {
+    16: "bool",  # bool
+    20: "int",  # int8
+    21: "int",  # int2
+    23: "int",  # int4
+    26: "int",  # oid
+    700: "float",  # float4
+    701: "float",  # float8
+    790: "string",  # money (formatted with a currency symbol)
+    1700: "float",  # numeric
+    1082: "date",  # date
+    1114: "datetime",  # timestamp
+    1184: "datetimetz",  # timestamptz
+}
+
+
+def pg_kind(type_code: int) -> str:
+    """Return the pandas kind (int, float, bool, ...) of a PostgreSQL type OID."""
+    return PG_TYPE_KINDS.get(type_code, "string")
+
+
+def _arrow_type(kind: str):
+    return {
+        "bool": pa.bool_(),
+        "int": pa.int64(),
+        "float": pa.float64(),
+    }.get(kind, pa.string())
+
+
+def parse_copy_csv(stream: IO[bytes], description: Sequence[Any]) -> pd.DataFrame:
+    """
+    Parse `COPY ... TO STDOUT (FORMAT csv)` output into a typed DataFrame.
+
+    Column types come from `cursor.description`, so numerics arrive as
+    float64/Int64 and timestamps as datetime64 instead of per-cell Python
+    `Decimal`/`datetime` objects. pyarrow's multithreaded CSV reader is used
+    when installed.
+
+    Args:
+        stream: Binary stream with the CSV rows (no header)
+        description: `cursor.description` of the query
+
+    Returns:
+        pd.DataFrame: The parsed result
+    """
+    names: List[str] = [desc[0] for desc in description]
+    kinds = [pg_kind(desc[1]) for desc in description]
+
+    if hasattr(stream, "peek") and not stream.peek(1):
+        # Empty result: both parsers reject input without any line
+        return pd.DataFrame(columns=names)
+
+    if pa is not None:
+        import pyarrow.csv as pa_csv
+
+        table = pa_csv.read_csv(
+            stream,
+            read_options=pa_csv.ReadOptions(column_names=names),
+            convert_options=pa_csv.ConvertOptions(
+                column_types={
+                    name: _arrow_type(kind) for name, kind in zip(names, kinds)
+                },
+                null_values=[COPY_NULL],
+                strings_can_be_null=True,
+                quoted_strings_can_be_null=False,
+                true_values=["t"],
+                false_values=["f"],
+            ),
+        )
+        # Keep nullable integers and booleans instead of float64/object
+        df = table.to_pandas(
+            types_mapper={
+                pa.int64(): pd.Int64Dtype(),
+                pa.bool_(): pd.BooleanDtype(),
+            }.get
+        )
+    else:
+        df = pd.read_csv(
+            stream,
+            header=None,
+            names=names,
+            dtype={
+                name: {"int": "Int64", "float": "float64"}.get(kind, object)
+                for name, kind in zip(names, kinds)
+            },
+            na_values=[COPY_NULL],
+            keep_default_na=False,
+        )
+
+    for name, kind in zip(names, kinds):
+        if kind == "bool" and df[name].dtype == object:
+            df[name] = df[name].map({"t": True, "f": False}).astype("boolean")
+        elif kind in ("date", "datetime"):
+            df[name] = pd.to_datetime(df[name], format="ISO8601")
+        elif kind == "datetimetz":
+            df[name] = pd.to_datetime(df[name], format="ISO8601", utc=True)
+    return df
+
+
+def to_native_dtypes(df: pd.DataFrame, description: Sequence[Any]) -> pd.DataFrame:
+    """
+    Convert object columns built from psycopg2 tuples to native dtypes.
+
+    `numeric` columns arrive as `Decimal` objects and nullable integers,
+    booleans and dates as Python objects; they are mapped by type OID to
+    float64, Int64, boolean and datetime64 respectively.
+
+    Args:
+        df: DataFrame built from `cursor.fetchall()`
+        description: `cursor.description` of the query
+
+    Returns:
+        pd.DataFrame: The DataFrame with converted columns
+    """
+    for position, desc in enumerate(description):
+        column = df.iloc[:, position]
+        if column.dtype != object:
+            continue
+        kind = pg_kind(desc[1])
+        if kind == "float":
+            converted = pd.to_numeric(column, errors="coerce").astype("float64")
+        elif kind == "int":
+            converted = pd.to_numeric(column, errors="coerce").astype("Int64")
+        elif kind == "bool":
+            converted = column.astype("boolean")
+        elif kind in ("date", "datetime"):
+            converted = pd.to_datetime(column, errors="coerce")
+        elif kind == "datetimetz":
+            converted = pd.to_datetime(column, errors="coerce", utc=True)
+        else:
+            continue
+        df.isetitem(position, converted)
+    return df
+
+
+def compact_dataframe(
+    df: pd.DataFrame,
+    category_threshold: float = 0.5,
+    arrow_strings: bool = False,
+) -> Tuple[pd.DataFrame, int]:
+    """
+    Reduce the memory footprint of string columns.
+
+    Columns whose distinct-value ratio is at most `category_threshold` (e.g.
+    `source` with 支付宝/微信) become `category`; the remaining string columns
+    optionally become Arrow-backed strings.
+
+    Args:
+        df: DataFrame to compact in place
+        category_threshold: Maximum distinct/rows ratio to use `category`
+        arrow_strings: Store other strings as `string[pyarrow]` if installed
+
+    Returns:
+        Tuple of the compacted DataFrame and the number of bytes saved
+    """
+    before = int(df.memory_usage(deep=True).sum())
+    for position in range(df.shape[1]):
+        column = df.iloc[:, position]
+        if not (
+            pd.api.types.is_object_dtype(column) or pd.api.types.is_string_dtype(column)
+        ) or isinstance(column.dtype, pd.CategoricalDtype):
+            continue
+        non_null = column.dropna()
+        if non_null.empty or not isinstance(non_null.iloc[0], str):
+            continue
+        if len(non_null) > 1 and (
+            non_null.nunique() / len(non_null) <= category_threshold
+        ):
+            df.isetitem(position, column.astype("category"))
+        elif arrow_strings and pa is not None:
+            df.isetitem(position, column.astype("string[pyarrow]"))
+    after = int(df.memory_usage(deep=True).sum())
+    return df, before - after
@@ -0,0 +1,359 @@
+import hashlib
+import io
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Set
+
+import pandas as pd
+
+from app.logger import logger
+from app.startup import lazy_import
+from app.tools.sql_parse import normalize_sql, referenced_tables, tokenize
+
+try:
+    pa = lazy_import("pyarrow")
+except ImportError:  # pyarrow is optional, results are then kept as DataFrames
+    pa = None
+
+# Functions whose result changes between calls; queries using them are not cached
+_VOLATILE_FUNCTIONS = {
+    "now",
+    "random",
+    "clock_timestamp",
+    "statement_timestamp",
+    "timeofday",
+    "current_date",
+    "current_time",
+    "current_timestamp",
+    "localtime",
+    "localtimestamp",
+    "gen_random_uuid",
+    "nextval",
+}
+
+
+def cache_key(sql: str, *params: Any) -> str:
+    """Cache key of a query: its normalized SQL plus the execution parameters."""
+    text = normalize_sql(sql) + "\x00" + repr(params)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def is_cacheable(sql: str) -> bool:
+    """Whether a query's result only depends on table contents."""
+    return not any(
+        kind == "word" and text.lower() in _VOLATILE_FUNCTIONS
+        for kind, text in tokenize(sql)
+    )
+
+
+@dataclass
+class _Entry:
+    payload: Any  # serialized result, or the DataFrame without pyarrow
+    size: int
+    meta: Dict[str, Any]
+    tables: Set[str]
+    expires_at: float
+    memory_bytes: int = 0
+
+
+@dataclass
+class _Stats:
+    hits: int = 0
+    misses: int = 0
+    bytes_served: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    invalidations: int = 0
+    rejected: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            **self.__dict__,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class QueryCache:
+    """An in-process LRU cache of query results.
+
+    Results are stored as compressed Arrow IPC (or Parquet) bytes, so cached
+    data takes a fraction of the DataFrame's memory and callers always get a
+    fresh copy. Entries expire after `ttl` seconds, the least recently used
+    ones are evicted beyond `max_bytes`, and `invalidate` drops every result
+    that read one of the given tables.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 300.0,
+        max_bytes: int = 256 * 1024 * 1024,
+        format: str = "arrow",
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            ttl: Seconds a result stays valid
+            max_bytes: Maximum total size of the stored results
+            format: "arrow" (fast) or "parquet" (smaller) serialization
+        """
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.format = format
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._by_table: Dict[str, Set[str]] = {}
+        # Epoch of the last invalidation per table, see `epoch`
+        self._epoch = 0
+        self._invalidated_at: Dict[str, int] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self._stats = _Stats()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def _serialize(self, df: pd.DataFrame):
+        if pa is None:
+            return df.copy(), int(df.memory_usage(deep=True).sum())
+        if self.format == "parquet":
+            payload = df.to_parquet(index=False, compression="zstd")
+        else:
+            import pyarrow.feather as feather
+
+            sink = pa.BufferOutputStream()
+            feather.write_feather(
+                pa.Table.from_pandas(df, preserve_index=False),
+                sink,
+                compression="lz4",
+            )
+            payload = sink.getvalue().to_pybytes()
+        return payload, len(payload)
+
+    def _deserialize(self, payload) -> pd.DataFrame:
+        if pa is None:
+            return payload.copy()
+        if self.format == "parquet":
+            return pd.read_parquet(io.BytesIO(payload))
+        import pyarrow.feather as feather
+
+        return feather.read_table(pa.BufferReader(payload)).to_pandas()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached result.
+
+        Returns:
+            A copy of the cached result dict with `cached=True`, or None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self._stats.expirations += 1
+                entry = None
+            if entry is None:
+                self._stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats.hits += 1
+            self._stats.bytes_served += entry.memory_bytes
+
+        # Deserialize outside the lock, payloads are immutable
+        return {**entry.meta, "data": self._deserialize(entry.payload), "cached": True}
+
+    def epoch(self) -> int:
+        """
+        Current invalidation epoch.
+
+        Take it before running a query and pass it to `put`, so results of
+        queries that raced with an invalidation of their tables are not stored.
+        """
+        with self._lock:
+            return self._epoch
+
+    def put(
+        self, key: str, sql: str, result: Dict[str, Any], epoch: Optional[int] = None
+    ) -> bool:
+        """
+        Store a successful result.
+
+        Args:
+            key: Key from `cache_key`
+            sql: The query, whose referenced tables are recorded for invalidation
+            result: Result dict of `DatabaseTool.execute_query`
+            epoch: `epoch()` taken before the query ran
+
+        Returns:
+            bool: Whether the result was stored
+        """
+        if result.get("status") != "success" or not is_cacheable(sql):
+            return False
+        df = result["data"]
+        try:
+            payload, size = self._serialize(df)
+        except Exception as e:
+            # e.g. non-string column names or Python objects Arrow cannot store
+            logger.debug(f"Result not cacheable: {e}")
+            with self._lock:
+                self._stats.rejected += 1
+            return False
+        if size > self.max_bytes:
+            with self._lock:
+                self._stats.rejected += 1
+            return False
+
+        entry = _Entry(
+            payload=payload,
+            size=size,
+            meta={k: v for k, v in result.items() if k != "data"},
+            tables=referenced_tables(sql),
+            expires_at=time.monotonic() + self.ttl,
+            memory_bytes=int(df.memory_usage(deep=True).sum()),
+        )
+        with self._lock:
+            if epoch is not None and any(
+                self._invalidated_at.get(table, -1) >= epoch for table in entry.tables
+            ):
+                # A table changed while the query ran, the result may be stale
+                return False
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._size += size
+            for table in entry.tables:
+                self._by_table.setdefault(table, set()).add(key)
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._stats.evictions += 1
+        return True
+
+    def _remove(self, key: str) -> None:
+        """Drop an entry. Caller holds the lock."""
+        entry = self._entries.pop(key)
+        self._size -= entry.size
+        for table in entry.tables:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[table]
+
+    def invalidate(self, *tables: str) -> int:
+        """
+        Drop all results that read any of the given tables.
+
+        Args:
+            tables: Table names, optionally schema-qualified
+
+        Returns:
+            int: Number of dropped results
+        """
+        dropped = 0
+        with self._lock:
+            for table in tables:
+                name = table.rpartition(".")[2]
+                self._invalidated_at[name] = self._invalidated_at[name.lower()] = (
+                    self._epoch
+                )
+                for key in list(self._by_table.get(name, ())) + list(
+                    self._by_table.get(name.lower(), ())
+                ):
+                    if key in self._entries:
+                        self._remove(key)
+                        dropped += 1
+            self._stats.invalidations += dropped
+            self._epoch += 1
+        if dropped:
+            logger.debug(f"Invalidated {dropped} cached results of {tables}")
+        return dropped
+
+    def clear(self) -> None:
+        """Drop all cached results."""
+        with self._lock:
+            self._entries.clear()
+            self._by_table.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters, the hit ratio and the cache size."""
+        with self._lock:
+            return {
+                **self._stats.to_dict(),
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+            }
+
+    def start_polling(
+        self, fetch_counters: Callable[[], Dict[str, int]], interval: float
+    ) -> None:
+        """
+        Invalidate tables whose change counter moved, checked every `interval`.
+
+        Args:
+            fetch_counters: Returns a change counter per table name, e.g. from
+                `pg_stat_user_tables`
+            interval: Seconds between polls
+        """
+
+        def poll():
+            previous: Optional[Dict[str, int]] = None
+            # The first poll runs at once, the others (also after errors) wait
+            first = True
+            while not self._stop.wait(0 if first else interval):
+                first = False
+                try:
+                    counters = fetch_counters()
+                except Exception as e:
+                    logger.warning(f"Polling table changes failed: {e}")
+                    continue
+                if previous is not None:
+                    changed = [
+                        table
+                        for table, count in counters.items()
+                        if previous.get(table) != count
+                    ]
+                    if changed:
+                        self.invalidate(*changed)
+                previous = counters
+
+        self._start_thread(poll, "query-cache-poll")
+
+    def start_listening(
+        self,
+        listen: Callable[[Callable[[str], None], threading.Event], None],
+        retry_interval: float = 5.0,
+    ) -> None:
+        """
+        Invalidate tables named by change notifications.
+
+        Args:
+            listen: Blocks delivering changed table names to its callback until
+                the event is set, e.g. `PostgresBackend.listen`
+            retry_interval: Seconds before listening again after an error
+        """
+
+        def run():
+            while not self._stop.is_set():
+                try:
+                    listen(lambda table: self.invalidate(table), self._stop)
+                except Exception as e:
+                    logger.warning(f"Listening for table changes failed: {e}")
+                    self._stop.wait(retry_interval)
+
+        self._start_thread(run, "query-cache-listen")
+
+    def _start_thread(self, target: Callable[[], None], name: str) -> None:
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def close(self) -> None:
+        """Stop the invalidation threads and drop all cached results."""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads.clear()
+        self.clear()
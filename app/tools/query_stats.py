@@ -0,0 +1,408 @@
+import argparse
+import atexit
+import json
+import math
+import sqlite3
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Sequence
+
+from app.config import PROJECT_ROOT, QueryStatsSettings, config
+from app.logger import logger
+from app.tools.sql_parse import fingerprint_id, fingerprint_sql
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS query_stats (
+    fingerprint_id TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    example TEXT NOT NULL,
+    calls INTEGER NOT NULL DEFAULT 0,
+    errors INTEGER NOT NULL DEFAULT 0,
+    cache_hits INTEGER NOT NULL DEFAULT 0,
+    total_ms REAL NOT NULL DEFAULT 0,
+    max_ms REAL NOT NULL DEFAULT 0,
+    p50_ms REAL NOT NULL DEFAULT 0,
+    p95_ms REAL NOT NULL DEFAULT 0,
+    rows INTEGER NOT NULL DEFAULT 0,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL
+)
+"""
+
+# Latency histogram of every fingerprint, in buckets of `latency_bucket`
+_LATENCY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS query_latency (
+    fingerprint_id TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (fingerprint_id, bucket)
+)
+"""
+
+# Counters and histograms are added to the stored ones, so several processes
+# can share a file; p50_ms and p95_ms are then set from the merged histogram
+_UPSERT = """
+INSERT INTO query_stats VALUES (
+    :fingerprint_id, :fingerprint, :example, :calls, :errors, :cache_hits,
+    :total_ms, :max_ms, :p50_ms, :p95_ms, :rows, :bytes, :first_seen, :last_seen
+)
+ON CONFLICT (fingerprint_id) DO UPDATE SET
+    example = excluded.example,
+    calls = calls + excluded.calls,
+    errors = errors + excluded.errors,
+    cache_hits = cache_hits + excluded.cache_hits,
+    total_ms = total_ms + excluded.total_ms,
+    max_ms = MAX(max_ms, excluded.max_ms),
+    p50_ms = excluded.p50_ms,
+    p95_ms = excluded.p95_ms,
+    rows = rows + excluded.rows,
+    bytes = bytes + excluded.bytes,
+    first_seen = MIN(first_seen, excluded.first_seen),
+    last_seen = MAX(last_seen, excluded.last_seen)
+"""
+
+_UPSERT_LATENCY = """
+INSERT INTO query_latency VALUES (?, ?, ?)
+ON CONFLICT (fingerprint_id, bucket) DO UPDATE SET count = count + excluded.count
+"""
+
+_COUNTERS = ("calls", "errors", "cache_hits", "total_ms", "rows", "bytes")
+
+# Histogram buckets are 10% wide, percentiles of merged histograms are
+# accurate to about 5%
+_BUCKET_GROWTH = 1.1
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Linearly interpolated `q` percentile (0-100) of `values`."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def latency_bucket(duration_ms: float) -> int:
+    """Histogram bucket of a latency, see `histogram_percentile`."""
+    return math.floor(math.log(max(duration_ms, 0.001), _BUCKET_GROWTH))
+
+
+def histogram_percentile(histogram: Dict[int, int], q: float) -> float:
+    """`q` percentile (0-100) of a latency histogram (counts by bucket)."""
+    total = sum(histogram.values())
+    if not total:
+        return 0.0
+    rank = (total - 1) * q / 100
+    seen = 0
+    for bucket in sorted(histogram):
+        seen += histogram[bucket]
+        if seen > rank:
+            break
+    # The geometric middle of the bucket's range
+    return _BUCKET_GROWTH ** (bucket + 0.5)
+
+
+@dataclass
+class FingerprintStats:
+    """Statistics of all executions of one query fingerprint."""
+
+    fingerprint: str
+    example: str
+    max_samples: int = 500
+    calls: int = 0
+    errors: int = 0
+    cache_hits: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    rows: int = 0
+    bytes: int = 0
+    first_seen: float = field(default_factory=time.time)
+    last_seen: float = field(default_factory=time.time)
+    # Latest latencies of executed (not cached) calls, for percentiles
+    samples: Deque[float] = field(default_factory=deque)
+    # Counter values already written to the stats file
+    persisted: Dict[str, float] = field(default_factory=dict)
+    # Latency histogram of the executed calls not yet written to the file
+    unpersisted: Dict[int, int] = field(default_factory=dict)
+
+    def record(
+        self, duration_ms: float, rows: int, bytes: int, error: bool, cached: bool
+    ) -> None:
+        self.calls += 1
+        self.last_seen = time.time()
+        if error:
+            self.errors += 1
+        if cached:
+            self.cache_hits += 1
+            return
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+        self.rows += rows
+        self.bytes += bytes
+        self.samples.append(duration_ms)
+        if len(self.samples) > self.max_samples:
+            self.samples.popleft()
+        bucket = latency_bucket(duration_ms)
+        self.unpersisted[bucket] = self.unpersisted.get(bucket, 0) + 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        executed = self.calls - self.cache_hits
+        return {
+            "fingerprint": self.fingerprint,
+            "example": self.example,
+            "calls": self.calls,
+            "errors": self.errors,
+            "error_rate": self.errors / self.calls if self.calls else 0.0,
+            "cache_hits": self.cache_hits,
+            "total_ms": self.total_ms,
+            "mean_ms": self.total_ms / executed if executed else 0.0,
+            "p50_ms": percentile(self.samples, 50),
+            "p95_ms": percentile(self.samples, 95),
+            "max_ms": self.max_ms,
+            "rows": self.rows,
+            "bytes": self.bytes,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+        }
+
+
+class QueryStatsStore:
+    """Per-fingerprint statistics of executed SQL.
+
+    `DatabaseTool.execute_query` records every call here. Statistics are kept
+    in memory and, with `query_stats.path`, periodically added to a SQLite
+    file that several processes can share and the CLI
+    (`python -m app.tools.query_stats`) reads.
+    """
+
+    def __init__(self, settings: Optional[QueryStatsSettings] = None):
+        # Settings are resolved on first use, like the tracer's exporters
+        self._settings = settings
+        self._stats: Dict[str, FingerprintStats] = {}
+        self._lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def settings(self) -> QueryStatsSettings:
+        return self._settings or config.query_stats
+
+    @property
+    def path(self) -> Optional[Path]:
+        path = self.settings.path
+        return PROJECT_ROOT / path if path else None
+
+    def record(
+        self,
+        sql: str,
+        duration_ms: float,
+        rows: int = 0,
+        bytes: int = 0,
+        error: bool = False,
+        cached: bool = False,
+    ) -> None:
+        """
+        Record one execution of a query.
+
+        Args:
+            sql: The executed SQL
+            duration_ms: Wall time of the call
+            rows: Rows returned
+            bytes: Memory of the returned DataFrame
+            error: Whether the query failed
+            cached: Whether the result came from the result cache
+        """
+        settings = self.settings
+        if not settings.enabled:
+            return
+        key = fingerprint_id(sql)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = FingerprintStats(
+                    fingerprint=fingerprint_sql(sql),
+                    example=sql,
+                    max_samples=settings.max_samples,
+                )
+            stats.record(duration_ms, rows, bytes, error, cached)
+            start_flusher = self._flusher is None and self.path is not None
+            if start_flusher:
+                self._flusher = threading.Thread(
+                    target=self._flush_loop, name="query-stats-flush", daemon=True
+                )
+        if start_flusher:
+            self._flusher.start()
+            atexit.register(self.flush)
+
+    def snapshot(self, sort_by: str = "total_ms") -> List[Dict[str, Any]]:
+        """
+        Statistics of this process, one dict per fingerprint.
+
+        Args:
+            sort_by: Key to sort by, descending (e.g. calls, p95_ms, error_rate)
+        """
+        with self._lock:
+            rows = [
+                {"fingerprint_id": key, **stats.to_dict()}
+                for key, stats in self._stats.items()
+            ]
+        return sorted(rows, key=lambda row: row[sort_by], reverse=True)
+
+    def _flush_loop(self) -> None:
+        while not self._stop.wait(self.settings.persist_interval):
+            self.flush()
+
+    def flush(self) -> None:
+        """Add the statistics gathered since the last flush to the stats file."""
+        path = self.path
+        if path is None:
+            return
+        with self._lock:
+            pending = []
+            for key, stats in self._stats.items():
+                row = {"fingerprint_id": key, **stats.to_dict()}
+                delta = {
+                    name: row[name] - stats.persisted.get(name, 0) for name in _COUNTERS
+                }
+                if not delta["calls"]:
+                    continue
+                pending.append((stats, {**row, **delta}, dict(stats.unpersisted)))
+        if not pending:
+            return
+
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with sqlite3.connect(path, timeout=10) as connection:
+                connection.execute(_SCHEMA)
+                connection.execute(_LATENCY_SCHEMA)
+                connection.executemany(_UPSERT, [row for _, row, _ in pending])
+                connection.executemany(
+                    _UPSERT_LATENCY,
+                    [
+                        (row["fingerprint_id"], bucket, count)
+                        for _, row, histogram in pending
+                        for bucket, count in histogram.items()
+                    ],
+                )
+                # Percentiles of the calls of all processes, within this
+                # write transaction
+                percentiles = []
+                for _, row, _ in pending:
+                    histogram = dict(
+                        connection.execute(
+                            "SELECT bucket, count FROM query_latency "
+                            "WHERE fingerprint_id = ?",
+                            (row["fingerprint_id"],),
+                        ).fetchall()
+                    )
+                    percentiles.append(
+                        (
+                            histogram_percentile(histogram, 50),
+                            histogram_percentile(histogram, 95),
+                            row["fingerprint_id"],
+                        )
+                    )
+                connection.executemany(
+                    "UPDATE query_stats SET p50_ms = ?, p95_ms = ? "
+                    "WHERE fingerprint_id = ?",
+                    percentiles,
+                )
+            connection.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not persist query stats to {path}: {e}")
+            return
+
+        with self._lock:
+            for stats, row, histogram in pending:
+                for name in _COUNTERS:
+                    stats.persisted[name] = stats.persisted.get(name, 0) + row[name]
+                for bucket, count in histogram.items():
+                    left = stats.unpersisted.get(bucket, 0) - count
+                    if left > 0:
+                        stats.unpersisted[bucket] = left
+                    else:
+                        stats.unpersisted.pop(bucket, None)
+
+    def reset(self) -> None:
+        """Forget the statistics of this process (the stats file is kept)."""
+        with self._lock:
+            self._stats.clear()
+
+    def close(self) -> None:
+        """Flush the statistics and stop the periodic flush."""
+        self._stop.set()
+        self.flush()
+
+
+def load_stats(
+    path: Path, sort_by: str = "total_ms", limit: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    Read persisted statistics from a stats file.
+
+    Args:
+        path: The SQLite stats file
+        sort_by: Column to sort by, descending
+        limit: Maximum number of fingerprints
+
+    Returns:
+        One dict per fingerprint, with `error_rate` and `mean_ms` added
+    """
+    with sqlite3.connect(path) as connection:
+        connection.row_factory = sqlite3.Row
+        rows = [dict(row) for row in connection.execute("SELECT * FROM query_stats")]
+    connection.close()
+    for row in rows:
+        executed = row["calls"] - row["cache_hits"]
+        row["error_rate"] = row["errors"] / row["calls"] if row["calls"] else 0.0
+        row["mean_ms"] = row["total_ms"] / executed if executed else 0.0
+    rows.sort(key=lambda row: row[sort_by], reverse=True)
+    return rows[:limit] if limit else rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show per-fingerprint query stats")
+    parser.add_argument("--path", help="Stats file (default: [query_stats] path)")
+    parser.add_argument(
+        "--sort",
+        default="total_ms",
+        choices=["total_ms", "calls", "p50_ms", "p95_ms", "max_ms", "error_rate"],
+    )
+    parser.add_argument("--top", type=int, default=20, help="Fingerprints to list")
+    parser.add_argument("--json", action="store_true", help="Print JSON lines")
+    args = parser.parse_args()
+
+    path = Path(args.path) if args.path else query_stats.path
+    if path is None or not path.exists():
+        parser.error(f"No query stats file at {path}")
+
+    rows = load_stats(path, args.sort, args.top)
+    if args.json:
+        for row in rows:
+            print(json.dumps(row, ensure_ascii=False))
+        return
+    print(
+        f"{'calls':>7} {'err%':>5} {'hits':>5} {'p50 ms':>9} {'p95 ms':>9} "
+        f"{'max ms':>9} {'total s':>9} {'rows':>9}  fingerprint"
+    )
+    for row in rows:
+        print(
+            f"{row['calls']:>7} {row['error_rate'] * 100:>5.1f} "
+            f"{row['cache_hits']:>5} {row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} "
+            f"{row['max_ms']:>9.1f} {row['total_ms'] / 1000:>9.2f} "
+            f"{row['rows']:>9}  {row['fingerprint'][:100]}"
+        )
+
+
+# Create a singleton instance
+query_stats = QueryStatsStore()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+import psycopg2
+import psycopg2.errors
+
+from app.logger import logger
+from app.tools.connection_pool import ConnectionPool
+
+PRIMARY = "primary"
+
+# Seconds the replica is behind the primary; 0 when it replayed all received WAL
+_LAG_SQL = """
+SELECT pg_is_in_recovery(),
+       CASE WHEN NOT pg_is_in_recovery()
+                 OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(
+                EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+       END
+"""
+
+
+@dataclass
+class ReplicaState:
+    pool: ConnectionPool
+    healthy: bool = True
+    lag: float = 0.0
+    checked_at: float = 0.0
+    queries: int = 0
+    failures: int = 0
+
+
+class ReplicaRouter:
+    """Routes read-only queries to the least busy healthy read replica.
+
+    A background thread checks every replica's health and replication lag
+    every `check_interval` seconds. Replicas that fail, or lag more than
+    `max_lag` seconds, receive no queries until a later check succeeds; when
+    no replica qualifies, queries go to the primary.
+    """
+
+    def __init__(
+        self,
+        primary: ConnectionPool,
+        replicas: Dict[str, ConnectionPool],
+        max_lag: float = 30.0,
+        check_interval: float = 10.0,
+    ):
+        """
+        Initialize the router and start the health checks.
+
+        Args:
+            primary: Pool of the primary database
+            replicas: Pools of the read replicas by name
+            max_lag: Maximum replication lag in seconds of a usable replica
+            check_interval: Seconds between health checks
+        """
+        self.primary = primary
+        self.replicas = {name: ReplicaState(pool) for name, pool in replicas.items()}
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._primary_queries = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._checker = threading.Thread(
+            target=self._check_loop, name="replica-health", daemon=True
+        )
+        self._checker.start()
+
+    def _check_loop(self) -> None:
+        while True:
+            for name in list(self.replicas):
+                self.check(name)
+            if self._stop.wait(self.check_interval):
+                return
+
+    def check(self, name: str) -> bool:
+        """Check a replica's health and lag now, and return whether it is usable."""
+        state = self.replicas[name]
+        try:
+            with state.pool.connection(timeout=self.check_interval) as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute(_LAG_SQL)
+                    _, lag = cursor.fetchone()
+                connection.commit()
+            healthy, lag = True, float(lag)
+        except Exception as e:
+            logger.warning(f"Read replica {name} failed its health check: {e}")
+            healthy, lag = False, state.lag
+
+        with self._lock:
+            if healthy and lag > self.max_lag and state.lag <= self.max_lag:
+                logger.warning(f"Read replica {name} lags {lag:.1f}s, not routing")
+            state.healthy, state.lag = healthy, lag
+            state.checked_at = time.monotonic()
+            return healthy and lag <= self.max_lag
+
+    def choose(self) -> Tuple[str, ConnectionPool]:
+        """
+        Pick the pool for the next read query.
+
+        Returns:
+            Tuple of the replica name (or "primary") and its pool
+        """
+        best: Optional[Tuple[float, str]] = None
+        with self._lock:
+            usable = [
+                name
+                for name, state in self.replicas.items()
+                if state.healthy and state.lag <= self.max_lag
+            ]
+        for name in usable:
+            metrics = self.replicas[name].pool.metrics()
+            busy = metrics["in_use"] / metrics["max_size"]
+            if best is None or busy < best[0]:
+                best = (busy, name)
+
+        with self._lock:
+            if best is None or best[0] >= 1.0:
+                # No replica qualifies or all are saturated
+                self._primary_queries += 1
+                return PRIMARY, self.primary
+            self.replicas[best[1]].queries += 1
+            return best[1], self.replicas[best[1]].pool
+
+    def mark_failed(self, name: str, error: Exception) -> None:
+        """Stop routing to a replica until its next successful health check."""
+        if name == PRIMARY:
+            return
+        logger.warning(f"Read replica {name} failed, falling back: {error}")
+        with self._lock:
+            state = self.replicas[name]
+            state.healthy = False
+            state.failures += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return health, lag, routed queries and pool metrics per replica."""
+        with self._lock:
+            replicas = {
+                name: {
+                    "healthy": state.healthy,
+                    "lag_s": state.lag,
+                    "queries": state.queries,
+                    "failures": state.failures,
+                }
+                for name, state in self.replicas.items()
+            }
+            primary_queries = self._primary_queries
+        for name, info in replicas.items():
+            info["pool"] = self.replicas[name].pool.metrics()
+        return {"primary_queries": primary_queries, "replicas": replicas}
+
+    def close(self) -> None:
+        """Stop the health checks and close the replica pools."""
+        self._stop.set()
+        self._checker.join(timeout=5)
+        for state in self.replicas.values():
+            state.pool.closeall()
+
+
+def is_connection_error(error: Exception) -> bool:
+    """Whether an error means the server is unreachable, not that the SQL failed."""
+    return isinstance(error, psycopg2.InterfaceError) or (
+        isinstance(error, psycopg2.OperationalError)
+        and not isinstance(error, psycopg2.errors.QueryCanceled)
+        and getattr(error, "pgcode", None) is None
+    )
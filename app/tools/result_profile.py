@@ -0,0 +1,231 @@
+import numbers
+import weakref
+from datetime import date, datetime
+from typing import Dict, List, Tuple
+import warnings
+
+import numpy as np
+import pandas as pd
+
+
+# Cache of rendered profiles keyed by id(df); entries are dropped when the
+# DataFrame is garbage collected so ids are never reused for a stale result.
+_PROFILE_CACHE: Dict[Tuple[int, int, int, int, int], str] = {}
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Roughly estimate the number of LLM tokens in a text.
+
+    ASCII text averages ~4 characters per token, while CJK characters are
+    usually one token each, so both are counted separately.
+    """
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return (len(text) - non_ascii) // 4 + non_ascii + 1
+
+
+def _format_value(value, max_len: int = 32) -> str:
+    """Format a scalar compactly for the prompt."""
+    if isinstance(value, (float, np.floating)):
+        text = f"{value:.6g}"
+    elif isinstance(value, (pd.Timestamp, datetime)):
+        text = str(pd.Timestamp(value)).replace(" 00:00:00", "")
+    else:
+        text = str(value)
+    if len(text) > max_len:
+        text = text[: max_len - 3] + "..."
+    return text
+
+
+def _as_numeric(series: pd.Series) -> pd.Series:
+    """Convert object columns holding numbers (e.g. Decimal) to float64."""
+    return pd.to_numeric(series, errors="coerce").astype("float64")
+
+
+def _column_kind(series: pd.Series) -> str:
+    """Classify a column as numeric, datetime, bool or categorical."""
+    if pd.api.types.is_bool_dtype(series):
+        return "bool"
+    if pd.api.types.is_numeric_dtype(series):
+        return "numeric"
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return "datetime"
+    if series.dtype == object:
+        non_null = series.dropna()
+        if non_null.empty:
+            return "categorical"
+        first = non_null.iloc[0]
+        if isinstance(first, bool):
+            return "bool"
+        if isinstance(first, numbers.Number):
+            return "numeric"
+        if isinstance(first, (datetime, date, pd.Timestamp)):
+            return "datetime"
+    return "categorical"
+
+
+def _numeric_lines(data: pd.DataFrame, positions: List[int]) -> Dict[int, str]:
+    """Profile all numeric columns at once using vectorized NumPy reductions."""
+    if not positions:
+        return {}
+
+    values = np.column_stack(
+        [
+            (
+                data.iloc[:, pos].to_numpy(dtype="float64", na_value=np.nan)
+                if pd.api.types.is_numeric_dtype(data.iloc[:, pos])
+                else _as_numeric(data.iloc[:, pos]).to_numpy()
+            )
+            for pos in positions
+        ]
+    )
+    null_counts = np.isnan(values).sum(axis=0)
+
+    with warnings.catch_warnings():
+        # All-NaN columns produce RuntimeWarnings; they are reported as nulls
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        mins = np.nanmin(values, axis=0)
+        maxs = np.nanmax(values, axis=0)
+        means = np.nanmean(values, axis=0)
+        quantiles = np.nanquantile(values, [0.25, 0.5, 0.75], axis=0)
+
+    n_rows = max(len(data), 1)
+    lines = {}
+    for i, pos in enumerate(positions):
+        null_rate = null_counts[i] / n_rows
+        if null_counts[i] == len(data):
+            lines[pos] = f"nulls {null_rate:.1%}"
+            continue
+        lines[pos] = (
+            f"nulls {null_rate:.1%}, min {_format_value(mins[i])}, "
+            f"max {_format_value(maxs[i])}, mean {_format_value(means[i])}, "
+            f"p25/p50/p75 {_format_value(quantiles[0, i])}/"
+            f"{_format_value(quantiles[1, i])}/{_format_value(quantiles[2, i])}"
+        )
+    return lines
+
+
+def _datetime_line(series: pd.Series) -> str:
+    """Profile a datetime column with its time range."""
+    if not pd.api.types.is_datetime64_any_dtype(series):
+        series = pd.to_datetime(series, errors="coerce")
+    null_rate = series.isna().mean() if len(series) else 0.0
+    non_null = series.dropna()
+    if non_null.empty:
+        return f"nulls {null_rate:.1%}"
+    return (
+        f"nulls {null_rate:.1%}, range {_format_value(non_null.min())} .. "
+        f"{_format_value(non_null.max())}, distinct {non_null.nunique()}"
+    )
+
+
+def _categorical_line(series: pd.Series, top_k: int) -> str:
+    """Profile a categorical column with its top-k values."""
+    n_rows = len(series)
+    counts = series.value_counts(dropna=True)
+    null_rate = series.isna().mean() if n_rows else 0.0
+    line = f"nulls {null_rate:.1%}, distinct {len(counts)}"
+    if len(counts):
+        top = ", ".join(
+            f"{_format_value(value)} ({count / n_rows:.1%})"
+            for value, count in counts.head(top_k).items()
+        )
+        line += f", top: {top}"
+    return line
+
+
+def profile_dataframe(
+    data: pd.DataFrame,
+    token_budget: int = 800,
+    top_k: int = 3,
+    sample_rows: int = 3,
+) -> str:
+    """
+    Build a compact statistical summary of a query result for the LLM.
+
+    The profile contains the row count, and per column the dtype, null rate,
+    min/max/mean/quantiles for numbers, top-k values for categories and the
+    time range for timestamps, followed by a few sample rows. The text is
+    kept under `token_budget` tokens by dropping trailing columns and sample
+    rows, so the prompt size stays fixed regardless of the result size.
+
+    Args:
+        data: Query result to profile
+        token_budget: Maximum number of (estimated) tokens of the profile
+        top_k: Number of most frequent values reported per categorical column
+        sample_rows: Number of sample rows appended to the profile
+
+    Returns:
+        The profile as plain text
+    """
+    if not isinstance(data, pd.DataFrame):
+        data = pd.DataFrame(data)
+
+    cache_key = (id(data), data.shape[0], data.shape[1], token_budget, top_k)
+    if cache_key in _PROFILE_CACHE:
+        return _PROFILE_CACHE[cache_key]
+
+    header = f"Rows: {len(data)}, Columns: {len(data.columns)}"
+    if data.empty:
+        profile = header
+    else:
+        profile = _build_profile(data, header, token_budget, top_k, sample_rows)
+
+    try:
+        weakref.finalize(data, _PROFILE_CACHE.pop, cache_key, None)
+        _PROFILE_CACHE[cache_key] = profile
+    except TypeError:
+        # Objects that do not support weak references are not cached
+        pass
+    return profile
+
+
+def _column_labels(columns: pd.Index) -> List[str]:
+    """Column names, numbering repeated ones (e.g. `id`, `id #2` of a join)."""
+    seen: Dict[str, int] = {}
+    labels = []
+    for col in columns:
+        name = str(col)
+        seen[name] = seen.get(name, 0) + 1
+        labels.append(name if seen[name] == 1 else f"{name} #{seen[name]}")
+    return labels
+
+
+def _build_profile(
+    data: pd.DataFrame, header: str, token_budget: int, top_k: int, sample_rows: int
+) -> str:
+    """Assemble the profile text within the token budget."""
+    # Columns are accessed by position, as names repeat in results of joins
+    columns = [data.iloc[:, pos] for pos in range(data.shape[1])]
+    kinds = [_column_kind(series) for series in columns]
+    stats = _numeric_lines(
+        data, [pos for pos, kind in enumerate(kinds) if kind == "numeric"]
+    )
+
+    lines = [header, "Columns:"]
+    used = estimate_tokens("\n".join(lines))
+    for i, (label, series) in enumerate(zip(_column_labels(data.columns), columns)):
+        kind = kinds[i]
+        if kind == "numeric":
+            detail = stats[i]
+        elif kind == "datetime":
+            detail = _datetime_line(series)
+        else:
+            detail = _categorical_line(series, top_k)
+        line = f"- {label} ({series.dtype}): {detail}"
+
+        cost = estimate_tokens(line)
+        if used + cost > token_budget:
+            lines.append(f"- ... {len(data.columns) - i} more columns omitted")
+            return "\n".join(lines)
+        lines.append(line)
+        used += cost
+
+    # Fill the remaining budget with sample rows, dropping rows that don't fit
+    for n in range(min(sample_rows, len(data)), 0, -1):
+        sample = f"Sample rows:\n{data.head(n).to_string(max_colwidth=32)}"
+        if used + estimate_tokens(sample) <= token_budget:
+            lines.append(sample)
+            break
+
+    return "\n".join(lines)
@@ -0,0 +1,479 @@
+import argparse
+import hashlib
+import json
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import PROJECT_ROOT, RollupSettings, config
+from app.logger import logger
+from app.tools.database import get_db_tool
+from app.tools.query_stats import load_stats, query_stats
+from app.tools.sql_shapes import (
+    AggregateQuery,
+    Dimension,
+    Measure,
+    parse_aggregate,
+    quote_identifier,
+    rewrite_aggregate,
+    slug,
+)
+
+# Rollup names are table names, Postgres truncates identifiers at 63 bytes
+_MAX_NAME = 63
+
+
+def _table_key(table: str) -> str:
+    """Unqualified table name, lowercased unless quoted."""
+    name = table.rsplit(".", 1)[-1]
+    if name.startswith('"'):
+        return name[1:-1].replace('""', '"')
+    return name.lower()
+
+
+@dataclass
+class RollupSpec:
+    """A pre-aggregated table of one source table.
+
+    Rows are grouped by the dimensions and hold re-aggregatable partial
+    results (SUM, COUNT, MIN, MAX) of the measures; AVG is answered from a
+    SUM and a COUNT.
+    """
+
+    name: str
+    table: str
+    dimensions: List[Dimension]
+    measures: List[Measure]
+
+    def select_sql(self) -> str:
+        """The aggregate query that fills the rollup."""
+        columns = [
+            f"{dim.expression} AS {quote_identifier(dim.name)}"
+            for dim in self.dimensions
+        ]
+        columns += [
+            f"{m.expression()} AS {quote_identifier(m.name)}" for m in self.measures
+        ]
+        sql = f"SELECT {', '.join(columns)} FROM {self.table}"
+        if self.dimensions:
+            sql += f" GROUP BY {', '.join(dim.expression for dim in self.dimensions)}"
+        return sql
+
+    def answers(self, query: AggregateQuery) -> bool:
+        """Whether the query can be computed from this rollup."""
+        expressions = {dim.expression for dim in self.dimensions}
+        return (
+            _table_key(query.table) == _table_key(self.table)
+            and all(dim.expression in expressions for dim in query.dimensions)
+            and all(m in self.measures for m in query.base_measures())
+        )
+
+
+@dataclass
+class RollupEntry:
+    """A created rollup, as stored in the registry."""
+
+    spec: RollupSpec
+    target: str = "default"
+    created_at: float = field(default_factory=time.time)
+    refreshed_at: float = field(default_factory=time.time)
+    # Seconds after a refresh during which the rollup is used (None: settings)
+    max_staleness: Optional[float] = None
+
+    @property
+    def name(self) -> str:
+        return self.spec.name
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RollupEntry":
+        spec = dict(data["spec"])
+        spec["dimensions"] = [Dimension(**dim) for dim in spec["dimensions"]]
+        spec["measures"] = [Measure(**m) for m in spec["measures"]]
+        return cls(**{**data, "spec": RollupSpec(**spec)})
+
+
+@dataclass
+class RollupProposal:
+    """A rollup the advisor recommends, with the workload it would serve."""
+
+    spec: RollupSpec
+    calls: int
+    total_ms: float
+    examples: List[str]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.spec.name,
+            "table": self.spec.table,
+            "dimensions": [dim.name for dim in self.spec.dimensions],
+            "measures": [m.name for m in self.spec.measures],
+            "calls": self.calls,
+            "total_ms": self.total_ms,
+            "sql": self.spec.select_sql(),
+            "examples": self.examples,
+        }
+
+
+def rollup_name(table: str, dimensions: List[Dimension]) -> str:
+    """Name of the rollup of a table by the given dimensions."""
+    name = "rollup_" + "_".join(
+        [slug(_table_key(table))] + [dim.name for dim in dimensions]
+    )
+    if len(name) > _MAX_NAME:
+        digest = hashlib.sha1(name.encode("utf-8")).hexdigest()[:8]
+        name = f"{name[:_MAX_NAME - 9]}_{digest}"
+    return name
+
+
+class RollupManager:
+    """Advises, creates and refreshes rollup tables, and routes queries to them.
+
+    The advisor reads the per-fingerprint query statistics for frequent
+    single-table aggregate shapes (GROUP BY over columns or time buckets such
+    as `date_trunc('day', created_at)`). Created rollups are recorded in a
+    JSON registry; `rewrite` answers matching queries from a rollup as long as
+    it was refreshed within its staleness bound.
+    """
+
+    def __init__(self, settings: Optional[RollupSettings] = None):
+        # Settings are resolved on first use, like the query stats
+        self._settings = settings
+        self._entries: Dict[str, RollupEntry] = {}
+        self._mtime: Optional[float] = None
+        self._lock = threading.RLock()
+
+    @property
+    def settings(self) -> RollupSettings:
+        return self._settings or config.rollups
+
+    @property
+    def path(self) -> Path:
+        return PROJECT_ROOT / self.settings.registry_path
+
+    def _load(self) -> Dict[str, RollupEntry]:
+        """The registry, re-read when another process changed the file."""
+        path = self.path
+        with self._lock:
+            mtime = path.stat().st_mtime if path.exists() else None
+            if mtime != self._mtime:
+                entries = {}
+                if mtime is not None:
+                    try:
+                        data = json.loads(path.read_text(encoding="utf-8"))
+                        for item in data.get("rollups", []):
+                            entry = RollupEntry.from_dict(item)
+                            entries[entry.name] = entry
+                    except (ValueError, KeyError, TypeError) as e:
+                        logger.warning(f"Could not read rollup registry {path}: {e}")
+                self._entries, self._mtime = entries, mtime
+            return self._entries
+
+    def _save(self, entries: Dict[str, RollupEntry]) -> None:
+        path = self.path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = {"rollups": [entry.to_dict() for entry in entries.values()]}
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+        tmp.replace(path)
+        self._entries, self._mtime = entries, path.stat().st_mtime
+
+    def list(self, target: Optional[str] = None) -> List[RollupEntry]:
+        """Registered rollups, of one database target if given."""
+        entries = list(self._load().values())
+        if target is not None:
+            entries = [
+                entry for entry in entries if entry.target == (target or "default")
+            ]
+        return entries
+
+    def is_fresh(self, entry: RollupEntry) -> bool:
+        """Whether a rollup was refreshed within its staleness bound."""
+        max_staleness = entry.max_staleness
+        if max_staleness is None:
+            max_staleness = self.settings.max_staleness
+        return time.time() - entry.refreshed_at <= max_staleness
+
+    def advise(
+        self,
+        min_calls: Optional[int] = None,
+        limit: int = 10,
+        stats: Optional[List[Dict[str, Any]]] = None,
+    ) -> List[RollupProposal]:
+        """
+        Propose rollups for frequent aggregate query shapes.
+
+        Fingerprints are grouped by table and dimensions (group and filter
+        keys); the measures of a group are merged into one rollup. Shapes that
+        an existing rollup already answers are skipped.
+
+        Args:
+            min_calls: Minimum calls of a group (defaults to `rollups.min_calls`)
+            limit: Maximum number of proposals
+            stats: Per-fingerprint statistics (defaults to the persisted query
+                stats, or those of this process without a stats file)
+
+        Returns:
+            Proposals, by total query time descending
+        """
+        if min_calls is None:
+            min_calls = self.settings.min_calls
+        if stats is None:
+            stats = self._query_stats()
+        existing = [entry.spec for entry in self._load().values()]
+        rollup_tables = {_table_key(spec.name) for spec in existing}
+
+        groups: Dict[Tuple[str, Tuple[str, ...]], Dict[str, Any]] = {}
+        for row in stats:
+            query = parse_aggregate(row["example"])
+            if query is None or _table_key(query.table) in rollup_tables:
+                continue
+            if any(spec.answers(query) for spec in existing):
+                continue
+            dims = sorted(query.dimensions, key=lambda dim: dim.expression)
+            key = (_table_key(query.table), tuple(dim.expression for dim in dims))
+            group = groups.setdefault(
+                key,
+                {
+                    "table": query.table,
+                    "dimensions": dims,
+                    "measures": {},
+                    "calls": 0,
+                    "total_ms": 0.0,
+                    "examples": [],
+                },
+            )
+            for measure in query.base_measures():
+                group["measures"].setdefault(measure, None)
+            group["calls"] += row["calls"]
+            group["total_ms"] += row["total_ms"]
+            group["examples"].append(row["example"])
+
+        proposals = [
+            RollupProposal(
+                spec=RollupSpec(
+                    name=rollup_name(group["table"], group["dimensions"]),
+                    table=group["table"],
+                    dimensions=group["dimensions"],
+                    measures=list(group["measures"]),
+                ),
+                calls=group["calls"],
+                total_ms=group["total_ms"],
+                examples=group["examples"][:3],
+            )
+            for group in groups.values()
+            if group["calls"] >= min_calls
+        ]
+        proposals.sort(key=lambda proposal: proposal.total_ms, reverse=True)
+        return proposals[:limit]
+
+    @staticmethod
+    def _query_stats() -> List[Dict[str, Any]]:
+        path = query_stats.path
+        if path is None:
+            return query_stats.snapshot()
+        query_stats.flush()
+        return load_stats(path) if path.exists() else []
+
+    def create(
+        self,
+        spec: RollupSpec,
+        target: Optional[str] = None,
+        max_staleness: Optional[float] = None,
+    ) -> RollupEntry:
+        """
+        Create and fill a rollup table and register it.
+
+        Args:
+            spec: The rollup, e.g. from `advise`
+            target: Database target (None: `[database]`)
+            max_staleness: Staleness bound of this rollup in seconds
+                (defaults to `rollups.max_staleness`)
+
+        Returns:
+            The registry entry
+
+        Raises:
+            ValueError: If a rollup with this name is already registered
+        """
+        with self._lock:
+            entries = dict(self._load())
+            if spec.name in entries:
+                raise ValueError(f"Rollup '{spec.name}' already exists")
+            table = quote_identifier(spec.name)
+            get_db_tool(target).execute_write(
+                [
+                    f"DROP TABLE IF EXISTS {table}",
+                    f"CREATE TABLE {table} AS {spec.select_sql()}",
+                ]
+            )
+            entry = RollupEntry(
+                spec=spec, target=target or "default", max_staleness=max_staleness
+            )
+            entries[spec.name] = entry
+            self._save(entries)
+        logger.info(f"Created rollup {spec.name} on {spec.table}")
+        return entry
+
+    def refresh(self, name: Optional[str] = None) -> List[str]:
+        """
+        Recompute rollups from their source tables.
+
+        Args:
+            name: The rollup to refresh (None refreshes all)
+
+        Returns:
+            Names of the refreshed rollups
+
+        Raises:
+            ValueError: If no rollup has this name
+        """
+        with self._lock:
+            entries = dict(self._load())
+            if name is not None and name not in entries:
+                raise ValueError(f"Unknown rollup '{name}'")
+            names = [name] if name is not None else list(entries)
+            for rollup in names:
+                entry = entries[rollup]
+                table = quote_identifier(rollup)
+                started = time.perf_counter()
+                # Readers see either the old or the new contents
+                get_db_tool(entry.target).execute_write(
+                    [
+                        f"DELETE FROM {table}",
+                        f"INSERT INTO {table} {entry.spec.select_sql()}",
+                    ]
+                )
+                entry.refreshed_at = time.time()
+                logger.info(
+                    f"Refreshed rollup {rollup} in "
+                    f"{(time.perf_counter() - started) * 1000:.0f} ms"
+                )
+            self._save(entries)
+        return names
+
+    def drop(self, name: str) -> None:
+        """Drop a rollup table and remove it from the registry."""
+        with self._lock:
+            entries = dict(self._load())
+            entry = entries.pop(name, None)
+            if entry is None:
+                raise ValueError(f"Unknown rollup '{name}'")
+            get_db_tool(entry.target).execute_write(
+                [f"DROP TABLE IF EXISTS {quote_identifier(name)}"]
+            )
+            self._save(entries)
+
+    def rewrite(
+        self, sql_query: str, target: Optional[str] = None
+    ) -> Optional[Tuple[str, RollupEntry]]:
+        """
+        Rewrite a query to read from a fresh rollup that answers it.
+
+        The rewritten query returns the same columns (names and order) as the
+        original; names only the database knows, like DuckDB's `sum(amount)`,
+        are looked up on it. Of several matching rollups the one with the fewest
+        dimensions, i.e. usually the fewest rows, is used.
+
+        Args:
+            sql_query: The query, typically agent-generated SQL
+            target: Database target the query runs on
+
+        Returns:
+            Tuple of the rewritten SQL and the rollup, or None
+        """
+        if not self.settings.enabled or not self.path.exists():
+            return None
+        query = parse_aggregate(sql_query)
+        if query is None:
+            return None
+        target = target or "default"
+        candidates = [
+            entry
+            for entry in self._load().values()
+            if entry.target == target and entry.spec.answers(query)
+        ]
+        candidates = [entry for entry in candidates if self.is_fresh(entry)]
+        if not candidates:
+            return None
+        entry = min(candidates, key=lambda entry: len(entry.spec.dimensions))
+
+        db = get_db_tool(None if target == "default" else target)
+        rewritten = rewrite_aggregate(
+            query,
+            quote_identifier(entry.name),
+            {
+                dim.expression: quote_identifier(dim.name)
+                for dim in entry.spec.dimensions
+            },
+            {m: quote_identifier(m.name) for m in entry.spec.measures},
+            db.settings.backend,
+            lambda: db.column_names(sql_query),
+        )
+        if rewritten is None:
+            return None
+        return rewritten, entry
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage pre-aggregated rollups")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    advise = commands.add_parser("advise", help="Propose rollups from query stats")
+    advise.add_argument("--min-calls", type=int, help="Minimum calls of a shape")
+    advise.add_argument("--top", type=int, default=10, help="Proposals to list")
+    advise.add_argument("--create", action="store_true", help="Create them")
+    advise.add_argument("--json", action="store_true", help="Print JSON lines")
+    advise.add_argument("--target", help="Database target (default: [database])")
+    advise.add_argument("--max-staleness", type=float, help="Seconds, when creating")
+
+    for name, help in (
+        ("list", "List registered rollups"),
+        ("refresh", "Recompute rollups"),
+        ("drop", "Drop a rollup"),
+    ):
+        command = commands.add_parser(name, help=help)
+        if name != "list":
+            command.add_argument("name", nargs="?" if name == "refresh" else None)
+    args = parser.parse_args()
+
+    if args.command == "advise":
+        proposals = rollups.advise(args.min_calls, args.top)
+        for proposal in proposals:
+            if args.json:
+                print(json.dumps(proposal.to_dict(), ensure_ascii=False))
+            else:
+                print(
+                    f"{proposal.spec.name}: {proposal.calls} calls, "
+                    f"{proposal.total_ms / 1000:.2f} s\n  {proposal.spec.select_sql()}"
+                )
+            if args.create:
+                rollups.create(proposal.spec, args.target, args.max_staleness)
+        if not proposals:
+            print("No frequent aggregate query shapes without a rollup")
+    elif args.command == "list":
+        for entry in rollups.list():
+            age = time.time() - entry.refreshed_at
+            state = "fresh" if rollups.is_fresh(entry) else "stale"
+            print(
+                f"{entry.name} ({entry.target}, {state}, refreshed {age:.0f}s ago)\n"
+                f"  {entry.spec.select_sql()}"
+            )
+    elif args.command == "refresh":
+        for name in rollups.refresh(args.name):
+            print(f"Refreshed {name}")
+    elif args.command == "drop":
+        rollups.drop(args.name)
+        print(f"Dropped {args.name}")
+
+
+# Create a singleton instance
+rollups = RollupManager()
+
+
+if __name__ == "__main__":
+    main()
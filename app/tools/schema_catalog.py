@@ -0,0 +1,252 @@
+import json
+import threading
+from dataclasses import dataclass, field
+from functools import cached_property
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.config import PROJECT_ROOT
+from app.logger import logger
+from app.startup import lazy_import
+from app.tools.join_graph import JoinGraph
+from app.tools.result_profile import estimate_tokens
+
+try:
+    msgpack = lazy_import("msgpack")
+except ImportError:  # msgpack is optional, only needed for .msgpack artifacts
+    msgpack = None
+
+DETAIL_LEVELS = ("compact", "medium", "full")
+
+# Longest example value shown in prompts
+_MAX_EXAMPLE_LEN = 32
+
+
+@dataclass
+class SchemaCatalog:
+    """The tables of a database, from the schema generator's artifact.
+
+    Renders prompt text at three levels of detail: "compact" (column names
+    and types on one line), "medium" (a line per column with keys and
+    comments) and "full" (plus examples, cardinality, NULL fraction and value
+    range). Rendering steps down to a lower level, then drops trailing
+    columns or tables, to stay within a token budget.
+    """
+
+    db_name: str
+    dialect: str
+    tables: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+    @classmethod
+    def from_artifact(cls, artifact: Dict[str, Any]) -> "SchemaCatalog":
+        return cls(
+            db_name=artifact.get("db_name", ""),
+            dialect=artifact.get("dialect", ""),
+            tables={table["name"]: table for table in artifact.get("tables", [])},
+        )
+
+    @property
+    def table_names(self) -> List[str]:
+        return list(self.tables)
+
+    @cached_property
+    def join_graph(self) -> JoinGraph:
+        """Join paths along the foreign keys between the tables."""
+        return JoinGraph.from_catalog(self)
+
+    def render_table(
+        self,
+        table_name: str,
+        detail: str = "medium",
+        token_budget: Optional[int] = None,
+    ) -> str:
+        """
+        Describe one table for the SQL generation prompt.
+
+        Args:
+            table_name: Name of a table of the catalog
+            detail: "compact", "medium" or "full"
+            token_budget: Maximum (estimated) tokens; None is unlimited
+
+        Returns:
+            The table description
+        """
+        table = self.tables[table_name]
+        header = [f"Table: {table_name}"]
+        if table.get("comment"):
+            header.append(f"Description: {table['comment']}")
+
+        def render(level: str) -> Tuple[List[str], List[str], str]:
+            if level == "compact":
+                references = {
+                    column: f"{fk['referred_table']}.{referred}"
+                    for fk in table.get("foreign_keys", [])
+                    for column, referred in zip(fk["columns"], fk["referred_columns"])
+                }
+                columns = [
+                    _compact_column(c, references.get(c["name"]))
+                    for c in table["columns"]
+                ]
+                return header + ["Columns:"], columns, ", "
+            lines = [_column_line(c, level == "full") for c in table["columns"]]
+            for fk in table.get("foreign_keys", []):
+                lines.append(_foreign_key_line(fk))
+            return header + ["Columns:"], lines, "\n"
+
+        return _fit(render, detail, token_budget, "columns")
+
+    def render_db_info(
+        self, detail: str = "compact", token_budget: Optional[int] = None
+    ) -> str:
+        """
+        List the tables of the database, e.g. for choosing a query's table.
+
+        "compact" lists table names and comments, "medium" adds the column
+        names and "full" the compact description of every table.
+        """
+        header = [
+            f"Database {self.db_name} ({self.dialect}) contains "
+            f"{len(self.tables)} tables:"
+        ]
+
+        def render(level: str) -> Tuple[List[str], List[str], str]:
+            lines = []
+            for name, table in self.tables.items():
+                if level == "full":
+                    lines.append(self.render_table(name, "compact"))
+                    continue
+                line = f"- {name}"
+                if level == "medium":
+                    columns = ", ".join(c["name"] for c in table["columns"])
+                    line += f" ({columns})"
+                if table.get("comment"):
+                    line += f": {table['comment']}"
+                lines.append(line)
+            return header, lines, "\n"
+
+        return _fit(render, detail, token_budget, "tables")
+
+    def table_schema(
+        self, detail: str = "medium", token_budget: Optional[int] = None
+    ) -> Dict[str, str]:
+        """Descriptions of all tables, like `SQLAgent.table_schema`."""
+        return {
+            name: self.render_table(name, detail, token_budget) for name in self.tables
+        }
+
+
+def _fit(
+    render: Callable[[str], Tuple[List[str], List[str], str]],
+    detail: str,
+    token_budget: Optional[int],
+    noun: str,
+) -> str:
+    """
+    Render at the given detail, or lower ones, within the token budget.
+
+    `render(level)` returns header lines, items and the items' separator;
+    if even the compact rendering is too long, trailing items are dropped.
+    """
+    if detail not in DETAIL_LEVELS:
+        raise ValueError(f"Unknown detail level '{detail}'")
+    for level in reversed(DETAIL_LEVELS[: DETAIL_LEVELS.index(detail) + 1]):
+        header, items, separator = render(level)
+        text = "\n".join(header + [separator.join(items)])
+        if token_budget is None or estimate_tokens(text) <= token_budget:
+            return text
+
+    # The compact rendering is still too long, keep the leading items
+    used = estimate_tokens("\n".join(header))
+    kept = []
+    for item in items:
+        cost = estimate_tokens(item)
+        if used + cost > token_budget - 10:
+            break
+        kept.append(item)
+        used += cost
+    omitted = len(items) - len(kept)
+    if omitted:
+        kept.append(f"... ({omitted} more {noun})")
+    body = separator.join(kept)
+    return "\n".join(header + [body])
+
+
+def _example(value: Any) -> str:
+    text = str(value)
+    if len(text) > _MAX_EXAMPLE_LEN:
+        text = text[: _MAX_EXAMPLE_LEN - 3] + "..."
+    return text
+
+
+def _compact_column(column: Dict[str, Any], reference: Optional[str]) -> str:
+    text = f"{column['name']} {column['type']}"
+    if column.get("primary_key"):
+        text += " PK"
+    if reference:
+        text += f" -> {reference}"
+    return text
+
+
+def _column_line(column: Dict[str, Any], full: bool) -> str:
+    parts = [column["type"]]
+    if column.get("primary_key"):
+        parts.append("primary key")
+    if not column.get("nullable", True) and not column.get("primary_key"):
+        parts.append("not null")
+    if column.get("comment"):
+        parts.append(column["comment"])
+    if full:
+        if column.get("examples"):
+            examples = ", ".join(_example(v) for v in column["examples"])
+            parts.append(f"examples: [{examples}]")
+        profile = column.get("profile") or {}
+        if profile.get("n_distinct") is not None:
+            parts.append(f"~{profile['n_distinct']} distinct")
+        if profile.get("null_frac"):
+            parts.append(f"{profile['null_frac']:.1%} null")
+        if profile.get("min") is not None:
+            parts.append(
+                f"range [{_example(profile['min'])}, {_example(profile['max'])}]"
+            )
+    return f"- {column['name']}: {', '.join(parts)}"
+
+
+def _foreign_key_line(fk: Dict[str, Any]) -> str:
+    return (
+        f"- foreign key ({', '.join(fk['columns'])}) references "
+        f"{fk['referred_table']}({', '.join(fk['referred_columns'])})"
+    )
+
+
+def read_artifact(path: Path) -> Dict[str, Any]:
+    """Read a schema artifact, MessagePack if it ends with `.msgpack`."""
+    if path.suffix == ".msgpack":
+        if msgpack is None:
+            raise ImportError("Reading .msgpack artifacts requires the msgpack package")
+        with path.open("rb") as f:
+            return msgpack.unpackb(f.read())
+    with path.open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+_catalogs: Dict[Path, Tuple[float, SchemaCatalog]] = {}
+_catalogs_lock = threading.Lock()
+
+
+def load_schema_catalog(path: str) -> SchemaCatalog:
+    """
+    Load a schema artifact, relative to the project root.
+
+    Catalogs are shared between callers and reloaded when the file changes.
+    """
+    full_path = PROJECT_ROOT / path
+    mtime = full_path.stat().st_mtime
+    with _catalogs_lock:
+        cached = _catalogs.get(full_path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    catalog = SchemaCatalog.from_artifact(read_artifact(full_path))
+    logger.info(f"Loaded schema artifact {full_path} with {len(catalog.tables)} tables")
+    with _catalogs_lock:
+        _catalogs[full_path] = (mtime, catalog)
+    return catalog
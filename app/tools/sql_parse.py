@@ -0,0 +1,233 @@
+import hashlib
+import re
+from typing import Iterator, List, Set, Tuple
+
+# Order matters: comments and quoted tokens must win over words and symbols
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<comment>--[^\n]*|/\*.*?\*/)
+    |(?P<string>'(?:[^']|'')*')
+    |(?P<ident>"(?:[^"]|"")*")
+    |(?P<number>\d+(?:\.\d*)?(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?)
+    |(?P<word>[^\W\d]\w*\$?)
+    |(?P<space>\s+)
+    |(?P<symbol>::|<=|>=|<>|!=|\|\||.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+# Keywords after which the next identifier names a table
+_TABLE_KEYWORDS = {"from", "join", "update", "into"}
+
+# Keywords that end a FROM list (the next comma is not a table separator)
+_CLAUSE_KEYWORDS = {
+    "where",
+    "group",
+    "order",
+    "having",
+    "limit",
+    "offset",
+    "union",
+    "intersect",
+    "except",
+    "window",
+    "on",
+    "using",
+    "returning",
+    "fetch",
+    "for",
+}
+
+
+# Statements that change data or the database, e.g. after WITH
+_WRITE_KEYWORDS = {
+    "insert",
+    "update",
+    "delete",
+    "merge",
+    "create",
+    "drop",
+    "alter",
+    "truncate",
+    "copy",
+    "attach",
+    "detach",
+    "install",
+    "load",
+    "checkpoint",
+    "vacuum",
+    "export",
+    "import",
+}
+
+
+def tokenize(sql: str) -> Iterator[Tuple[str, str]]:
+    """
+    Split SQL into (kind, text) tokens, skipping whitespace and comments.
+
+    Kinds are string, ident (quoted identifier), number, word and symbol.
+    """
+    for kind, text, _, _ in tokenize_spans(sql):
+        yield kind, text
+
+
+def tokenize_spans(sql: str) -> Iterator[Tuple[str, str, int, int]]:
+    """Like `tokenize`, with the start and end offset of every token."""
+    for match in _TOKEN_RE.finditer(sql):
+        kind = match.lastgroup
+        if kind in ("space", "comment"):
+            continue
+        yield kind, match.group(), match.start(), match.end()
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Canonical form of a SQL statement.
+
+    Comments, redundant whitespace and a trailing semicolon are dropped and
+    unquoted words lowercased, so formatting differences do not matter.
+    Literals are kept, so queries with different filter values stay distinct.
+
+    Args:
+        sql: The SQL statement
+
+    Returns:
+        str: Tokens of the statement joined by single spaces
+    """
+    parts = []
+    for kind, text in tokenize(sql):
+        parts.append(text.lower() if kind == "word" else text)
+    while parts and parts[-1] == ";":
+        parts.pop()
+    return " ".join(parts)
+
+
+def _identifier_name(text: str) -> str:
+    if text.startswith('"'):
+        return text[1:-1].replace('""', '"')
+    return text.lower()
+
+
+def referenced_tables(sql: str) -> Set[str]:
+    """
+    Names of the tables a statement reads or writes.
+
+    Table names follow FROM/JOIN (including comma separated FROM lists),
+    UPDATE and INTO. Schema prefixes are dropped, CTE names are included.
+
+    Args:
+        sql: The SQL statement
+
+    Returns:
+        Set of unqualified, lowercased (unless quoted) table names
+    """
+    tokens: List[Tuple[str, str]] = list(tokenize(sql))
+    tables = set()
+    in_from_list = False
+    depth_of_list = 0
+    depth = 0
+    i = 0
+    while i < len(tokens):
+        kind, text = tokens[i]
+        lowered = text.lower()
+        if text == "(":
+            depth += 1
+        elif text == ")":
+            depth -= 1
+            if in_from_list and depth < depth_of_list:
+                in_from_list = False
+        elif kind == "word" and lowered in _CLAUSE_KEYWORDS and depth == depth_of_list:
+            in_from_list = False
+
+        expects_table = (kind == "word" and lowered in _TABLE_KEYWORDS) or (
+            in_from_list and text == "," and depth == depth_of_list
+        )
+        if expects_table and i + 1 < len(tokens):
+            # Read a possibly schema-qualified name: a.b.c
+            j = i + 1
+            name = None
+            while j < len(tokens) and tokens[j][0] in ("word", "ident"):
+                name = _identifier_name(tokens[j][1])
+                if j + 1 < len(tokens) and tokens[j + 1][1] == ".":
+                    j += 2
+                    continue
+                break
+            if name is not None and name not in ("select", "lateral"):
+                tables.add(name)
+            if lowered == "from":
+                in_from_list = True
+                depth_of_list = depth
+        i += 1
+    return tables
+
+
+def is_read_only_query(sql: str) -> bool:
+    """
+    Whether a statement is a single query that cannot write.
+
+    That is one SELECT, or WITH without data-modifying statements, e.g. to
+    guard connections that cannot be opened read-only.
+
+    Args:
+        sql: The SQL statement
+
+    Returns:
+        bool: False for any other statement, and for several statements
+    """
+    tokens = list(tokenize(sql))
+    while tokens and tokens[-1][1] == ";":
+        tokens.pop()
+    if not tokens or tokens[0][1].lower() not in ("select", "with"):
+        return False
+    # A SELECT cannot contain statements, the CTEs of WITH can
+    is_with = tokens[0][1].lower() == "with"
+    for kind, text in tokens:
+        if text == ";":
+            return False
+        if is_with and kind == "word" and text.lower() in _WRITE_KEYWORDS:
+            return False
+    return True
+
+
+def fingerprint_sql(sql: str) -> str:
+    """
+    Canonical shape of a SQL statement, with literals replaced by `?`.
+
+    Queries that differ only in filter values, e.g. two dates or two IN
+    lists of different length, share one fingerprint.
+
+    Args:
+        sql: The SQL statement
+
+    Returns:
+        str: The normalized statement with `?` for every literal
+    """
+    parts: List[str] = []
+    for kind, text in tokenize(sql):
+        if kind in ("string", "number"):
+            # A minus sign directly after an operator belongs to the literal
+            if (
+                parts
+                and parts[-1] == "-"
+                and (len(parts) == 1 or not _is_operand(parts[-2]))
+            ):
+                parts.pop()
+            parts.append("?")
+        else:
+            parts.append(text.lower() if kind == "word" else text)
+        # Collapse lists of literals: in (?, ?, ?) -> in (?)
+        if len(parts) >= 3 and parts[-3:] == ["?", ",", "?"]:
+            del parts[-2:]
+    while parts and parts[-1] == ";":
+        parts.pop()
+    return " ".join(parts)
+
+
+def fingerprint_id(sql: str) -> str:
+    """Short, stable identifier of a statement's fingerprint."""
+    return hashlib.sha1(fingerprint_sql(sql).encode("utf-8")).hexdigest()[:16]
+
+
+def _is_operand(token: str) -> bool:
+    """Whether a token can end an operand, so a following `-` is binary."""
+    return token in (")", "?") or token[0].isalnum() or token[0] in '_"'
@@ -0,0 +1,1147 @@
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import pandas as pd
+
+from app.logger import logger
+from app.tools.sql_parse import tokenize_spans
+
+# Aggregates whose per-group results can be combined again
+AGGREGATES = ("sum", "count", "min", "max", "avg")
+
+# Constructs a single-table aggregate shape cannot contain
+_UNSUPPORTED = {
+    "join",
+    "union",
+    "intersect",
+    "except",
+    "over",
+    "distinct",
+    "window",
+    "lateral",
+    "with",
+    "into",
+    "having",
+    "fetch",
+}
+
+_CLAUSES = ("select", "from", "where", "group", "order", "limit", "offset")
+
+# Words that are not column references
+_KEYWORDS = {
+    "and",
+    "or",
+    "not",
+    "in",
+    "is",
+    "null",
+    "between",
+    "like",
+    "ilike",
+    "similar",
+    "true",
+    "false",
+    "as",
+    "case",
+    "when",
+    "then",
+    "else",
+    "end",
+    "interval",
+    "date",
+    "time",
+    "timestamp",
+    "asc",
+    "desc",
+    "nulls",
+    "first",
+    "last",
+    "any",
+    "all",
+    "some",
+    "exists",
+    "current_date",
+    "current_time",
+    "current_timestamp",
+    "localtime",
+    "localtimestamp",
+    "escape",
+    "collate",
+    "at",
+    "zone",
+}
+
+_LIMIT_RE = re.compile(r"^limit\s+(\d+|all)(?:\s+offset\s+(\d+))?$|^offset\s+(\d+)$")
+
+# Dates without a time compare the same way with timestamps and with buckets
+_DATE_LITERAL = re.compile(r"^'(\d{4})-(\d{2})-(\d{2})'$")
+
+
+@dataclass
+class Token:
+    kind: str
+    text: str
+    start: int
+    end: int
+
+    @property
+    def lower(self) -> str:
+        return self.text.lower() if self.kind == "word" else self.text
+
+
+@dataclass(frozen=True)
+class Dimension:
+    """A GROUP BY key: a column, or one expression over a single column."""
+
+    expression: str  # normalized SQL text
+    column: str
+    name: str  # column name in a rollup table
+
+    @property
+    def is_column(self) -> bool:
+        return self.expression == self.column.lower() or self.expression == (
+            f'"{self.column}"'
+        )
+
+
+@dataclass(frozen=True)
+class Measure:
+    """An aggregate over a single column; `column` is None for COUNT(*)."""
+
+    func: str
+    column: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        """Column name of the measure in a rollup table."""
+        return f"{self.func}_{slug(self.column)}" if self.column else "count_all"
+
+    def base_measures(self) -> List["Measure"]:
+        """Re-aggregatable measures needed to compute this one."""
+        if self.func == "avg":
+            return [Measure("sum", self.column), Measure("count", self.column)]
+        return [self]
+
+    def expression(self) -> str:
+        """SQL computing the measure over its source column."""
+        argument = "*" if self.column is None else quote_identifier(self.column)
+        return f"{self.func.upper()}({argument})"
+
+    def combine(self, column_of=None) -> str:
+        """
+        SQL re-aggregating partial results of this measure.
+
+        Args:
+            column_of: Maps a base measure to the column holding its partial
+                results (defaults to `Measure.name`)
+        """
+        column_of = column_of or (lambda measure: measure.name)
+        if self.func == "avg":
+            total, count = self.base_measures()
+            return f"SUM({column_of(total)}) * 1.0 / NULLIF(SUM({column_of(count)}), 0)"
+        if self.func == "count":
+            # Counts of the parts add up; like COUNT, 0 without rows and integer
+            return f"CAST(COALESCE(SUM({column_of(self)}), 0) AS BIGINT)"
+        # The other aggregates combine with themselves
+        func = "SUM" if self.func == "sum" else self.func.upper()
+        return f"{func}({column_of(self)})"
+
+
+@dataclass
+class SelectItem:
+    tokens: List[Token]
+    expression: str  # normalized
+    text: str  # as written
+    alias: Optional[str] = None
+    alias_quoted: bool = False
+    dimension: Optional[Dimension] = None
+    measure: Optional[Measure] = None
+
+
+# A WHERE clause as SQL text pieces and dimensions to substitute
+WherePart = Union[str, Dimension]
+
+
+@dataclass
+class AggregateQuery:
+    """A single-table `SELECT dims, aggregates ... GROUP BY dims` statement."""
+
+    table: str
+    items: List[SelectItem]
+    group_by: List[Dimension]
+    where: List[WherePart] = field(default_factory=list)
+    order_by: List[Tuple[List[Token], str]] = field(default_factory=list)
+    tail: str = ""  # LIMIT/OFFSET as written
+    from_sql: str = ""  # FROM clause as written, with the table alias
+    where_sql: str = ""  # WHERE condition as written
+
+    @property
+    def filter_dimensions(self) -> List[Dimension]:
+        return [part for part in self.where if isinstance(part, Dimension)]
+
+    @property
+    def dimensions(self) -> List[Dimension]:
+        """Group and filter dimensions, without duplicates."""
+        seen = {}
+        for dim in self.group_by + self.filter_dimensions:
+            seen.setdefault(dim.expression, dim)
+        return list(seen.values())
+
+    @property
+    def measures(self) -> List[Measure]:
+        return [item.measure for item in self.items if item.measure is not None]
+
+    def base_measures(self) -> List[Measure]:
+        """Re-aggregatable measures needed to answer the query, without duplicates."""
+        seen = {}
+        for measure in self.measures:
+            for base in measure.base_measures():
+                seen.setdefault(base, None)
+        return list(seen)
+
+
+@dataclass
+class UnionQuery:
+    """A SELECT without grouping, aggregates or DISTINCT.
+
+    Its result over several shards is the union of the shards' rows, sorted
+    and limited again by its ORDER BY and LIMIT/OFFSET.
+    """
+
+    items: List[Tuple[Optional[str], Optional[str]]]  # expression, alias; None for *
+    order_by: List[Tuple[List[Token], str]] = field(default_factory=list)
+    tail: str = ""  # LIMIT/OFFSET as written
+    offset: int = 0  # rows the OFFSET skips
+    shard_sql: str = ""  # the query every shard runs
+
+    @property
+    def has_star(self) -> bool:
+        return any(expression is None for expression, _ in self.items)
+
+
+def slug(text: str) -> str:
+    """Lowercase identifier made of letters, digits and underscores."""
+    return re.sub(r"[^0-9a-zA-Z_]+", "_", text).strip("_").lower() or "x"
+
+
+def quote_identifier(name: str) -> str:
+    """Quote an identifier unless it is a plain lowercase name."""
+    if re.fullmatch(r"[a-z_][a-z0-9_]*", name):
+        return name
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _unquote(token: Token) -> str:
+    if token.kind == "ident":
+        return token.text[1:-1].replace('""', '"')
+    return token.text
+
+
+def _split(tokens: List[Token], separator: str = ",") -> List[List[Token]]:
+    """Split tokens at top-level separators."""
+    parts: List[List[Token]] = [[]]
+    depth = 0
+    for token in tokens:
+        if token.text == "(":
+            depth += 1
+        elif token.text == ")":
+            depth -= 1
+        if depth == 0 and token.lower == separator:
+            parts.append([])
+        else:
+            parts[-1].append(token)
+    return parts
+
+
+def _normalized(tokens: List[Token]) -> str:
+    return " ".join(token.lower for token in tokens)
+
+
+def _column_refs(tokens: List[Token]) -> List[Tuple[int, int, str]]:
+    """
+    Column references as (first token, last token, column name).
+
+    Qualified references (`t.col`) span the qualifier; function names, type
+    names after `::` or `AS` and keywords are not references.
+    """
+    refs = []
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token.kind not in ("word", "ident"):
+            i += 1
+            continue
+        nxt = tokens[i + 1] if i + 1 < len(tokens) else None
+        prev = tokens[i - 1] if i > 0 else None
+        if nxt is not None and nxt.text == "." and i + 2 < len(tokens):
+            # Qualifier, the column is the last part
+            j = i + 2
+            while j + 2 < len(tokens) and tokens[j + 1].text == ".":
+                j += 2
+            refs.append((i, j, _unquote(tokens[j])))
+            i = j + 1
+            continue
+        is_call = nxt is not None and nxt.text == "("
+        is_type = prev is not None and prev.lower in ("::", "as")
+        if not is_call and not is_type and token.lower not in _KEYWORDS:
+            refs.append((i, i, _unquote(token)))
+        i += 1
+    return refs
+
+
+def _dimension(tokens: List[Token], text: str) -> Optional[Dimension]:
+    """Dimension of a grouping expression over exactly one column."""
+    refs = _column_refs(tokens)
+    columns = {column for _, _, column in refs}
+    if len(columns) != 1:
+        return None
+    column = columns.pop()
+    first, last, _ = refs[0]
+    if len(refs) == 1 and first == 0 and last == len(tokens) - 1:
+        # A plain (possibly qualified) column
+        return Dimension(
+            expression=_normalized(tokens[last:]), column=column, name=slug(column)
+        )
+
+    # Name a bucket after its unit or function: created_at_day, created_at_date
+    suffix = next(
+        (slug(token.text.strip("'")) for token in tokens if token.kind == "string"),
+        None,
+    )
+    if suffix is None:
+        suffix = next(
+            (
+                token.lower
+                for k, token in enumerate(tokens)
+                if token.kind == "word"
+                and (
+                    (k + 1 < len(tokens) and tokens[k + 1].text == "(")
+                    or (k > 0 and tokens[k - 1].lower in ("::", "as"))
+                )
+            ),
+            "expr",
+        )
+    expression = _normalized(
+        [token for k, token in enumerate(tokens) if not _is_qualifier(tokens, k)]
+    )
+    return Dimension(
+        expression=expression, column=column, name=f"{slug(column)}_{suffix}"
+    )
+
+
+def _is_qualifier(tokens: List[Token], k: int) -> bool:
+    """Whether token k is a table qualifier or the dot after it."""
+    if tokens[k].text == "." and k > 0:
+        return True
+    return (
+        tokens[k].kind in ("word", "ident")
+        and k + 1 < len(tokens)
+        and tokens[k + 1].text == "."
+    )
+
+
+def bucket_unit(dim: Dimension) -> Optional[str]:
+    """Time unit a bucket dimension truncates to (day, month, year), if known."""
+    if dim.is_column:
+        return None
+    if "date_trunc" in dim.expression:
+        match = re.search(r"'(day|month|year)'", dim.expression)
+        return match.group(1) if match else None
+    if re.search(r"(^|[ :(])date\b", dim.expression):
+        return "day"
+    return None
+
+
+def _aligned(literal: str, unit: str) -> bool:
+    """Whether a date literal is the first instant of a `unit` bucket."""
+    match = _DATE_LITERAL.match(literal)
+    if not match:
+        return False
+    _, month, day = match.groups()
+    if unit == "day":
+        return True
+    if unit == "month":
+        return day == "01"
+    return unit == "year" and month == "01" and day == "01"
+
+
+def _split_alias(tokens: List[Token]) -> Tuple[List[Token], Optional[str], bool]:
+    """Split a select list item into its expression, alias and alias quoting."""
+    if len(tokens) >= 3 and tokens[-2].lower == "as":
+        return tokens[:-2], _unquote(tokens[-1]), tokens[-1].kind == "ident"
+    if (
+        len(tokens) >= 2
+        and tokens[-1].kind in ("word", "ident")
+        and tokens[-1].lower not in _KEYWORDS
+        and (tokens[-2].text == ")" or tokens[-2].kind in ("word", "ident"))
+    ):
+        # Implicit alias: SUM(amount) total
+        return tokens[:-1], _unquote(tokens[-1]), tokens[-1].kind == "ident"
+    return tokens, None, False
+
+
+def _item(tokens: List[Token], sql: str) -> Optional[SelectItem]:
+    """Parse a select list item into a dimension or a measure."""
+    tokens, alias, alias_quoted = _split_alias(tokens)
+    if not tokens or any(token.text == "*" for token in tokens[:1]):
+        return None
+
+    item = SelectItem(
+        tokens=tokens,
+        expression=_normalized(tokens),
+        text=sql[tokens[0].start : tokens[-1].end],
+        alias=alias,
+        alias_quoted=alias_quoted,
+    )
+    func = tokens[0].lower
+    if (
+        func in AGGREGATES
+        and len(tokens) >= 4
+        and tokens[1].text == "("
+        and tokens[-1].text == ")"
+        and len(_split(tokens[2:-1])) == 1
+    ):
+        argument = tokens[2:-1]
+        if func == "count" and len(argument) == 1 and argument[0].text == "*":
+            item.measure = Measure("count")
+            return item
+        refs = _column_refs(argument)
+        if len(refs) == 1 and refs[0][0] == 0 and refs[0][1] == len(argument) - 1:
+            item.measure = Measure(func, refs[0][2])
+            return item
+        return None  # e.g. SUM(price * quantity)
+    item.dimension = _dimension(tokens, item.text)
+    return item if item.dimension is not None else None
+
+
+def parse_aggregate(sql: str) -> Optional[AggregateQuery]:
+    """
+    Parse a single-table aggregate query.
+
+    Supported are SELECT lists of grouping expressions over one column each
+    and SUM/COUNT/MIN/MAX/AVG of a column, a plain table in FROM, WHERE
+    conditions, GROUP BY, ORDER BY and LIMIT/OFFSET. Joins, subqueries,
+    DISTINCT, HAVING and window functions are not supported.
+
+    Args:
+        sql: The SQL statement
+
+    Returns:
+        The parsed query, or None if the statement has another shape
+    """
+    tokens = [Token(*spans) for spans in tokenize_spans(sql)]
+    while tokens and tokens[-1].text == ";":
+        tokens.pop()
+    if not tokens or tokens[0].lower != "select":
+        return None
+    if (
+        any(token.kind == "word" and token.lower in _UNSUPPORTED for token in tokens)
+        or sum(token.lower == "select" for token in tokens) != 1
+    ):
+        return None
+
+    # Split into top-level clauses
+    clauses: Dict[str, List[Token]] = {}
+    current = None
+    depth = 0
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token.text == "(":
+            depth += 1
+        elif token.text == ")":
+            depth -= 1
+        if depth == 0 and token.kind == "word" and token.lower in _CLAUSES:
+            current = token.lower
+            if current in clauses:
+                return None
+            clauses[current] = []
+            if current in ("group", "order"):
+                if i + 1 >= len(tokens) or tokens[i + 1].lower != "by":
+                    return None
+                i += 1
+            i += 1
+            continue
+        if current is None:
+            return None
+        clauses[current].append(token)
+        i += 1
+
+    table = _table(clauses.get("from", []))
+    if table is None:
+        return None
+
+    items = []
+    for part in _split(clauses["select"]):
+        item = _item(part, sql)
+        if item is None:
+            return None
+        items.append(item)
+    if not any(item.measure for item in items):
+        return None
+
+    group_by = _group_by(clauses.get("group", []), items, sql)
+    if group_by is None:
+        return None
+    grouped = {dim.expression for dim in group_by}
+    if any(
+        item.dimension.expression not in grouped for item in items if item.dimension
+    ):
+        return None
+
+    where = _where(clauses.get("where", []), group_by)
+    if where is None:
+        return None
+
+    order_by = _order_by(clauses["order"]) if "order" in clauses else []
+    if order_by is None:
+        return None
+
+    tail = ""
+    tail_tokens = [t for name in ("limit", "offset") for t in clauses.get(name, [])]
+    if tail_tokens:
+        tail_start = min(
+            t.start
+            for t in tokens
+            if t.kind == "word" and t.lower in ("limit", "offset")
+        )
+        tail = sql[tail_start : tokens[-1].end]
+
+    return AggregateQuery(
+        table=table,
+        items=items,
+        group_by=group_by,
+        where=where,
+        order_by=order_by,
+        tail=tail,
+        from_sql=_text(sql, clauses["from"]),
+        where_sql=_text(sql, clauses.get("where", [])),
+    )
+
+
+def _order_by(tokens: List[Token]) -> Optional[List[Tuple[List[Token], str]]]:
+    """ORDER BY items as (expression tokens, direction and NULLS suffix)."""
+    order_by = []
+    for part in _split(tokens):
+        suffix_start = len(part)
+        while suffix_start > 0 and part[suffix_start - 1].lower in (
+            "asc",
+            "desc",
+            "nulls",
+            "first",
+            "last",
+        ):
+            suffix_start -= 1
+        if suffix_start == 0:
+            return None
+        suffix = " ".join(token.text for token in part[suffix_start:])
+        order_by.append((part[:suffix_start], suffix))
+    return order_by
+
+
+def _text(sql: str, tokens: List[Token]) -> str:
+    return sql[tokens[0].start : tokens[-1].end] if tokens else ""
+
+
+def _table(tokens: List[Token]) -> Optional[str]:
+    """Name of the single table of a FROM clause (with its schema)."""
+    parts = []
+    i = 0
+    while i < len(tokens) and tokens[i].kind in ("word", "ident"):
+        parts.append(tokens[i].text)
+        if i + 1 < len(tokens) and tokens[i + 1].text == ".":
+            i += 2
+            continue
+        i += 1
+        break
+    if not parts:
+        return None
+    rest = tokens[i:]
+    # Optional alias: [AS] name
+    if rest and rest[0].lower == "as":
+        rest = rest[1:]
+    if len(rest) > 1 or (rest and rest[0].kind not in ("word", "ident")):
+        return None
+    return ".".join(parts)
+
+
+def _group_by(
+    tokens: List[Token], items: List[SelectItem], sql: str
+) -> Optional[List[Dimension]]:
+    """Resolve GROUP BY expressions, positions and aliases to dimensions."""
+    if not tokens:
+        return []
+    dims = []
+    for part in _split(tokens):
+        if len(part) == 1 and part[0].kind == "number":
+            position = int(part[0].text) - 1
+            if not 0 <= position < len(items) or items[position].dimension is None:
+                return None
+            dims.append(items[position].dimension)
+            continue
+        if len(part) == 1:
+            aliased = [
+                item
+                for item in items
+                if item.alias is not None and item.alias.lower() == part[0].lower
+            ]
+            if aliased:
+                if aliased[0].dimension is None:
+                    return None
+                dims.append(aliased[0].dimension)
+                continue
+        dim = _dimension(part, sql[part[0].start : part[-1].end])
+        if dim is None:
+            return None
+        dims.append(dim)
+    return dims
+
+
+def _where(tokens: List[Token], group_by: List[Dimension]) -> Optional[List[WherePart]]:
+    """
+    Split a WHERE clause into SQL text and the dimensions it filters on.
+
+    Occurrences of grouped bucket expressions become that dimension, and so
+    do range bounds `col >= 'date'` / `col < 'date'` on a column grouped by a
+    time bucket when the date is aligned to the bucket. Other column
+    references become plain column dimensions.
+    """
+    buckets = [dim for dim in group_by if not dim.is_column]
+    parts: List[WherePart] = []
+    i = 0
+    while i < len(tokens):
+        bucket = _match_bucket(tokens, i, buckets)
+        if bucket is not None:
+            dim, length = bucket
+            parts.append(dim)
+            i += length
+            continue
+
+        refs = _column_refs(tokens[i:])
+        if refs and refs[0][0] == 0:
+            _, last, column = refs[0]
+            bound = _time_bound(tokens, i + last, column, buckets)
+            if bound is not None:
+                parts.append(bound)
+            else:
+                parts.append(
+                    Dimension(
+                        expression=tokens[i + last].lower,
+                        column=column,
+                        name=slug(column),
+                    )
+                )
+            i += last + 1
+            continue
+        if tokens[i].lower == "select":
+            return None
+        parts.append(tokens[i].text)
+        i += 1
+    return parts
+
+
+def _match_bucket(
+    tokens: List[Token], i: int, buckets: List[Dimension]
+) -> Optional[Tuple[Dimension, int]]:
+    for dim in buckets:
+        length = len(dim.expression.split(" "))
+        window = [
+            token
+            for k, token in enumerate(tokens[i : i + length + 2])
+            if not _is_qualifier(tokens[i:], k)
+        ][:length]
+        if _normalized(window) == dim.expression:
+            # Count the qualifier tokens that were skipped
+            consumed = 0
+            matched = 0
+            while matched < length:
+                if not _is_qualifier(tokens[i:], consumed):
+                    matched += 1
+                consumed += 1
+            return dim, consumed
+    return None
+
+
+def _time_bound(
+    tokens: List[Token], last: int, column: str, buckets: List[Dimension]
+) -> Optional[Dimension]:
+    """The bucket dimension a `col >= 'date'` / `col < 'date'` bound can use."""
+    if last + 2 >= len(tokens) or tokens[last + 1].text not in (">=", "<"):
+        return None
+    literal = tokens[last + 2]
+    if literal.kind == "word" and literal.lower in ("date", "timestamp"):
+        literal = tokens[last + 3] if last + 3 < len(tokens) else literal
+    if literal.kind != "string":
+        return None
+    for dim in buckets:
+        unit = bucket_unit(dim)
+        if dim.column == column and unit and _aligned(literal.text, unit):
+            return dim
+    return None
+
+
+def default_column_name(item: SelectItem, dialect: str) -> Optional[str]:
+    """Name the database gives an unaliased select item, None if unknown."""
+    if item.dimension is not None and item.dimension.is_column:
+        return item.dimension.column
+    if dialect == "sqlite":
+        # SQLite names expressions after their text
+        return item.text
+    if dialect != "postgres":
+        # DuckDB names them after its rendering of the expression, e.g.
+        # count_star() or sum(amount), which only the database knows
+        return None
+    tokens = item.tokens
+    if item.dimension is not None:
+        if any(token.text == "::" for token in tokens) or tokens[0].lower == "cast":
+            return item.dimension.column
+    if len(tokens) > 1 and tokens[0].kind == "word" and tokens[1].text == "(":
+        return tokens[0].lower
+    return "?column?"
+
+
+def output_column_name(item: SelectItem, dialect: str) -> Optional[str]:
+    """Name of a select item's column in the result, None if unknown."""
+    if item.alias is None:
+        return default_column_name(item, dialect)
+    if dialect == "postgres" and not item.alias_quoted:
+        return item.alias.lower()
+    return item.alias
+
+
+def output_column_names(
+    query: AggregateQuery,
+    dialect: str,
+    column_names: Optional[Callable[[], List[str]]] = None,
+) -> List[str]:
+    """
+    Names of the result columns of an aggregate query.
+
+    Args:
+        query: The parsed query
+        dialect: Backend name ("postgres", "sqlite" or "duckdb")
+        column_names: Returns the names the database gives the query's
+            columns, e.g. `DatabaseTool.column_names`; only called if a name
+            cannot be derived from the query
+
+    Returns:
+        One name per select item; the item's text where it is unknown
+    """
+    names = [output_column_name(item, dialect) for item in query.items]
+    if None in names and column_names is not None:
+        try:
+            described = column_names()
+        except Exception as e:
+            logger.warning(f"Could not get the result column names: {e}")
+        else:
+            if len(described) == len(names):
+                return described
+            logger.warning("The database returned other columns than selected")
+    return [
+        item.text if name is None else name for item, name in zip(query.items, names)
+    ]
+
+
+def partial_aggregate_sql(query: AggregateQuery) -> str:
+    """
+    The query computing re-aggregatable partial results of an aggregate query.
+
+    It keeps the FROM and WHERE clauses and returns every GROUP BY dimension
+    and base measure under its `name`, e.g. to run on each of several shards
+    and combine the results.
+    """
+    dims = list({dim.expression: dim for dim in query.group_by}.values())
+    columns = [f"{dim.expression} AS {quote_identifier(dim.name)}" for dim in dims]
+    columns += [
+        f"{m.expression()} AS {quote_identifier(m.name)}" for m in query.base_measures()
+    ]
+    sql = f"SELECT {', '.join(columns)} FROM {query.from_sql}"
+    if query.where_sql:
+        sql += f" WHERE {query.where_sql}"
+    if dims:
+        sql += f" GROUP BY {', '.join(dim.expression for dim in dims)}"
+    return sql
+
+
+def rewrite_aggregate(
+    query: AggregateQuery,
+    table: str,
+    dimension_names: Dict[str, str],
+    measure_columns: Dict[Measure, str],
+    dialect: str = "postgres",
+    column_names: Optional[Callable[[], List[str]]] = None,
+) -> Optional[str]:
+    """
+    Rewrite an aggregate query to read pre-aggregated partial results.
+
+    Args:
+        query: The parsed query
+        table: Table (or subquery in parentheses) with the partial results
+        dimension_names: Column of every dimension, by dimension expression
+        measure_columns: Column of every base measure's partial results
+        dialect: Backend name, to keep the result column names ("postgres",
+            "sqlite" or "duckdb")
+        column_names: Returns the result column names of the original query
+            where the dialect's naming rules do not tell them (see
+            `output_column_names`)
+
+    Returns:
+        The rewritten SQL, or None if a dimension or measure is not available
+    """
+    if any(dim.expression not in dimension_names for dim in query.dimensions):
+        return None
+    if any(measure not in measure_columns for measure in query.base_measures()):
+        return None
+
+    select = []
+    names = output_column_names(query, dialect, column_names)
+    for item, name in zip(query.items, names):
+        if item.dimension is not None:
+            expression = dimension_names[item.dimension.expression]
+        else:
+            expression = item.measure.combine(measure_columns.get)
+        name = name.replace('"', '""')
+        select.append(f'{expression} AS "{name}"')
+
+    sql = f"SELECT {', '.join(select)} FROM {table}"
+    if query.where:
+        where = " ".join(
+            dimension_names[part.expression] if isinstance(part, Dimension) else part
+            for part in query.where
+        )
+        sql += f" WHERE {where}"
+    if query.group_by:
+        group_by = dict.fromkeys(
+            dimension_names[dim.expression] for dim in query.group_by
+        )
+        sql += f" GROUP BY {', '.join(group_by)}"
+
+    if query.order_by:
+        items = []
+        for expression_tokens, suffix in query.order_by:
+            expression = _normalized(expression_tokens)
+            aliases = {item.alias.lower() for item in query.items if item.alias}
+            if len(expression_tokens) == 1 and (
+                expression_tokens[0].kind == "number" or expression in aliases
+            ):
+                rewritten = expression_tokens[0].text
+            elif expression in dimension_names:
+                rewritten = dimension_names[expression]
+            else:
+                match = [
+                    item
+                    for item in query.items
+                    if item.expression == expression
+                    or (item.dimension and item.dimension.expression == expression)
+                ]
+                if not match:
+                    return None
+                item = match[0]
+                rewritten = (
+                    dimension_names[item.dimension.expression]
+                    if item.dimension
+                    else item.measure.combine(measure_columns.get)
+                )
+            items.append(f"{rewritten} {suffix}".strip())
+        sql += f" ORDER BY {', '.join(items)}"
+    if query.tail:
+        sql += f" {query.tail}"
+    return sql
+
+
+def apply_order_and_limit(query: AggregateQuery, df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Apply an aggregate query's ORDER BY and LIMIT/OFFSET to a result computed
+    outside the database, e.g. merged from shards.
+
+    Args:
+        query: The parsed query
+        df: Its result, one column per select item
+
+    Returns:
+        The sorted and limited rows, with their original index
+    """
+    order = []
+    for tokens, suffix in query.order_by:
+        position = _order_position(query, tokens)
+        if position is None:
+            logger.warning("ORDER BY is not on a selected column, not sorting")
+            order = []
+            break
+        order.append((position, suffix))
+    return _sort_and_limit(df, order, query.tail)
+
+
+def _sort_and_limit(
+    df: pd.DataFrame, order: List[Tuple[int, str]], tail: str
+) -> pd.DataFrame:
+    """Sort by (column position, ORDER BY suffix) keys, then apply LIMIT/OFFSET."""
+    keys, ascending = [], []
+    nulls_first = None
+    for position, suffix in order:
+        keys.append(position)
+        suffix = suffix.lower()
+        ascending.append("desc" not in suffix)
+        if nulls_first is None:
+            # NULLs sort as the largest value by default, like Postgres
+            nulls_first = "nulls first" in suffix or (
+                "desc" in suffix and "nulls last" not in suffix
+            )
+    if keys:
+        # Sort by position, result column names need not be unique
+        names = df.columns
+        df = df.set_axis(range(len(names)), axis=1)
+        df = df.sort_values(
+            keys,
+            ascending=ascending,
+            na_position="first" if nulls_first else "last",
+            kind="stable",
+        ).set_axis(names, axis=1)
+
+    match = _LIMIT_RE.match(" ".join(tail.lower().split()))
+    if match:
+        limit, offset, only_offset = match.groups()
+        start = int(offset or only_offset or 0)
+        end = start + int(limit) if limit and limit != "all" else None
+        df = df.iloc[start:end]
+    elif tail:
+        logger.warning(f"Unsupported LIMIT clause '{tail}', not applied")
+    return df
+
+
+def _order_position(query: AggregateQuery, tokens) -> Optional[int]:
+    """Position of the select item an ORDER BY expression refers to."""
+    expression = " ".join(token.lower for token in tokens)
+    if len(tokens) == 1 and tokens[0].kind == "number":
+        position = int(tokens[0].text) - 1
+        return position if 0 <= position < len(query.items) else None
+    for position, item in enumerate(query.items):
+        if len(tokens) == 1 and item.alias and item.alias.lower() == expression:
+            return position
+    for position, item in enumerate(query.items):
+        if item.expression == expression or (
+            item.dimension and item.dimension.expression == expression
+        ):
+            return position
+    return None
+
+
+# Words after which a query's rows on several shards cannot be concatenated
+_NOT_UNIONABLE = {
+    "group",
+    "having",
+    "distinct",
+    "over",
+    "window",
+    "union",
+    "intersect",
+    "except",
+    "with",
+    "into",
+    "lateral",
+    "fetch",
+}
+
+# Aggregate functions besides AGGREGATES, as called in a query
+_OTHER_AGGREGATES = {
+    "array_agg",
+    "string_agg",
+    "group_concat",
+    "json_agg",
+    "jsonb_agg",
+    "json_object_agg",
+    "jsonb_object_agg",
+    "json_group_array",
+    "json_group_object",
+    "list",
+    "bool_and",
+    "bool_or",
+    "every",
+    "bit_and",
+    "bit_or",
+    "stddev",
+    "stddev_pop",
+    "stddev_samp",
+    "variance",
+    "var_pop",
+    "var_samp",
+    "median",
+    "mode",
+    "percentile_cont",
+    "percentile_disc",
+    "approx_count_distinct",
+    "count_if",
+    "any_value",
+    "arg_max",
+    "arg_min",
+    "total",
+}
+
+
+def parse_union(sql: str) -> Optional[UnionQuery]:
+    """
+    Parse a query whose result over several shards is the union of their rows.
+
+    That is a single SELECT without GROUP BY, HAVING, DISTINCT, aggregate or
+    window functions, set operations and CTEs, whose ORDER BY expressions are
+    result columns. A LIMIT n OFFSET m becomes LIMIT n + m in `shard_sql`, so
+    the rows to return are among the shards'.
+
+    Args:
+        sql: The SQL statement
+
+    Returns:
+        The parsed query, or None if the statement has another shape
+    """
+    tokens = [Token(*spans) for spans in tokenize_spans(sql)]
+    while tokens and tokens[-1].text == ";":
+        tokens.pop()
+    if not tokens or tokens[0].lower != "select":
+        return None
+    if sum(token.lower == "select" for token in tokens) != 1:
+        return None
+    for i, token in enumerate(tokens):
+        if token.kind != "word":
+            continue
+        if token.lower in _NOT_UNIONABLE:
+            return None
+        is_call = i + 1 < len(tokens) and tokens[i + 1].text == "("
+        if is_call and (token.lower in AGGREGATES or token.lower in _OTHER_AGGREGATES):
+            return None
+
+    # Positions of the top-level clauses that matter for merging
+    positions: Dict[str, int] = {}
+    depth = 0
+    for i, token in enumerate(tokens):
+        if token.text == "(":
+            depth += 1
+        elif token.text == ")":
+            depth -= 1
+        elif depth == 0 and token.kind == "word" and token.lower in _CLAUSES:
+            positions.setdefault(token.lower, i)
+    if "order" in positions and (
+        positions["order"] + 1 >= len(tokens)
+        or tokens[positions["order"] + 1].lower != "by"
+    ):
+        return None
+
+    tail_start = min(
+        (positions[name] for name in ("limit", "offset") if name in positions),
+        default=len(tokens),
+    )
+    select_end = positions.get("from", positions.get("order", tail_start))
+    items: List[Tuple[Optional[str], Optional[str]]] = []
+    # Result column names where the query tells them, "" for expressions
+    names: List[str] = []
+    for part in _split(tokens[1:select_end]):
+        if not part:
+            return None
+        if part[-1].text == "*":
+            items.append((None, None))
+            names.append("")
+            continue
+        part, alias, _ = _split_alias(part)
+        items.append((_normalized(part), alias))
+        refs = _column_refs(part)
+        if alias is None and len(refs) == 1 and refs[0][:2] == (0, len(part) - 1):
+            alias = refs[0][2]
+        names.append(alias or "")
+
+    order_by = []
+    if "order" in positions:
+        if positions["order"] > tail_start:
+            return None
+        order_by = _order_by(tokens[positions["order"] + 2 : tail_start])
+        if order_by is None:
+            return None
+
+    head = sql[: tokens[tail_start - 1].end]
+    shard_sql = sql[: tokens[-1].end]
+    tail, offset = "", 0
+    if tail_start < len(tokens):
+        tail = sql[tokens[tail_start].start : tokens[-1].end]
+        match = _LIMIT_RE.match(" ".join(tail.lower().split()))
+        if match is None:
+            return None
+        limit, offset, only_offset = match.groups()
+        offset = int(offset or only_offset or 0)
+        if limit and limit != "all":
+            shard_sql = f"{head} LIMIT {int(limit) + offset}"
+        else:
+            shard_sql = head
+    query = UnionQuery(
+        items=items, order_by=order_by, tail=tail, offset=offset, shard_sql=shard_sql
+    )
+    for order_tokens, _ in order_by:
+        if _union_order_position(query, order_tokens, names) is not None:
+            continue
+        refs = _column_refs(order_tokens)
+        if query.has_star and (
+            (len(refs) == 1 and refs[0][:2] == (0, len(order_tokens) - 1))
+            or (len(order_tokens) == 1 and order_tokens[0].kind == "number")
+        ):
+            # Columns of * are only known from the shards' results
+            continue
+        # Rows are sorted after merging, by columns the shards return
+        return None
+    return query
+
+
+def apply_union_order_and_limit(
+    query: UnionQuery, df: pd.DataFrame
+) -> Optional[pd.DataFrame]:
+    """
+    Apply a union query's ORDER BY and LIMIT/OFFSET to the shards' rows.
+
+    Args:
+        query: The parsed query
+        df: The concatenated results of `query.shard_sql`
+
+    Returns:
+        The sorted and limited rows, or None if an ORDER BY expression is not
+        a column of the result (e.g. of a table outside `t.*`)
+    """
+    order = []
+    for tokens, suffix in query.order_by:
+        position = _union_order_position(query, tokens, list(df.columns))
+        if position is None:
+            return None
+        order.append((position, suffix))
+    return _sort_and_limit(df, order, query.tail)
+
+
+def _union_order_position(
+    query: UnionQuery, tokens: List[Token], columns: List[str]
+) -> Optional[int]:
+    """Position of the result column an ORDER BY expression refers to."""
+    if len(tokens) == 1 and tokens[0].kind == "number":
+        position = int(tokens[0].text) - 1
+        return position if 0 <= position < len(columns) else None
+
+    expression = _normalized(tokens)
+    name = None
+    for position, (item_expression, alias) in enumerate(query.items):
+        if len(tokens) == 1 and alias and alias.lower() == _unquote(tokens[0]).lower():
+            name = alias
+        elif item_expression == expression:
+            name = alias
+        else:
+            continue
+        if not query.has_star:
+            # Items and result columns correspond one to one
+            return position
+        break
+    if name is None:
+        refs = _column_refs(tokens)
+        if len(refs) != 1 or refs[0][:2] != (0, len(tokens) - 1):
+            return None
+        name = refs[0][2]
+
+    if name in columns:
+        return columns.index(name)
+    # Unquoted names are case-insensitive
+    folded = [column.lower() for column in columns]
+    if folded.count(name.lower()) == 1:
+        return folded.index(name.lower())
+    return None
@@ -2,9 +2,6 @@ import base64
 import io
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib import rcParams
-import seaborn as sns
 from typing import Dict, Any, Optional, Union, List
 
 from app.logger import logger
@@ -33,6 +30,10 @@ def make_chart(
     Returns:
         A base64 encoded string of the chart image
     """
+    # Plotting libraries are imported on first use, they dominate import time
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     # Convert dict to DataFrame if necessary
     if not isinstance(data, pd.DataFrame):
         data = pd.DataFrame(data)
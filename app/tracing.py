@@ -0,0 +1,241 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+from app.config import PROJECT_ROOT, TracingSettings, config
+from app.tools.sql_parse import fingerprint_id
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+
+def sql_fingerprint(sql: str) -> str:
+    """Short, stable identifier of a SQL statement for span attributes.
+
+    Statements that differ only in literals share an identifier, so spans
+    can be grouped with the query statistics.
+    """
+    return fingerprint_id(sql)
+
+
+@dataclass
+class Span:
+    """A timed unit of work, nested under the span that was active when it started."""
+
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    start_ns: int = field(default_factory=time.time_ns)
+    end_ns: Optional[int] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    status: str = "ok"
+    error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        """Attach an attribute (tokens, rows, sql fingerprint, ...) to the span."""
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes: Any) -> None:
+        """Attach several attributes to the span."""
+        self.attributes.update(attributes)
+
+    @property
+    def duration_ms(self) -> float:
+        end_ns = self.end_ns or time.time_ns()
+        return (end_ns - self.start_ns) / 1e6
+
+    def to_dict(self) -> dict:
+        """Convert span to a flat dictionary"""
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class JsonLinesExporter:
+    """Append finished spans to a file, one JSON object per line."""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+class OTLPJsonExporter:
+    """Append finished spans in the OpenTelemetry OTLP/JSON encoding.
+
+    Each line is an `ExportTraceServiceRequest`, the same layout the
+    OpenTelemetry collector's file exporter uses, so the file can be replayed
+    into any OTLP-compatible backend.
+    """
+
+    def __init__(self, path: Union[str, Path], service_name: str = "miniAgents"):
+        self.path = Path(path)
+        self.service_name = service_name
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _any_value(value: Any) -> dict:
+        if isinstance(value, bool):
+            return {"boolValue": value}
+        if isinstance(value, int):
+            return {"intValue": str(value)}
+        if isinstance(value, float):
+            return {"doubleValue": value}
+        return {"stringValue": str(value)}
+
+    def _to_otlp(self, span: Span) -> dict:
+        otlp_span = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns or time.time_ns()),
+            "attributes": [
+                {"key": key, "value": self._any_value(value)}
+                for key, value in span.attributes.items()
+            ],
+            "status": (
+                {"code": 2, "message": span.error or ""}
+                if span.status == "error"
+                else {"code": 1}
+            ),
+        }
+        if span.parent_id:
+            otlp_span["parentSpanId"] = span.parent_id
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {
+                                "key": "service.name",
+                                "value": {"stringValue": self.service_name},
+                            }
+                        ]
+                    },
+                    "scopeSpans": [
+                        {"scope": {"name": "app.tracing"}, "spans": [otlp_span]}
+                    ],
+                }
+            ]
+        }
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(self._to_otlp(span), ensure_ascii=False)
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+class Tracer:
+    """Creates nested spans and hands finished ones to the exporters.
+
+    The active span is tracked in a context variable, so spans opened inside
+    `BaseAgent.run`, the LLM client or `DatabaseTool` are attached to whatever
+    agent (or sub-agent called by DecisionMaker) is currently running.
+    """
+
+    def __init__(self, settings: Optional[TracingSettings] = None):
+        self._settings = settings
+        self._exporters: Optional[List[Any]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def exporters(self) -> List[Any]:
+        """Exporters configured from `[tracing]`, created on first use."""
+        if self._exporters is None:
+            with self._lock:
+                if self._exporters is None:
+                    self._exporters = self._build_exporters(
+                        self._settings or config.tracing
+                    )
+        return self._exporters
+
+    @staticmethod
+    def _build_exporters(settings: TracingSettings) -> List[Any]:
+        if not settings.enabled:
+            return []
+        exporters: List[Any] = []
+        if settings.jsonl_path:
+            exporters.append(JsonLinesExporter(PROJECT_ROOT / settings.jsonl_path))
+        if settings.otlp_path:
+            exporters.append(
+                OTLPJsonExporter(
+                    PROJECT_ROOT / settings.otlp_path,
+                    service_name=settings.service_name,
+                )
+            )
+        return exporters
+
+    def add_exporter(self, exporter: Any) -> None:
+        """Register an additional exporter (any object with `export(span)`)."""
+        self.exporters.append(exporter)
+
+    @staticmethod
+    def current_span() -> Optional[Span]:
+        """Return the innermost active span, if any."""
+        return _current_span.get()
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        """Open a span as a child of the active span.
+
+        Args:
+            name: Stage name, e.g. "sql_agent.generate"
+            **attributes: Initial span attributes
+
+        Yields:
+            Span: The span, to attach further attributes while it is open
+        """
+        parent = _current_span.get()
+        span = Span(
+            name=name,
+            trace_id=parent.trace_id if parent else os.urandom(16).hex(),
+            span_id=os.urandom(8).hex(),
+            parent_id=parent.span_id if parent else None,
+            attributes=dict(attributes),
+        )
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            _current_span.reset(token)
+            for exporter in self.exporters:
+                try:
+                    exporter.export(span)
+                except Exception:
+                    # Tracing must never break the traced code path
+                    pass
+
+
+tracer = Tracer()
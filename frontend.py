@@ -12,6 +12,7 @@ import shutil
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.agents import SQLAgent, DbInfoAgent, SimpleChatter
+from app.config import config
 from app.prompts.db_info import DB_INFO
 
 
@@ -152,11 +153,15 @@ def login_page():
 def initialize_session_state():
     """初始化会话状态"""
     if "sql_agent" not in st.session_state:
-        st.session_state.sql_agent = SQLAgent(
-            table_schema=DB_INFO["TABLE_SCHEMA"],
-            db_info=DB_INFO["DB_INFO"],
-            helper_info=DB_INFO["HELPER_INFO"],
-        )
+        if config.schema_artifact.artifact_path:
+            # 表结构从 schema artifact 加载
+            st.session_state.sql_agent = SQLAgent(helper_info=DB_INFO["HELPER_INFO"])
+        else:
+            st.session_state.sql_agent = SQLAgent(
+                table_schema=DB_INFO["TABLE_SCHEMA"],
+                db_info=DB_INFO["DB_INFO"],
+                helper_info=DB_INFO["HELPER_INFO"],
+            )
 
     if "db_info_agent" not in st.session_state:
         st.session_state.db_info_agent = DbInfoAgent()
@@ -193,6 +198,11 @@ def display_agent_state():
     with st.expander(f"当前Agent状态: {agent_type}", expanded=False):
         # st.json(current_agent.memory.to_dict_list())
         st.code(current_agent.memory.curr_sql(), language="sql")
+        if current_agent.memory.df_estimated:
+            if current_agent.memory.refining:
+                watch_refinement()
+            else:
+                st.warning("精确查询失败，以下为抽样估算结果")
         st.dataframe(current_agent.memory.curr_df())
 
         df = current_agent.memory.curr_df().copy()
@@ -220,6 +230,15 @@ def display_agent_state():
                 st.bar_chart(df, x=x_col_name, y=selected_y_columns)
 
 
+@st.fragment(run_every=2)
+def watch_refinement():
+    """估算结果被精确结果替换后刷新页面"""
+    memory = st.session_state.current_agent.memory
+    if not memory.df_estimated or not memory.refining:
+        st.rerun()
+    st.info("以下为抽样估算结果，精确结果正在后台计算，完成后将自动替换")
+
+
 def get_agent_type():
     """获取当前Agent的类型"""
     current_agent = st.session_state.current_agent
@@ -0,0 +1,179 @@
+import argparse
+import os
+import sys
+from typing import List, Optional
+
+from .schema_generator import SAMPLE_STRATEGIES, SchemaGenerator
+
+# File suffixes of database files that can be given instead of a URL
+_FILE_DIALECTS = {
+    ".db": "sqlite",
+    ".sqlite": "sqlite",
+    ".sqlite3": "sqlite",
+    ".duckdb": "duckdb",
+}
+
+
+def normalize_db_url(db_url: str) -> str:
+    """
+    Turn what users pass into an SQLAlchemy URL.
+
+    Accepts SQLAlchemy URLs, `postgres://` URLs (as used by Heroku, Supabase
+    and libpq) and paths of SQLite or DuckDB database files.
+    """
+    if db_url.startswith("postgres://"):
+        return "postgresql://" + db_url[len("postgres://") :]
+    if "://" not in db_url:
+        dialect = _FILE_DIALECTS.get(os.path.splitext(db_url)[1].lower())
+        if dialect is None:
+            raise ValueError(
+                f"Cannot tell the database of '{db_url}', pass an SQLAlchemy URL"
+            )
+        return f"{dialect}:///{os.path.abspath(db_url)}"
+    return db_url
+
+
+def _split_names(values: Optional[List[str]]) -> Optional[List[str]]:
+    """Table names from repeated and comma-separated arguments."""
+    if not values:
+        return None
+    names = [name.strip() for value in values for name in value.split(",")]
+    return [name for name in names if name]
+
+
+def print_profile(generator: SchemaGenerator) -> None:
+    """Print the catalog time and the sampling time and rows read per table."""
+    phases = generator.phases
+    line = f"Catalog: {phases.get('catalog_ms', 0):.0f} ms"
+    if "pg_stats_ms" in phases:
+        line += f", pg_stats: {phases['pg_stats_ms']:.0f} ms"
+    print(line)
+
+    width = max([len(t) for t in generator.timings] + [5])
+    print(f"{'table':<{width}}  {'status':<8}{'sample ms':>10}{'rows':>10}")
+    total_rows = 0
+    for table_name in generator.usable_tables:
+        timing = generator.timings.get(table_name)
+        if timing is None:
+            continue
+        rows = timing["rows"]
+        total_rows += rows or 0
+        print(
+            f"{table_name:<{width}}  {timing['status']:<8}"
+            f"{timing['sample_ms']:>10.1f}{'-' if rows is None else rows:>10}"
+        )
+    print(
+        f"Total: {phases.get('total_ms', 0) / 1000:.2f} s, "
+        f"{len(generator.timings)} tables, {total_rows} rows read"
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m schema_generator",
+        description="Describe the tables of a database for SQL generation",
+    )
+    parser.add_argument(
+        "db_url", help="SQLAlchemy URL, postgres:// URL or SQLite/DuckDB file"
+    )
+    parser.add_argument(
+        "-o", "--output", help="Output path (default: schema.txt/.json/.msgpack)"
+    )
+    parser.add_argument(
+        "--format",
+        choices=("text", "json", "msgpack"),
+        default="text",
+        help="text schema, or the structured artifact as JSON or MessagePack",
+    )
+    parser.add_argument("--artifact", help="Also write the JSON/.msgpack artifact")
+    parser.add_argument("--schema", help="Only this database schema")
+    parser.add_argument(
+        "--include", action="append", help="Only these tables (schema.table, ...)"
+    )
+    parser.add_argument(
+        "--ignore", action="append", help="Skip these tables (schema.table, ...)"
+    )
+    parser.add_argument(
+        "--strategy",
+        choices=SAMPLE_STRATEGIES,
+        default="auto",
+        help="How example values are found (default: tablesample on "
+        "PostgreSQL, limit elsewhere)",
+    )
+    parser.add_argument(
+        "--sample-rows", type=int, default=3, help="Examples per column"
+    )
+    parser.add_argument(
+        "--scan-rows", type=int, default=1000, help="Rows read per table for examples"
+    )
+    parser.add_argument(
+        "--sample-percent", type=float, default=1.0, help="Pages TABLESAMPLE reads"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=4, help="Tables sampled concurrently"
+    )
+    parser.add_argument(
+        "--table-timeout", type=float, help="Seconds before omitting a table's examples"
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only regenerate tables that changed since the last run",
+    )
+    parser.add_argument(
+        "--track-data-changes",
+        action="store_true",
+        help="With --incremental, also regenerate tables with modified rows",
+    )
+    parser.add_argument("--progress", action="store_true", help="Print progress")
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print catalog time, and sampling time and rows read per table",
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        db_url = normalize_db_url(args.db_url)
+    except ValueError as e:
+        parser.error(str(e))
+    generator = SchemaGenerator(
+        db_url=db_url,
+        schema=args.schema,
+        ignore_tables=_split_names(args.ignore),
+        include_tables=_split_names(args.include),
+        sample_rows=args.sample_rows,
+        sample_strategy=args.strategy,
+        sample_scan_rows=args.scan_rows,
+        sample_percent=args.sample_percent,
+        workers=args.workers,
+        table_timeout=args.table_timeout,
+        progress=args.progress,
+        incremental=args.incremental,
+        track_data_changes=args.track_data_changes,
+    )
+    print(
+        f"{generator.engine.dialect.name} database {generator.db_name}: "
+        f"{len(generator.usable_tables)} tables, "
+        f"sampling with {generator.sample_strategy}"
+    )
+
+    output = args.output or f"schema.{'txt' if args.format == 'text' else args.format}"
+    if args.format == "text":
+        generator.save_schema(output, artifact_path=args.artifact)
+    else:
+        if args.format == "msgpack" and not output.endswith(".msgpack"):
+            output += ".msgpack"
+        cache_path = f"{output}.cache.json" if args.incremental else None
+        generator.generate_schema(cache_path)
+        generator.save_artifact(output)
+        if args.artifact:
+            generator.save_artifact(args.artifact)
+
+    if args.profile:
+        print_profile(generator)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+from typing import Any, Dict, List, Optional
+
+# Planner statistics of all columns of the given schemas. Rows of a table's own
+# statistics come before the inheritance tree's (partitioned tables only have
+# the latter). reltuples is -1 (or 0 before PostgreSQL 14) if never analyzed.
+PG_STATS_SQL = """
+SELECT s.schemaname, s.tablename, s.attname, s.null_frac, s.n_distinct,
+       s.most_common_vals::text,
+       s.histogram_bounds::text, c.reltuples
+FROM pg_stats s
+JOIN pg_namespace n ON n.nspname = s.schemaname
+JOIN pg_class c ON c.relnamespace = n.oid AND c.relname = s.tablename
+WHERE s.schemaname IN :schemas
+ORDER BY s.schemaname, s.tablename, s.inherited
+"""
+
+
+def parse_pg_array(literal: Optional[str]) -> List[Optional[str]]:
+    """
+    Split the text form of a one-dimensional PostgreSQL array.
+
+    `anyarray` columns such as `pg_stats.most_common_vals` can only be read as
+    text, e.g. `{1,"a b","say \\"hi\\"",NULL}`. Elements are returned as
+    strings, NULL as None.
+    """
+    if not literal or not literal.startswith("{") or not literal.endswith("}"):
+        return []
+    values: List[Optional[str]] = []
+    body = literal[1:-1]
+    i = 0
+    while i < len(body):
+        if body[i] == '"':
+            # Quoted element, with backslash escapes
+            i += 1
+            chars = []
+            while i < len(body) and body[i] != '"':
+                if body[i] == "\\" and i + 1 < len(body):
+                    i += 1
+                chars.append(body[i])
+                i += 1
+            values.append("".join(chars))
+            i += 2  # closing quote and comma
+        else:
+            end = body.find(",", i)
+            if end == -1:
+                end = len(body)
+            element = body[i:end].strip()
+            values.append(None if element == "NULL" else element)
+            i = end + 1
+    return values
+
+
+def column_profile(
+    null_frac: Optional[float],
+    n_distinct: Optional[float],
+    most_common_vals: Optional[str],
+    histogram_bounds: Optional[str],
+    reltuples: Optional[float],
+    max_samples: int = 3,
+) -> Dict[str, Any]:
+    """
+    A column's profile from its `pg_stats` row.
+
+    Args:
+        null_frac, n_distinct, most_common_vals, histogram_bounds: The
+            column's `pg_stats` values, arrays in their text form
+        reltuples: Estimated rows of the table
+        max_samples: Number of example values
+
+    Returns:
+        Dict with null_frac, n_distinct (estimated number of distinct values,
+        None if unknown), min and max (the histogram's bounds, None without
+        one) and examples (the most common values first, then values spread
+        over the histogram)
+    """
+    if n_distinct is not None and n_distinct < 0:
+        # Negative values are a fraction of the rows, for columns whose
+        # cardinality grows with the table
+        n_distinct = -n_distinct * reltuples if reltuples and reltuples > 0 else None
+    common = [v for v in parse_pg_array(most_common_vals) if v is not None]
+    bounds = [v for v in parse_pg_array(histogram_bounds) if v is not None]
+
+    examples = list(dict.fromkeys(common))[:max_samples]
+    missing = max_samples - len(examples)
+    if missing > 0 and bounds:
+        step = max(len(bounds) // missing, 1)
+        for value in bounds[::step]:
+            if value not in examples:
+                examples.append(value)
+            if len(examples) == max_samples:
+                break
+
+    return {
+        "null_frac": null_frac,
+        "n_distinct": None if n_distinct is None else int(round(n_distinct)),
+        "min": bounds[0] if bounds else None,
+        "max": bounds[-1] if bounds else None,
+        "examples": examples,
+    }
@@ -0,0 +1,102 @@
+import json
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional, only needed for .msgpack artifacts
+    msgpack = None
+
+ARTIFACT_VERSION = 1
+
+
+def build_artifact(
+    db_name: str, dialect: str, table_info: Dict[str, Dict[str, Any]]
+) -> Dict[str, Any]:
+    """
+    The structured schema artifact of reflected and sampled tables.
+
+    Args:
+        db_name: Database name
+        dialect: SQLAlchemy dialect name
+        table_info: `SchemaGenerator.table_info` after `generate_schema`
+
+    Returns:
+        Dict with version, db_name, dialect, generated_at and tables, a list
+        of dicts with name, comment, columns (name, type, nullable, comment,
+        primary_key, examples and, if profiled, profile), primary_key and
+        foreign_keys (columns, referred_table, referred_columns)
+    """
+    tables = []
+    for table_name, info in table_info.items():
+        schema = table_name.split(".", 1)[0] if "." in table_name else None
+        pk_columns = info["pk_columns"]
+        examples = info.get("examples", {})
+        profiles = info.get("profiles", {})
+        columns = []
+        for column in info["columns"]:
+            entry = {
+                "name": column["name"],
+                "type": str(column["type"]).upper(),
+                "nullable": column.get("nullable", True),
+                "comment": column.get("comment") or None,
+                "primary_key": column["name"] in pk_columns,
+                "examples": examples.get(column["name"], []),
+            }
+            if column["name"] in profiles:
+                entry["profile"] = profiles[column["name"]]
+            columns.append(entry)
+
+        foreign_keys = []
+        for fk in info["foreign_keys"]:
+            referred_schema = fk.get("referred_schema") or schema
+            referred = fk["referred_table"]
+            foreign_keys.append(
+                {
+                    "columns": list(fk["columns"]),
+                    "referred_table": (
+                        f"{referred_schema}.{referred}" if referred_schema else referred
+                    ),
+                    "referred_columns": list(fk["referred_columns"]),
+                }
+            )
+
+        tables.append(
+            {
+                "name": table_name,
+                "comment": info["comment"] or None,
+                "columns": columns,
+                "primary_key": [c["name"] for c in columns if c["primary_key"]],
+                "foreign_keys": foreign_keys,
+            }
+        )
+
+    return {
+        "version": ARTIFACT_VERSION,
+        "db_name": db_name,
+        "dialect": dialect,
+        "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "tables": tables,
+    }
+
+
+def write_artifact(artifact: Dict[str, Any], path: str) -> None:
+    """
+    Write an artifact atomically, as MessagePack if `path` ends with
+    `.msgpack` (requires the msgpack package), as JSON otherwise.
+    """
+    use_msgpack = path.endswith(".msgpack")
+    if use_msgpack and msgpack is None:
+        raise ImportError("Writing .msgpack artifacts requires the msgpack package")
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    if use_msgpack:
+        with open(tmp_path, "wb") as f:
+            f.write(msgpack.packb(artifact, default=str))
+    else:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(artifact, f, ensure_ascii=False, default=str)
+    os.replace(tmp_path, path)
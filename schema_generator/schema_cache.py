@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+from typing import Any, Dict, Optional
+
+CACHE_VERSION = 1
+
+# One fingerprint per table from the catalog alone: column definitions and
+# comments, the table comment, primary/foreign keys and the change counters
+CATALOG_FINGERPRINTS_SQL = """
+SELECT n.nspname, c.relname,
+       md5(
+           coalesce(obj_description(c.oid, 'pg_class'), '') || '|' ||
+           coalesce((
+               SELECT string_agg(
+                   a.attname || ' ' || format_type(a.atttypid, a.atttypmod)
+                   || ' ' || a.attnotnull::text || ' '
+                   || coalesce(col_description(c.oid, a.attnum), ''),
+                   ',' ORDER BY a.attnum)
+               FROM pg_attribute a
+               WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+           ), '') || '|' ||
+           coalesce((
+               SELECT string_agg(pg_get_constraintdef(o.oid), ',' ORDER BY o.conname)
+               FROM pg_constraint o
+               WHERE o.conrelid = c.oid AND o.contype IN ('p', 'f')
+           ), '')
+       ),
+       coalesce(s.n_tup_ins + s.n_tup_upd + s.n_tup_del, 0)
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+WHERE c.relkind IN ('r', 'p', 'v', 'm', 'f')
+  AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+"""
+
+
+def serializable_info(info: Dict[str, Any]) -> Dict[str, Any]:
+    """Reflected table info with JSON types (SQLAlchemy types as strings)."""
+    return {
+        "comment": info["comment"],
+        "columns": [
+            {
+                "name": column["name"],
+                "type": str(column["type"]),
+                "nullable": column.get("nullable", True),
+                "default": (
+                    None if column.get("default") is None else str(column["default"])
+                ),
+                "comment": column.get("comment"),
+            }
+            for column in info["columns"]
+        ],
+        "pk_columns": sorted(info["pk_columns"]),
+        "foreign_keys": info["foreign_keys"],
+        "profiles": info.get("profiles", {}),
+        "examples": info.get("examples", {}),
+    }
+
+
+def info_fingerprint(info: Dict[str, Any]) -> str:
+    """Fingerprint of a table's reflected definition."""
+    definition = serializable_info(info)
+    # Statistics and examples are not part of the definition
+    definition.pop("profiles")
+    definition.pop("examples")
+    data = json.dumps(definition, sort_keys=True, default=str)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+class SchemaCache:
+    """Persistent cache of formatted table descriptions, keyed by fingerprint.
+
+    The cache is a JSON file, usually next to the schema output. Entries are
+    only valid for the generator settings they were produced with, so changing
+    e.g. the sample strategy starts over with an empty cache.
+    """
+
+    def __init__(self, path: str, settings: Dict[str, Any]):
+        self.path = path
+        self.settings = settings
+        self.tables: Dict[str, Dict[str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.load()
+
+    def load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable schema cache {self.path}: {e}")
+            return
+        if (
+            data.get("version") == CACHE_VERSION
+            and data.get("settings") == self.settings
+        ):
+            self.tables = data.get("tables", {})
+
+    def get(self, table_name: str, fingerprint: Optional[str]) -> Optional[Dict]:
+        """The cached entry of a table, if its fingerprint is unchanged."""
+        entry = self.tables.get(table_name)
+        if fingerprint is not None and entry and entry["fingerprint"] == fingerprint:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def put(
+        self,
+        table_name: str,
+        fingerprint: str,
+        fragment: str,
+        info: Dict[str, Any],
+    ) -> None:
+        self.tables[table_name] = {
+            "fingerprint": fingerprint,
+            "fragment": fragment,
+            "info": serializable_info(info),
+        }
+
+    def save(self, keep: Optional[list] = None) -> None:
+        """
+        Write the cache atomically.
+
+        Args:
+            keep: Table names to keep (drops entries of removed tables)
+        """
+        if keep is not None:
+            self.tables = {t: e for t, e in self.tables.items() if t in set(keep)}
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "version": CACHE_VERSION,
+                    "settings": self.settings,
+                    "tables": self.tables,
+                },
+                f,
+                ensure_ascii=False,
+                default=str,
+            )
+        os.replace(tmp_path, self.path)
@@ -1,6 +1,35 @@
+import functools
 import json
-from typing import List, Dict, Optional, Any
-from sqlalchemy import create_engine, inspect, select, MetaData, Table
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import List, Dict, Iterable, Iterator, Optional, Any, Tuple
+from sqlalchemy import (
+    create_engine,
+    text,
+    func,
+    inspect,
+    select,
+    bindparam,
+    Boolean,
+    MetaData,
+    Table,
+    sql,
+    tablesample,
+)
+
+from .pg_stats import PG_STATS_SQL, column_profile
+from .schema_artifact import build_artifact, write_artifact
+from .schema_cache import (
+    CATALOG_FINGERPRINTS_SQL,
+    SchemaCache,
+    info_fingerprint,
+    serializable_info,
+)
+
+SAMPLE_STRATEGIES = ("auto", "pg_stats", "tablesample", "limit", "distinct", "none")
 
 
 class SchemaGenerator:
@@ -11,6 +40,14 @@ class SchemaGenerator:
         ignore_tables: Optional[List[str]] = None,
         include_tables: Optional[List[str]] = None,
         sample_rows: int = 3,
+        sample_strategy: str = "auto",
+        sample_scan_rows: int = 1000,
+        sample_percent: float = 1.0,
+        workers: int = 4,
+        table_timeout: Optional[float] = None,
+        progress: bool = False,
+        incremental: bool = False,
+        track_data_changes: bool = False,
     ):
         """
         Initialize the schema generator.
@@ -21,15 +58,61 @@ class SchemaGenerator:
             ignore_tables: List of tables to ignore
             include_tables: List of tables to include (if specified, ignore_tables is ignored)
             sample_rows: Number of sample values to extract for each column
+            sample_strategy: How example values are sampled, with one query
+                per table: "tablesample" scans a TABLESAMPLE SYSTEM subset,
+                "limit" the first `sample_scan_rows` rows, "distinct" runs a
+                DISTINCT query per column (exhaustive but slow on big
+                tables), "none" skips examples; "auto" uses "tablesample" on
+                PostgreSQL and "limit" elsewhere. "pg_stats" (PostgreSQL
+                only) scans no table data: examples, number of distinct
+                values, NULL fraction and value range come from the planner
+                statistics, tables never analyzed are sampled with
+                "tablesample"
+            sample_scan_rows: Rows scanned per table for examples
+            sample_percent: Percentage of pages TABLESAMPLE reads
+            workers: Tables sampled concurrently; the engine's connection pool
+                is sized to match
+            table_timeout: Seconds after which a table is described without
+                examples (None waits indefinitely)
+            progress: Print progress and timing per table
+            incremental: Let `save_schema` reuse the descriptions of unchanged
+                tables from a cache file next to the output
+            track_data_changes: Also treat tables with inserted, updated or
+                deleted rows as changed, so their examples are refreshed
+                (PostgreSQL only, from `pg_stat_user_tables`)
         """
-        self.engine = create_engine(db_url)
+        if sample_strategy not in SAMPLE_STRATEGIES:
+            raise ValueError(f"Unknown sample strategy: {sample_strategy}")
+        self.engine = self._create_engine(db_url, workers)
         self.schema = schema
         self.ignore_tables = ignore_tables or []
         self.include_tables = include_tables
         self.sample_rows = sample_rows
+        is_postgres = self.engine.dialect.name == "postgresql"
+        if sample_strategy == "auto":
+            sample_strategy = "tablesample" if is_postgres else "limit"
+        elif sample_strategy == "pg_stats" and not is_postgres:
+            print("pg_stats profiles need PostgreSQL, sampling with LIMIT instead")
+            sample_strategy = "limit"
+        self.sample_strategy = sample_strategy
+        self.sample_scan_rows = sample_scan_rows
+        self.sample_percent = sample_percent
+        self.workers = max(1, workers)
+        self.table_timeout = table_timeout
+        self.progress = progress
+        self.incremental = incremental
+        self.track_data_changes = track_data_changes
+        # Sampling time, status and rows read per table of the last run
+        self.timings: Dict[str, Dict[str, Any]] = {}
+        # Rows the sample queries of a table returned
+        self.rows_read: Dict[str, int] = {}
+        # Duration of the catalog phases of the last run (ms)
+        self.phases: Dict[str, float] = {}
         self.inspector = inspect(self.engine)
         self.metadata = MetaData()
         self.table_schemas = {}
+        # Reflected comments, columns and keys per table, see _reflect_tables
+        self.table_info: Dict[str, Dict[str, Any]] = {}
 
         # Get database name from the URL
         self.db_name = db_url.split("/")[-1].split("?")[0]
@@ -39,6 +122,15 @@ class SchemaGenerator:
         # Get usable tables
         self.usable_tables = self._get_usable_tables()
 
+    @staticmethod
+    def _create_engine(db_url: str, workers: int):
+        """Create the engine with a connection per worker."""
+        try:
+            return create_engine(db_url, pool_size=max(5, workers), max_overflow=5)
+        except TypeError:
+            # Pools such as SQLite's in-memory StaticPool take no size
+            return create_engine(db_url)
+
     def _get_usable_tables(self) -> List[str]:
         """Get list of tables to process based on include/ignore configuration."""
         # Get all schemas if no specific schema is provided
@@ -88,92 +180,689 @@ class SchemaGenerator:
             print(f"Error getting samples for {table_name}.{column_name}: {e}")
             return []
 
-    def generate_schema(self) -> str:
-        """Generate the schema description."""
-        output = []
-        output.append(f"[DB_ID] {self.db_name}")
-        output.append("[Schema]")
+    def get_table_samples(
+        self, table_name: str, columns: List[Dict[str, Any]], max_samples: int = 3
+    ) -> Dict[str, List[Any]]:
+        """
+        Get sample values for all columns of a table with a single query.
 
-        for table_name in self.usable_tables:
-            # Handle schema.table_name format
-            if "." in table_name:
-                schema, table = table_name.split(".")
-            else:
-                schema = self.schema
-                table = table_name
+        Rows of a small subset of the table (see `sample_strategy`) are
+        fetched in one pass and the first distinct non-null values of every
+        column are kept. The table is not reflected again.
 
-            # Get table comment if available
-            try:
-                table_comment = self.inspector.get_table_comment(table, schema)["text"]
-                if table_comment:
-                    output.append(f"# Table: {table_name}, {table_comment}")
-                else:
-                    output.append(f"# Table: {table_name}")
-            except:
-                output.append(f"# Table: {table_name}")
+        Args:
+            table_name: Table name, optionally schema qualified
+            columns: Reflected columns (dicts with name and type) to sample
+            max_samples: Values per column
+
+        Returns:
+            Dict of column name to its sample values
+        """
+        if self.sample_strategy == "none" or not columns:
+            return {}
+        schema, name = self._split_table_name(table_name)
+        # Typed columns, so values are converted like those of a reflected table
+        table_obj = sql.table(
+            name, *[sql.column(c["name"], c["type"]) for c in columns], schema=schema
+        )
+        column_names = [c["name"] for c in columns]
+
+        if self.sample_strategy == "distinct":
+            samples = {}
+            self.rows_read[table_name] = 0
+            with self.engine.connect() as connection:
+                for column_name in column_names:
+                    query = select(table_obj.c[column_name]).distinct()
+                    try:
+                        rows = connection.execute(query.limit(max_samples)).fetchall()
+                        self.rows_read[table_name] += len(rows)
+                        samples[column_name] = [
+                            row[0] for row in rows if row[0] is not None
+                        ]
+                    except Exception as e:
+                        print(
+                            f"Error getting samples for {table_name}.{column_name}: {e}"
+                        )
+                        connection.rollback()
+            return samples
+
+        try:
+            with self.engine.connect() as connection:
+                rows = []
+                read = 0
+                # Tables without statistics are sampled like with "tablesample"
+                if self.sample_strategy in ("tablesample", "pg_stats"):
+                    sampled = tablesample(table_obj, func.system(self.sample_percent))
+                    query = select(*sampled.c).limit(self.sample_scan_rows)
+                    try:
+                        rows = connection.execute(query).fetchall()
+                        read += len(rows)
+                    except Exception as e:
+                        print(f"TABLESAMPLE failed for {table_name}, using LIMIT: {e}")
+                        connection.rollback()
+                if len(rows) < max_samples:
+                    # Small tables may yield no pages, read the first rows instead
+                    query = select(*table_obj.c).limit(self.sample_scan_rows)
+                    rows = connection.execute(query).fetchall()
+                    read += len(rows)
+        except Exception as e:
+            print(f"Error getting samples for {table_name}: {e}")
+            return {}
+        self.rows_read[table_name] = read
+
+        samples = {}
+        for i, column_name in enumerate(column_names):
+            values, seen = [], set()
+            for row in rows:
+                value = row[i]
+                if value is None:
+                    continue
+                key = value
+                try:
+                    hash(key)
+                except TypeError:
+                    # Unhashable values such as JSON documents
+                    key = repr(value)
+                if key in seen:
+                    continue
+                seen.add(key)
+                values.append(value)
+                if len(values) == max_samples:
+                    break
+            samples[column_name] = values
+        return samples
+
+    def _reflect_tables(
+        self, tables: Optional[List[str]] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Read comments, columns, primary and foreign keys of all usable tables.
 
-            self.table_schemas[table_name] = []
+        Tables are reflected per schema with the inspector's bulk `get_multi_*`
+        methods, which dialects such as PostgreSQL answer with a handful of
+        catalog queries for all tables at once. Dialects or SQLAlchemy versions
+        without bulk reflection fall back to one set of calls per table.
 
-            output.append("[")
+        Args:
+            tables: Tables to reflect (defaults to `usable_tables`)
 
-            # Get primary key columns for the table
-            pk_columns = set()
+        Returns:
+            Dict of table name to a dict with comment, columns, pk_columns and
+            foreign_keys, in the order of `usable_tables`
+        """
+        tables = self.usable_tables if tables is None else tables
+        by_schema: Dict[Optional[str], List[str]] = {}
+        for table_name in tables:
+            schema, table = self._split_table_name(table_name)
+            by_schema.setdefault(schema, []).append(table)
+
+        reflected = {}
+        for schema, names in by_schema.items():
             try:
-                pk_info = self.inspector.get_pk_constraint(table, schema)
-                pk_columns = set(pk_info.get("constrained_columns", []))
-            except:
-                pass
-
-            # Process each column
-            columns = self.inspector.get_columns(table, schema=schema)
-            column_lines = []
-
-            for column in columns:
-                column_name = column["name"]
-                column_type = f"{column['type']}".upper()
-
-                # Get column description/comment if available
-                column_comment = column.get("comment", "")
-                if not column_comment:
-                    if column_name in pk_columns:
-                        column_comment = f"the primary key of {table_name}"
-                    else:
-                        column_comment = f"the {column_name} of {table_name}"
-
-                # Get sample values
-                examples = self.get_column_samples(
-                    table_name, column_name, self.sample_rows
+                reflected.update(self._reflect_schema_bulk(schema, names))
+            except (AttributeError, NotImplementedError) as e:
+                print(f"Bulk reflection unavailable for schema {schema}: {e}")
+                for table in names:
+                    reflected.update(self._reflect_table(schema, table))
+        return {t: reflected[t] for t in tables if t in reflected}
+
+    def _split_table_name(self, table_name: str):
+        """Split a schema.table_name name into schema and table."""
+        if "." in table_name:
+            schema, table = table_name.split(".", 1)
+            return schema, table
+        return self.schema, table_name
+
+    @staticmethod
+    def _table_info(
+        comment: Optional[str],
+        columns: List[Dict[str, Any]],
+        pk: Optional[Dict[str, Any]],
+        foreign_keys: List[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        return {
+            "comment": comment,
+            "columns": columns,
+            "pk_columns": set((pk or {}).get("constrained_columns") or []),
+            "foreign_keys": [
+                {
+                    "columns": fk["constrained_columns"],
+                    "referred_schema": fk.get("referred_schema"),
+                    "referred_table": fk["referred_table"],
+                    "referred_columns": fk["referred_columns"],
+                }
+                for fk in foreign_keys
+            ],
+        }
+
+    def _reflect_schema_bulk(
+        self, schema: Optional[str], tables: List[str]
+    ) -> Dict[str, Dict[str, Any]]:
+        """Reflect the given tables of one schema with bulk inspector calls."""
+        kw = {"schema": schema, "filter_names": tables}
+        columns = self.inspector.get_multi_columns(**kw)
+        pks = self.inspector.get_multi_pk_constraint(**kw)
+        fks = self.inspector.get_multi_foreign_keys(**kw)
+        try:
+            comments = self.inspector.get_multi_table_comment(**kw)
+        except NotImplementedError:
+            # e.g. SQLite has no table comments
+            comments = {}
+
+        reflected = {}
+        for table in tables:
+            key = (schema, table)
+            if key not in columns:
+                continue
+            table_name = f"{schema}.{table}" if schema else table
+            reflected[table_name] = self._table_info(
+                (comments.get(key) or {}).get("text"),
+                columns[key],
+                pks.get(key),
+                fks.get(key, []),
+            )
+        return reflected
+
+    def _reflect_table(
+        self, schema: Optional[str], table: str
+    ) -> Dict[str, Dict[str, Any]]:
+        """Reflect a single table with per-table inspector calls."""
+        table_name = f"{schema}.{table}" if schema else table
+        try:
+            comment = self.inspector.get_table_comment(table, schema)["text"]
+        except:
+            comment = None
+        try:
+            pk = self.inspector.get_pk_constraint(table, schema)
+        except:
+            pk = None
+        try:
+            foreign_keys = self.inspector.get_foreign_keys(table, schema)
+        except:
+            foreign_keys = []
+        columns = self.inspector.get_columns(table, schema=schema)
+        return {table_name: self._table_info(comment, columns, pk, foreign_keys)}
+
+    def _cache_settings(self) -> Dict[str, Any]:
+        """Settings the cached table descriptions depend on."""
+        return {
+            "sample_rows": self.sample_rows,
+            "sample_strategy": self.sample_strategy,
+            "sample_scan_rows": self.sample_scan_rows,
+            "sample_percent": self.sample_percent,
+            "track_data_changes": self.track_data_changes,
+            "dialect": self.engine.dialect.name,
+        }
+
+    def _catalog_fingerprints(self) -> Dict[str, str]:
+        """
+        Fingerprints of all tables from a single catalog query.
+
+        Only PostgreSQL is supported; other dialects return an empty dict and
+        tables are fingerprinted from their reflected definition instead.
+        """
+        if self.engine.dialect.name != "postgresql":
+            return {}
+        try:
+            with self.engine.connect() as connection:
+                rows = connection.execute(text(CATALOG_FINGERPRINTS_SQL)).fetchall()
+        except Exception as e:
+            print(f"Error reading catalog fingerprints: {e}")
+            return {}
+        fingerprints = {}
+        for schema, table, fingerprint, changes in rows:
+            if self.track_data_changes:
+                fingerprint = f"{fingerprint}:{changes}"
+            fingerprints[f"{schema}.{table}"] = fingerprint
+        return fingerprints
+
+    def _read_pg_stats(self, tables: List[str]) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """
+        Profile the columns of tables from `pg_stats`, without scanning them.
+
+        Returns:
+            Dict of table name to a dict of column name to its profile (see
+            `column_profile`); tables that were never analyzed are missing
+        """
+        wanted = set(tables)
+        schemas = sorted({self._split_table_name(t)[0] for t in tables})
+        if not schemas:
+            return {}
+        query = text(PG_STATS_SQL).bindparams(bindparam("schemas", expanding=True))
+        try:
+            with self.engine.connect() as connection:
+                rows = connection.execute(query, {"schemas": schemas}).fetchall()
+        except Exception as e:
+            print(f"Error reading pg_stats, sampling all tables: {e}")
+            return {}
+
+        profiles: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for (
+            schema,
+            table,
+            column,
+            null_frac,
+            n_distinct,
+            mcv,
+            bounds,
+            reltuples,
+        ) in rows:
+            table_name = f"{schema}.{table}"
+            if table_name not in wanted:
+                continue
+            columns = profiles.setdefault(table_name, {})
+            # Rows are ordered so the table's own statistics come first
+            if column not in columns:
+                columns[column] = column_profile(
+                    null_frac, n_distinct, mcv, bounds, reltuples, self.sample_rows
                 )
+        return profiles
+
+    def _sample_table(
+        self, table_name: str, info: Dict[str, Any], started: Dict[str, float]
+    ) -> Dict[str, List[Any]]:
+        started[table_name] = time.perf_counter()
+        if info.get("profiles"):
+            samples = {}
+            for column in info["columns"]:
+                profile = info["profiles"].get(column["name"])
+                if not profile:
+                    continue
+                examples = profile["examples"]
+                if isinstance(column["type"], Boolean):
+                    examples = [value == "t" for value in examples]
+                samples[column["name"]] = examples
+            return samples
+        return self.get_table_samples(table_name, info["columns"], self.sample_rows)
+
+    def _wait_for_samples(
+        self, table_name: str, future: Future, started: Dict[str, float]
+    ) -> Dict[str, List[Any]]:
+        """The samples of a table, waiting at most `table_timeout` once started."""
+        while True:
+            start = started.get(table_name)
+            if self.table_timeout is None:
+                return future.result()
+            if start is None:
+                # Still queued behind other tables
+                timeout = 0.5
+            else:
+                timeout = max(start + self.table_timeout - time.perf_counter(), 0)
+            try:
+                return future.result(timeout=timeout)
+            except FutureTimeoutError:
+                if start is not None:
+                    raise
+
+    def _format_table(
+        self, table_name: str, info: Dict[str, Any], samples: Dict[str, List[Any]]
+    ) -> List[str]:
+        """Format the description of one table."""
+        output = []
+        # Get table comment if available
+        if info["comment"]:
+            output.append(f"# Table: {table_name}, {info['comment']}")
+        else:
+            output.append(f"# Table: {table_name}")
+
+        self.table_schemas[table_name] = []
+
+        output.append("[")
+
+        pk_columns = info["pk_columns"]
 
-                # Format the column line
-                column_line = f"({column_name}: {column_type}, {column_comment}"
+        # Process each column
+        column_lines = []
 
+        for column in info["columns"]:
+            column_name = column["name"]
+            column_type = f"{column['type']}".upper()
+
+            # Get column description/comment if available
+            column_comment = column.get("comment", "")
+            if not column_comment:
                 if column_name in pk_columns:
-                    column_line += ", Primary Key"
+                    column_comment = f"the primary key of {table_name}"
+                else:
+                    column_comment = f"the {column_name} of {table_name}"
+
+            examples = samples.get(column_name, [])
+
+            # Format the column line
+            column_line = f"({column_name}: {column_type}, {column_comment}"
+
+            if column_name in pk_columns:
+                column_line += ", Primary Key"
+
+            if examples:
+                # Format examples appropriately
+                example_str = ", ".join([str(ex) for ex in examples])
+                column_line += f", Examples: [{example_str}]"
 
-                if examples:
-                    # Format examples appropriately
-                    example_str = ", ".join([str(ex) for ex in examples])
-                    column_line += f", Examples: [{example_str}]"
+            profile = info.get("profiles", {}).get(column_name)
+            if profile:
+                if profile["n_distinct"] is not None:
+                    column_line += f", Distinct: ~{profile['n_distinct']}"
+                if profile["null_frac"]:
+                    column_line += f", Nulls: {profile['null_frac']:.1%}"
+                if profile["min"] is not None:
+                    column_line += f", Range: [{profile['min']}, {profile['max']}]"
+
+            column_line += ")"
+            column_lines.append(column_line)
+
+        output.append(",\n".join(column_lines))
+        output.append("]")
+        return output
+
+    def schema_header(self) -> str:
+        """The first lines of the schema description."""
+        return f"[DB_ID] {self.db_name}\n[Schema]"
+
+    def iter_schema(
+        self,
+        cache_path: Optional[str] = None,
+        skip_tables: Optional[Iterable[str]] = None,
+    ) -> Iterator[Tuple[str, str]]:
+        """
+        Generate the schema description table by table.
+
+        Tables are sampled concurrently by `workers` threads, with at most
+        a few tables per worker sampled ahead of the consumer, and yielded
+        in the order of `usable_tables`. A table whose sampling takes longer
+        than `table_timeout` is described without examples. Per-table timings
+        are kept in `self.timings`.
+
+        Args:
+            cache_path: Cache of table descriptions. Tables whose fingerprint
+                is unchanged since the last run are taken from the cache
+                instead of being reflected (PostgreSQL) and sampled again.
+            skip_tables: Tables to leave out, e.g. those already written by
+                an interrupted run
+
+        Yields:
+            Tuples of table name and its description (lines joined by "\\n")
+        """
+        skip = set(skip_tables or [])
+        tables = [t for t in self.usable_tables if t not in skip]
+        started_at = time.perf_counter()
+        cache = SchemaCache(cache_path, self._cache_settings()) if cache_path else None
+        cached: Dict[str, Dict[str, Any]] = {}
+        # On PostgreSQL the catalog tells unchanged tables without reflecting them
+        fingerprints = self._catalog_fingerprints() if cache else {}
+        if fingerprints:
+            for table_name in tables:
+                entry = cache.get(table_name, fingerprints.get(table_name))
+                if entry:
+                    cached[table_name] = entry
+        reflected = self._reflect_tables([t for t in tables if t not in cached])
+        if cache and not fingerprints:
+            for table_name, info in reflected.items():
+                fingerprints[table_name] = info_fingerprint(info)
+                entry = cache.get(table_name, fingerprints[table_name])
+                if entry:
+                    cached[table_name] = entry
+        reflect_ms = (time.perf_counter() - started_at) * 1000
+        self.phases = {"catalog_ms": reflect_ms}
+        if self.progress:
+            print(f"Reflected {len(reflected)} tables in {reflect_ms:.0f} ms")
+            if cache:
+                print(
+                    f"Schema cache: {len(cached)} unchanged tables, "
+                    f"{len(tables) - len(cached)} to regenerate"
+                )
 
-                column_line += ")"
-                column_lines.append(column_line)
+        to_sample = {t: info for t, info in reflected.items() if t not in cached}
+        if self.sample_strategy == "pg_stats" and to_sample:
+            stats_started = time.perf_counter()
+            profiles = self._read_pg_stats(list(to_sample))
+            self.phases["pg_stats_ms"] = (time.perf_counter() - stats_started) * 1000
+            for table_name, columns in profiles.items():
+                to_sample[table_name]["profiles"] = columns
+            if self.progress:
+                print(
+                    f"Profiled {len(profiles)} tables from pg_stats, sampling "
+                    f"{len(to_sample) - len(profiles)} unanalyzed tables"
+                )
+        started: Dict[str, float] = {}
+        self.timings = {
+            t: {"sample_ms": 0.0, "status": "cached", "rows": 0} for t in cached
+        }
+        self.rows_read = {}
+        done = [0]
+        lock = threading.Lock()
+
+        def report(table_name: str, future: Future) -> None:
+            if future.cancelled():
+                return
+            sample_ms = (time.perf_counter() - started[table_name]) * 1000
+            status = "ok" if future.exception() is None else "error"
+            with lock:
+                if table_name in self.timings:
+                    # Already reported as timed out
+                    return
+                self.timings[table_name] = {
+                    "sample_ms": sample_ms,
+                    "status": status,
+                    "rows": self.rows_read.get(table_name, 0),
+                }
+                done[0] += 1
+                if self.progress:
+                    print(
+                        f"[{done[0]}/{len(to_sample)}] {table_name}: "
+                        f"sampled in {sample_ms:.0f} ms"
+                    )
+
+        executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="schema"
+        )
+        futures = {}
+        pending = iter(to_sample.items())
+
+        def submit_next() -> None:
+            # Tables are submitted in output order, a bounded window ahead, so
+            # samples of thousands of tables are not all held in memory
+            item = next(pending, None)
+            if item is not None:
+                table_name, info = item
+                future = executor.submit(self._sample_table, table_name, info, started)
+                future.add_done_callback(functools.partial(report, table_name))
+                futures[table_name] = future
+
+        for _ in range(self.workers * 4):
+            submit_next()
+
+        self.table_info = {}
+        try:
+            for table_name in tables:
+                if table_name in cached:
+                    self.table_info[table_name] = cached[table_name]["info"]
+                    yield table_name, cached[table_name]["fragment"]
+                    continue
+                if table_name not in to_sample:
+                    continue
+                info = to_sample[table_name]
+                try:
+                    samples = self._wait_for_samples(
+                        table_name, futures.pop(table_name), started
+                    )
+                except FutureTimeoutError:
+                    print(
+                        f"Sampling {table_name} timed out after "
+                        f"{self.table_timeout}s, omitting examples"
+                    )
+                    with lock:
+                        self.timings[table_name] = {
+                            "sample_ms": self.table_timeout * 1000,
+                            "status": "timeout",
+                            "rows": None,
+                        }
+                    samples = None
+                submit_next()
+                fragment = "\n".join(
+                    self._format_table(table_name, info, samples or {})
+                )
+                info["examples"] = {
+                    column: [str(value) for value in values]
+                    for column, values in (samples or {}).items()
+                    if values
+                }
+                self.table_info[table_name] = info
+                # Timed out tables are sampled again on the next run
+                if cache and samples is not None and table_name in fingerprints:
+                    cache.put(table_name, fingerprints[table_name], fragment, info)
+                yield table_name, fragment
+        finally:
+            # Do not wait for timed out tables
+            executor.shutdown(wait=False, cancel_futures=True)
+            # Also after an interruption, to keep the finished tables
+            if cache:
+                cache.save(keep=self.usable_tables)
+
+        self.phases["total_ms"] = (time.perf_counter() - started_at) * 1000
+        if self.progress:
+            total_ms = self.phases["total_ms"]
+            print(
+                f"Generated schema of {len(self.table_info)} tables in {total_ms:.0f} ms"
+            )
 
-            output.append(",\n".join(column_lines))
-            output.append("]")
+    def generate_schema(self, cache_path: Optional[str] = None) -> str:
+        """
+        Generate the schema description.
 
+        See `iter_schema`, which yields it table by table.
+        """
+        output = [self.schema_header()]
+        output.extend(fragment for _, fragment in self.iter_schema(cache_path))
         return "\n".join(output)
 
-    def save_schema(self, output_path: str):
-        """Save the schema to a file."""
-        schema_str = self.generate_schema()
-        with open(output_path, "w") as f:
-            f.write(schema_str)
+    def save_schema(self, output_path: str, artifact_path: Optional[str] = None):
+        """
+        Save the schema to a file, writing it table by table.
+
+        Progress is checkpointed in `<output_path>.checkpoint`, so a run that
+        was interrupted resumes after the last table it wrote. With
+        `incremental`, table descriptions are also cached in
+        `<output_path>.cache.json` and only changed tables are regenerated.
+
+        Args:
+            output_path: Path of the text schema
+            artifact_path: Also save the structured artifact there (see
+                `save_artifact`)
+        """
+        cache_path = f"{output_path}.cache.json" if self.incremental else None
+        checkpoint_path = f"{output_path}.checkpoint"
+        written, offset = self._read_checkpoint(checkpoint_path, output_path)
+
+        if offset is None:
+            written = {}
+            # Binary, so offsets are byte positions
+            f = open(output_path, "wb")
+            f.write(self.schema_header().encode("utf-8"))
+            f.flush()
+            checkpoint = open(checkpoint_path, "w", encoding="utf-8")
+            checkpoint.write(
+                json.dumps(
+                    {"settings": self._checkpoint_settings(), "offset": f.tell()}
+                )
+                + "\n"
+            )
+        else:
+            print(f"Resuming after {len(written)} tables written to {output_path}")
+            f = open(output_path, "r+b")
+            # Drop a partly written table
+            f.truncate(offset)
+            f.seek(offset)
+            checkpoint = open(checkpoint_path, "a", encoding="utf-8")
+
+        with f, checkpoint:
+            for table_name, fragment in self.iter_schema(cache_path, written):
+                f.write(("\n" + fragment).encode("utf-8"))
+                f.flush()
+                line = {
+                    "table": table_name,
+                    "offset": f.tell(),
+                    "info": serializable_info(self.table_info[table_name]),
+                }
+                checkpoint.write(json.dumps(line, default=str) + "\n")
+                checkpoint.flush()
+        os.remove(checkpoint_path)
+        # Tables of the interrupted run, in output order
+        if written:
+            self.table_info = {
+                t: written.get(t) or self.table_info[t]
+                for t in self.usable_tables
+                if t in written or t in self.table_info
+            }
         print(f"Schema saved to {output_path}")
+        if artifact_path:
+            self.save_artifact(artifact_path)
+
+    def _checkpoint_settings(self) -> Dict[str, Any]:
+        """What a checkpoint is only valid for."""
+        return {
+            "db_name": self.db_name,
+            "tables": len(self.usable_tables),
+            **self._cache_settings(),
+        }
+
+    def _read_checkpoint(
+        self, checkpoint_path: str, output_path: str
+    ) -> Tuple[Dict[str, Dict[str, Any]], Optional[int]]:
+        """
+        The tables an interrupted `save_schema` already wrote.
+
+        Returns:
+            Dict of written table name to its table info, and the size of the
+            output up to the last written table; None if there is no usable
+            checkpoint and the output must be written from the start
+        """
+        if not (os.path.exists(checkpoint_path) and os.path.exists(output_path)):
+            return {}, None
+        written = {}
+        try:
+            with open(checkpoint_path, "r", encoding="utf-8") as f:
+                header = json.loads(f.readline())
+                offset = header["offset"]
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # The last line was cut off by the interruption
+                        break
+                    written[entry["table"]] = entry["info"]
+                    offset = entry["offset"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable checkpoint {checkpoint_path}: {e}")
+            return {}, None
+        if header.get("settings") != self._checkpoint_settings():
+            print(f"Settings changed since {checkpoint_path}, starting over")
+            return {}, None
+        if os.path.getsize(output_path) < offset:
+            return {}, None
+        return written, offset
+
+    def save_artifact(self, output_path: str):
+        """
+        Save the structured schema artifact (tables, columns, types, keys,
+        examples and profiles), which agents load instead of parsing text.
+
+        The schema is generated first unless `generate_schema` already ran.
+        A path ending with `.msgpack` is written as MessagePack, others as JSON.
+        """
+        if not self.table_info:
+            self.generate_schema()
+        artifact = build_artifact(
+            self.db_name, self.engine.dialect.name, self.table_info
+        )
+        write_artifact(artifact, output_path)
+        print(f"Schema artifact saved to {output_path}")
 
     def parse_schema(self, schema_file: str, output_file: str):
         """Parse the schema from a file."""
         table_schemas = {}
+        table_name = None
+        flag = False
 
         with open(schema_file, "r") as f:
             schema = f.read()
@@ -190,7 +879,7 @@ class SchemaGenerator:
                 elif line.startswith("]"):
                     flag = False
                     continue
-                elif flag:
+                elif flag and table_name is not None:
                     table_schemas[table_name].append(line)
 
         # save to table_schemas.json (utf-8)
@@ -0,0 +1,34 @@
+import pytest
+
+from app.config import (
+    AppConfig,
+    ArtifactSettings,
+    LLMSettings,
+    QueryStatsSettings,
+    RollupSettings,
+    config,
+)
+from app.tools import database
+
+
+@pytest.fixture(autouse=True)
+def app_config(tmp_path, monkeypatch):
+    """A configuration without a config file, writing only below `tmp_path`.
+
+    Tests register their databases in `app_config.databases`.
+    """
+    settings = AppConfig(
+        # Clients are only built, never called
+        llm={
+            "default": LLMSettings(
+                model="test", base_url="http://localhost:9", api_key="test"
+            )
+        },
+        query_stats=QueryStatsSettings(enabled=False),
+        rollups=RollupSettings(registry_path=str(tmp_path / "rollups.json")),
+        artifacts=ArtifactSettings(enabled=False, directory=str(tmp_path / "files")),
+    )
+    monkeypatch.setattr(config, "_config", settings)
+    # Database tools of targets are cached per name
+    monkeypatch.setattr(database, "_targets", {})
+    return settings
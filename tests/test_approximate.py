@@ -0,0 +1,41 @@
+import pandas as pd
+import pytest
+
+from app.config import DatabaseSettings
+from app.tools.approximate import approximate_query
+from app.tools.database import get_db_tool
+
+duckdb = pytest.importorskip("duckdb")
+
+
+@pytest.fixture
+def db(app_config, tmp_path):
+    path = tmp_path / "shop.duckdb"
+    with duckdb.connect(str(path)) as con:
+        con.execute(
+            "CREATE TABLE orders AS SELECT i % 3 AS u, i AS amount "
+            "FROM range(1000) AS t(i)"
+        )
+    app_config.databases["shop"] = DatabaseSettings(
+        backend="duckdb", path=str(path), max_rows=1
+    )
+    return get_db_tool("shop")
+
+
+def test_full_sample_matches_exact_result(db):
+    sql = (
+        "SELECT u, COUNT(*), SUM(amount), AVG(amount) FROM orders GROUP BY u ORDER BY u"
+    )
+
+    result = approximate_query(db, sql, percent=100, method="bernoulli")
+    exact = db.execute_query(sql, max_rows=0)["data"]
+
+    assert list(result["data"].columns) == [
+        "u",
+        "count_star()",
+        "sum(amount)",
+        "avg(amount)",
+    ]
+    pd.testing.assert_frame_equal(result["data"], exact, check_dtype=False)
+    # A full sample has no sampling error
+    assert (result["error_bounds"].fillna(0) == 0).all().all()
@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+
+from app.config import ArtifactSettings
+from app.tools.artifact_writer import ArtifactWriter
+
+pytest.importorskip("pyarrow")
+
+
+@pytest.fixture
+def writer(tmp_path):
+    writer = ArtifactWriter(ArtifactSettings(directory=str(tmp_path)))
+    yield writer
+    writer.close()
+
+
+def test_results_and_sql_are_written_in_the_background(writer, tmp_path):
+    path = writer.write_df("result", pd.DataFrame({"n": [1]}))
+    # Replaces the queued content, or is written after it
+    writer.write_df("result", pd.DataFrame({"n": [1, 2]}))
+    writer.write_text("result.sql", "SELECT n FROM t")
+
+    assert writer.flush(timeout=5)
+    assert path == tmp_path / "result.parquet"
+    assert pd.read_parquet(path)["n"].tolist() == [1, 2]
+    assert (tmp_path / "result.sql").read_text() == "SELECT n FROM t"
+    stats = writer.stats()
+    assert stats["written"] + stats["replaced"] == 3
+    assert stats["failed"] == 0
+
+
+def test_mixed_type_columns_fall_back_to_csv(writer, tmp_path):
+    writer.write_df("mixed", pd.DataFrame({"value": [1, "a"]}))
+
+    assert writer.flush(timeout=5)
+    assert pd.read_csv(tmp_path / "mixed.csv")["value"].tolist() == ["1", "a"]
+    assert not (tmp_path / "mixed.parquet").exists()
+
+
+def test_disabled_writer_writes_nothing(tmp_path):
+    writer = ArtifactWriter(ArtifactSettings(enabled=False, directory=str(tmp_path)))
+
+    assert writer.write_df("result", pd.DataFrame({"n": [1]})) is None
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,59 @@
+import threading
+import time
+
+import pytest
+from psycopg2 import extensions
+
+from app.tools.connection_pool import ConnectionPool, PoolTimeoutError
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+
+    def close(self):
+        self.closed = 1
+
+    def get_transaction_status(self):
+        return extensions.TRANSACTION_STATUS_IDLE
+
+    def rollback(self):
+        pass
+
+
+def test_checkout_times_out_when_exhausted():
+    pool = ConnectionPool(FakeConnection, min_size=0, max_size=1, timeout=0.05)
+    conn = pool.getconn()
+
+    with pytest.raises(PoolTimeoutError):
+        pool.getconn()
+    pool.putconn(conn)
+    assert pool.getconn() is conn
+
+
+def test_discarded_connections_are_replaced_in_the_background():
+    release = threading.Event()
+    connects = []
+
+    def connect():
+        connects.append(1)
+        if len(connects) > 2:
+            # Reconnecting is slow, e.g. while the server restarts
+            release.wait(5)
+        return FakeConnection()
+
+    pool = ConnectionPool(connect, min_size=2, max_size=4)
+    conn = pool.getconn()
+
+    started = time.monotonic()
+    pool.putconn(conn, discard=True)
+    assert time.monotonic() - started < 1
+    assert pool.metrics()["connections_discarded"] == 1
+
+    release.set()
+    for _ in range(100):
+        if pool.metrics()["idle"] == 2:
+            break
+        time.sleep(0.01)
+    assert pool.metrics()["size"] == 2
+    assert pool.metrics()["connections_created"] == 3
@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+
+from app.config import DatabaseSettings
+from app.tools.database import get_db_tool
+from app.tools.fanout import FanoutExecutor
+
+duckdb = pytest.importorskip("duckdb")
+
+ROWS = [(1, "a", 10), (2, "b", 5), (3, "a", 7), (4, "c", 1), (5, "b", None)]
+
+
+@pytest.fixture
+def shards(app_config, tmp_path):
+    """Two DuckDB shards of an orders table, and the whole table as "all"."""
+    parts = {"s0": ROWS[:2], "s1": ROWS[2:], "all": ROWS}
+    for name, rows in parts.items():
+        path = tmp_path / f"{name}.duckdb"
+        with duckdb.connect(str(path)) as con:
+            con.execute("CREATE TABLE orders (id INTEGER, u VARCHAR, amount INTEGER)")
+            con.executemany("INSERT INTO orders VALUES (?, ?, ?)", rows)
+        app_config.databases[name] = DatabaseSettings(backend="duckdb", path=str(path))
+    return ["s0", "s1"]
+
+
+def test_aggregate_merge_matches_single_database(shards):
+    sql = (
+        "SELECT u, COUNT(*), SUM(amount), AVG(amount) FROM orders GROUP BY u ORDER BY u"
+    )
+
+    result = FanoutExecutor().execute_query(sql, shards)
+    expected = get_db_tool("all").execute_query(sql)["data"]
+
+    assert result["status"] == "success"
+    assert result["merge"] == "aggregate"
+    pd.testing.assert_frame_equal(result["data"], expected, check_dtype=False)
+
+
+def test_max_rows_applies_after_merging(shards):
+    sql = "SELECT u, SUM(amount) AS total FROM orders GROUP BY u ORDER BY total DESC"
+
+    result = FanoutExecutor().execute_query(sql, shards, max_rows=1)
+
+    # "a" has rows on both shards, capped partials would lose one of them
+    assert result["data"].values.tolist() == [["a", 17]]
+    assert result["truncated"]
+    assert result["total_rows_estimate"] == 3
+
+
+def test_union_order_by_unselected_column_fails_without_running(shards):
+    sql = "SELECT id FROM orders ORDER BY amount"
+
+    result = FanoutExecutor().execute_query(sql, ["s0", "missing"])
+
+    assert result["status"] == "error"
+    assert result["message"].startswith("Query cannot be merged across shards")
+    assert result["shards"] == []
+
+
+def test_union_sorts_and_limits_merged_rows(shards):
+    sql = "SELECT id, amount FROM orders ORDER BY amount DESC NULLS LAST LIMIT 2"
+
+    result = FanoutExecutor().execute_query(sql, shards)
+
+    assert result["merge"] == "union"
+    assert result["data"].values.tolist() == [[1, 10], [3, 7]]
@@ -0,0 +1,55 @@
+from app.tools.join_graph import describe_joins
+from app.tools.schema_catalog import SchemaCatalog
+
+
+def _table(name, *foreign_keys):
+    return {
+        "name": name,
+        "columns": [],
+        "foreign_keys": [
+            {"columns": [column], "referred_table": table, "referred_columns": ["id"]}
+            for column, table in foreign_keys
+        ],
+    }
+
+
+def _graph():
+    catalog = SchemaCatalog.from_artifact(
+        {
+            "tables": [
+                _table("users"),
+                _table("orders", ("user_id", "users")),
+                _table("products"),
+                _table(
+                    "order_items", ("order_id", "orders"), ("product_id", "products")
+                ),
+                _table("employees", ("manager_id", "employees")),
+                _table("logs", ("shop_id", "shops")),
+            ]
+        }
+    )
+    return catalog.join_graph
+
+
+def test_tables_are_joined_through_link_tables():
+    tables, edges = _graph().connect(["users", "products"])
+
+    assert tables == ["users", "products", "orders", "order_items"]
+    assert describe_joins(edges) == "\n".join(
+        [
+            "- users JOIN orders ON users.id = orders.user_id",
+            "- orders JOIN order_items ON orders.id = order_items.order_id",
+            "- order_items JOIN products ON order_items.product_id = products.id",
+        ]
+    )
+
+
+def test_unconnected_tables_are_kept_without_joins():
+    graph = _graph()
+
+    # Self references and keys to unknown tables are no joins
+    assert graph.shortest_path("employees", "users") is None
+    assert graph.connect(["users", "logs", "orders"]) == (
+        ["users", "logs", "orders"],
+        graph.shortest_path("users", "orders"),
+    )
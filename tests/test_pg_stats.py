@@ -0,0 +1,35 @@
+from schema_generator.pg_stats import column_profile, parse_pg_array
+
+
+def test_array_literals_are_split():
+    assert parse_pg_array('{1,"a b","say \\"hi\\"",NULL}') == [
+        "1",
+        "a b",
+        'say "hi"',
+        None,
+    ]
+    assert parse_pg_array(None) == []
+
+
+def test_profile_uses_common_values_then_histogram():
+    profile = column_profile(
+        null_frac=0.1,
+        n_distinct=-0.5,
+        most_common_vals="{paid}",
+        histogram_bounds="{a,b,c,d,e}",
+        reltuples=1000,
+        max_samples=3,
+    )
+
+    # Negative n_distinct is a fraction of the rows
+    assert profile["n_distinct"] == 500
+    assert profile["min"] == "a"
+    assert profile["max"] == "e"
+    assert profile["examples"] == ["paid", "a", "c"]
+
+
+def test_profile_of_unanalyzed_table():
+    profile = column_profile(None, -1.0, None, None, reltuples=-1)
+
+    assert profile["n_distinct"] is None
+    assert profile["examples"] == []
@@ -0,0 +1,84 @@
+import io
+from datetime import date
+from decimal import Decimal
+
+import pandas as pd
+import pytest
+
+from app.tools import pg_types
+from app.tools.pg_types import compact_dataframe, parse_copy_csv, to_native_dtypes
+
+# cursor.description entries: (name, type OID)
+DESCRIPTION = [
+    ("id", 20),
+    ("amount", 1700),
+    ("paid", 16),
+    ("note", 25),
+    ("created_at", 1114),
+]
+
+COPY_OUTPUT = (
+    b"1,12.50,t,hello,2026-10-19 10:00:00\n"
+    b'2,\\N,f,"",2026-10-19 11:30:00\n'
+    b"\\N,3,\\N,\\N,\\N\n"
+)
+
+
+@pytest.fixture(params=["pyarrow", "pandas"])
+def parser(request, monkeypatch):
+    if request.param == "pandas":
+        monkeypatch.setattr(pg_types, "pa", None)
+    elif pg_types.pa is None:
+        pytest.skip("pyarrow is not installed")
+
+
+def test_copy_csv_types(parser):
+    df = parse_copy_csv(io.BufferedReader(io.BytesIO(COPY_OUTPUT)), DESCRIPTION)
+
+    assert str(df["id"].dtype) == "Int64"
+    assert df["id"].tolist()[:2] == [1, 2] and df["id"].isna().tolist()[2]
+    assert df["amount"].dtype == "float64"
+    assert df["paid"].tolist()[:2] == [True, False]
+    assert pd.api.types.is_datetime64_dtype(df["created_at"])
+    # NULL and the empty string stay apart
+    assert df["note"].tolist()[1] == ""
+    assert df["note"].isna().tolist() == [False, False, True]
+
+
+def test_copy_csv_without_rows(parser):
+    df = parse_copy_csv(io.BufferedReader(io.BytesIO(b"")), DESCRIPTION)
+
+    assert df.empty
+    assert list(df.columns) == [name for name, _ in DESCRIPTION]
+
+
+def test_psycopg2_objects_become_native_dtypes():
+    df = pd.DataFrame(
+        [[Decimal("1.50"), 3, True, date(2026, 10, 19)], [None, None, None, None]],
+        columns=["amount", "n", "paid", "day"],
+    ).astype(object)
+
+    df = to_native_dtypes(
+        df, [("amount", 1700), ("n", 23), ("paid", 16), ("day", 1082)]
+    )
+
+    assert df["amount"].dtype == "float64"
+    assert str(df["n"].dtype) == "Int64"
+    assert str(df["paid"].dtype) == "boolean"
+    assert pd.api.types.is_datetime64_dtype(df["day"])
+    assert df.isna().sum().tolist() == [1, 1, 1, 1]
+
+
+def test_compact_dataframe_uses_categories_for_repeated_strings():
+    df = pd.DataFrame(
+        {
+            "source": ["支付宝", "微信"] * 50,
+            "order_no": [f"N{i}" for i in range(100)],
+        }
+    ).astype(object)
+
+    df, saved = compact_dataframe(df, category_threshold=0.5)
+
+    assert isinstance(df["source"].dtype, pd.CategoricalDtype)
+    assert not isinstance(df["order_no"].dtype, pd.CategoricalDtype)
+    assert saved > 0
@@ -0,0 +1,15 @@
+from app.config import DatabaseSettings, PGSettings
+from app.tools.backends.postgres_backend import PostgresBackend
+
+
+def test_unreachable_server_is_an_error_result():
+    # Nothing listens on the discard port
+    pg = PGSettings(
+        host="127.0.0.1", port=9, user="agent", password="", database="shop"
+    )
+    backend = PostgresBackend(DatabaseSettings(backend="postgres"), pg)
+
+    result = backend.execute("SELECT 1")
+
+    assert result["status"] == "error"
+    assert "127.0.0.1" in result["message"]
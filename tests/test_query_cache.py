@@ -0,0 +1,57 @@
+import time
+
+import pandas as pd
+
+from app.tools.query_cache import QueryCache, cache_key
+
+SQL = "SELECT id, amount FROM orders"
+
+
+def _result():
+    return {
+        "status": "success",
+        "data": pd.DataFrame({"id": [1, 2], "amount": [10.0, None]}),
+        "query": SQL,
+        "message": "ok",
+    }
+
+
+def test_cached_result_until_its_table_changes():
+    cache = QueryCache()
+    key = cache_key(SQL)
+
+    assert cache.put(key, SQL, _result(), cache.epoch())
+    cached = cache.get(key)
+    assert cached["cached"]
+    pd.testing.assert_frame_equal(cached["data"], _result()["data"])
+
+    assert cache.invalidate("orders") == 1
+    assert cache.get(key) is None
+
+
+def test_poll_invalidates_changed_tables():
+    cache = QueryCache()
+    key = cache_key(SQL)
+    cache.put(key, SQL, _result())
+    counters = iter([{"orders": 1}, {"orders": 2}])
+
+    cache.start_polling(lambda: next(counters, {"orders": 2}), interval=0.01)
+    time.sleep(0.2)
+
+    assert cache.get(key) is None
+    cache.close()
+
+
+def test_poll_waits_after_failures():
+    cache = QueryCache()
+    calls = []
+
+    def fail():
+        calls.append(time.monotonic())
+        raise ConnectionError("server closed the connection")
+
+    cache.start_polling(fail, interval=0.1)
+    time.sleep(0.35)
+    cache.close()
+
+    assert 1 <= len(calls) <= 5
@@ -0,0 +1,39 @@
+import pytest
+
+from app.config import QueryStatsSettings
+from app.tools.query_stats import QueryStatsStore, load_stats
+
+
+def test_fingerprints_group_literals():
+    store = QueryStatsStore(QueryStatsSettings())
+    store.record("SELECT * FROM orders WHERE id = 1", 5.0, rows=1)
+    store.record("select *  from orders where id = 42", 15.0, rows=1)
+    store.record("SELECT * FROM users", 1.0, error=True)
+
+    rows = {row["example"]: row for row in store.snapshot(sort_by="calls")}
+
+    orders = rows["SELECT * FROM orders WHERE id = 1"]
+    assert orders["calls"] == 2
+    assert orders["p50_ms"] == 10.0
+    assert rows["SELECT * FROM users"]["error_rate"] == 1.0
+
+
+def test_processes_sharing_a_file_merge_percentiles(tmp_path):
+    settings = QueryStatsSettings(path=str(tmp_path / "stats.sqlite"))
+    # Two stores stand for two processes
+    fast, slow = QueryStatsStore(settings), QueryStatsStore(settings)
+    for _ in range(90):
+        fast.record("SELECT COUNT(*) FROM orders", 10.0)
+    for _ in range(10):
+        slow.record("SELECT COUNT(*) FROM orders", 1000.0)
+    fast.close()
+    slow.close()
+    # Flushes add only what was recorded since the last one
+    slow.record("SELECT COUNT(*) FROM orders", 1000.0)
+    slow.flush()
+
+    [row] = load_stats(tmp_path / "stats.sqlite")
+
+    assert row["calls"] == 101
+    assert row["p50_ms"] == pytest.approx(10.0, rel=0.1)
+    assert row["p95_ms"] == pytest.approx(1000.0, rel=0.1)
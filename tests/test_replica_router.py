@@ -0,0 +1,97 @@
+import pytest
+from psycopg2 import extensions
+
+from app.config import DatabaseSettings
+from app.tools.connection_pool import ConnectionPool
+from app.tools.database import get_db_tool
+from app.tools.replica_router import PRIMARY, ReplicaRouter
+
+
+class FakeCursor:
+    def __init__(self, lag):
+        self.lag = lag
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql):
+        pass
+
+    def fetchone(self):
+        return True, self.lag
+
+
+class FakeConnection:
+    def __init__(self, lag=0.0):
+        self.lag = lag
+        self.closed = 0
+
+    def cursor(self):
+        return FakeCursor(self.lag)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+    def get_transaction_status(self):
+        return extensions.TRANSACTION_STATUS_IDLE
+
+
+def _pool(lag=0.0, max_size=2):
+    return ConnectionPool(lambda: FakeConnection(lag), min_size=0, max_size=max_size)
+
+
+@pytest.fixture
+def router():
+    router = ReplicaRouter(
+        _pool(),
+        {"fresh": _pool(lag=0.5), "behind": _pool(lag=120.0)},
+        max_lag=30.0,
+        check_interval=60.0,
+    )
+    for name in router.replicas:
+        router.check(name)
+    yield router
+    router.close()
+
+
+def test_reads_go_to_a_replica_within_the_lag_bound(router):
+    assert router.choose()[0] == "fresh"
+    assert not router.check("behind")
+
+
+def test_failed_replica_falls_back_to_the_primary(router):
+    router.mark_failed("fresh", ConnectionError("gone"))
+
+    assert router.choose()[0] == PRIMARY
+    # The next successful health check routes to it again
+    assert router.check("fresh")
+    assert router.choose()[0] == "fresh"
+
+
+def test_saturated_replicas_fall_back_to_the_primary(router):
+    pool = router.replicas["fresh"].pool
+    held = [pool.getconn(), pool.getconn()]
+
+    assert router.choose()[0] == PRIMARY
+    for conn in held:
+        pool.putconn(conn)
+
+
+def test_named_targets(app_config, tmp_path):
+    app_config.databases["reports"] = DatabaseSettings(
+        backend="sqlite", path=str(tmp_path / "reports.db")
+    )
+
+    assert get_db_tool("reports") is get_db_tool("reports")
+    assert get_db_tool("reports").settings.backend == "sqlite"
+    with pytest.raises(ValueError):
+        get_db_tool("missing")
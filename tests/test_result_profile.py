@@ -0,0 +1,15 @@
+import pandas as pd
+
+from app.tools.result_profile import profile_dataframe
+
+
+def test_profile_repeated_column_names():
+    # e.g. SELECT o.id, u.id ... of a join
+    data = pd.DataFrame([[1, 2, "x"], [3, 4, "y"]], columns=["id", "id", "name"])
+
+    profile = profile_dataframe(data)
+
+    assert "Rows: 2, Columns: 3" in profile
+    assert "- id (int64): nulls 0.0%, min 1, max 3" in profile
+    assert "- id #2 (int64): nulls 0.0%, min 2, max 4" in profile
+    assert "- name (" in profile
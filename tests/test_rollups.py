@@ -0,0 +1,63 @@
+import pandas as pd
+import pytest
+
+from app.config import DatabaseSettings
+from app.tools.database import get_db_tool
+from app.tools.rollups import RollupManager, RollupSpec
+from app.tools.sql_shapes import parse_aggregate
+
+duckdb = pytest.importorskip("duckdb")
+
+
+@pytest.fixture
+def rollups(app_config, tmp_path):
+    path = tmp_path / "shop.duckdb"
+    with duckdb.connect(str(path)) as con:
+        con.execute("CREATE TABLE orders (status VARCHAR, amount INTEGER)")
+        con.execute(
+            "INSERT INTO orders VALUES ('paid', 10), ('paid', 5), ('open', NULL)"
+        )
+    app_config.databases["shop"] = DatabaseSettings(backend="duckdb", path=str(path))
+    manager = RollupManager()
+    query = parse_aggregate(
+        "SELECT status, COUNT(*), SUM(amount), AVG(amount) FROM orders GROUP BY status"
+    )
+    manager.create(
+        RollupSpec(
+            name="rollup_orders_status",
+            table="orders",
+            dimensions=query.dimensions,
+            measures=query.base_measures(),
+        ),
+        target="shop",
+    )
+    return manager
+
+
+def test_rollup_count_of_empty_filter_is_zero(rollups):
+    sql = "SELECT COUNT(*) AS n FROM orders WHERE status = 'refunded'"
+    rewritten, entry = rollups.rewrite(sql, target="shop")
+    db = get_db_tool("shop")
+
+    original = db.execute_query(sql)["data"]
+    result = db.execute_query(rewritten)["data"]
+
+    assert entry.name == "rollup_orders_status"
+    assert result["n"].tolist() == original["n"].tolist() == [0]
+    assert result["n"].dtype.kind == "i"
+
+
+def test_rollup_keeps_duckdb_column_names(rollups):
+    sql = (
+        "SELECT status, COUNT(*), SUM(amount), AVG(amount) AS mean FROM orders "
+        "GROUP BY status ORDER BY status"
+    )
+    rewritten, _ = rollups.rewrite(sql, target="shop")
+    db = get_db_tool("shop")
+
+    original = db.execute_query(sql)["data"]
+    result = db.execute_query(rewritten)["data"]
+
+    assert list(original.columns) == ["status", "count_star()", "sum(amount)", "mean"]
+    assert list(result.columns) == list(original.columns)
+    pd.testing.assert_frame_equal(result, original, check_dtype=False)
@@ -0,0 +1,50 @@
+import sqlite3
+
+import pytest
+
+from app.tools.result_profile import estimate_tokens
+from app.tools.schema_catalog import load_schema_catalog
+from schema_generator.schema_generator import SchemaGenerator
+
+
+@pytest.fixture
+def catalog_path(tmp_path):
+    db_path = tmp_path / "shop.db"
+    with sqlite3.connect(db_path) as connection:
+        connection.executescript("""
+            CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT);
+            CREATE TABLE orders (
+                id INTEGER PRIMARY KEY,
+                user_id INTEGER REFERENCES users(id),
+                status TEXT
+            );
+            INSERT INTO users VALUES (1, 'ann'), (2, 'bob');
+            INSERT INTO orders VALUES (1, 1, 'paid'), (2, 2, 'open');
+            """)
+    path = str(tmp_path / "schema.json")
+    SchemaGenerator(f"sqlite:///{db_path}").save_artifact(path)
+    return path
+
+
+def test_artifact_is_loaded_and_rendered(catalog_path):
+    catalog = load_schema_catalog(catalog_path)
+
+    assert catalog.table_names == ["main.orders", "main.users"]
+    assert load_schema_catalog(catalog_path) is catalog
+    full = catalog.render_table("main.orders", "full")
+    assert "- status: TEXT, examples: [paid, open]" in full
+    assert "- foreign key (user_id) references main.users(id)" in full
+
+
+def test_rendering_fits_the_token_budget(catalog_path):
+    catalog = load_schema_catalog(catalog_path)
+    compact = catalog.render_table("main.orders", "compact")
+
+    # Steps down to the compact level when the full one does not fit
+    assert catalog.render_table("main.orders", "full", estimate_tokens(compact)) == (
+        compact
+    )
+    assert "user_id INTEGER -> main.users.id" in compact
+    truncated = catalog.render_table("main.orders", "full", 16)
+    assert truncated.endswith("more columns)")
+    assert estimate_tokens(truncated) < estimate_tokens(compact)
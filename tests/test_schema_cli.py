@@ -0,0 +1,39 @@
+import json
+import sqlite3
+
+import pytest
+
+from schema_generator.__main__ import main, normalize_db_url
+
+
+def test_urls_and_files_are_normalized(tmp_path):
+    assert normalize_db_url("postgres://u@host/db") == "postgresql://u@host/db"
+    assert normalize_db_url("mysql://u@host/db") == "mysql://u@host/db"
+    path = tmp_path / "shop.duckdb"
+    assert normalize_db_url(str(path)) == f"duckdb:///{path}"
+    with pytest.raises(ValueError):
+        normalize_db_url("shop.csv")
+
+
+def test_cli_writes_artifact_and_profile(tmp_path, capsys):
+    db_path = tmp_path / "shop.db"
+    with sqlite3.connect(db_path) as connection:
+        connection.executescript("""
+            CREATE TABLE orders (id INTEGER PRIMARY KEY, status TEXT);
+            CREATE TABLE skipped (id INTEGER);
+            INSERT INTO orders VALUES (1, 'paid'), (2, 'open');
+            """)
+    output = tmp_path / "schema.json"
+
+    code = main(
+        [str(db_path), "--format", "json", "-o", str(output)]
+        + ["--ignore", "main.skipped", "--profile"]
+    )
+
+    assert code == 0
+    artifact = json.loads(output.read_text(encoding="utf-8"))
+    assert artifact["dialect"] == "sqlite"
+    assert [t["name"] for t in artifact["tables"]] == ["main.orders"]
+    printed = capsys.readouterr().out
+    assert "sqlite database shop.db: 1 tables, sampling with limit" in printed
+    assert "Total: " in printed and "1 tables, 2 rows read" in printed
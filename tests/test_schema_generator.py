@@ -0,0 +1,151 @@
+import sqlite3
+import threading
+
+import pytest
+from sqlalchemy import event
+
+from schema_generator.schema_generator import SchemaGenerator
+
+
+@pytest.fixture
+def shop_url(tmp_path):
+    path = tmp_path / "shop.db"
+    connection = sqlite3.connect(path)
+    connection.executescript("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT);
+        CREATE TABLE orders (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER REFERENCES users(id),
+            status TEXT
+        );
+        INSERT INTO users VALUES (1, 'ann'), (2, 'bob'), (3, NULL);
+        INSERT INTO orders VALUES (1, 1, 'paid'), (2, 1, 'paid'), (3, 2, 'open');
+        """)
+    connection.commit()
+    connection.close()
+    return f"sqlite:///{path}"
+
+
+def test_tables_are_reflected_in_bulk(shop_url, monkeypatch):
+    generator = SchemaGenerator(shop_url)
+
+    def per_table(*args):
+        raise AssertionError("reflected table by table")
+
+    monkeypatch.setattr(generator, "_reflect_table", per_table)
+    tables = generator._reflect_tables()
+
+    assert list(tables) == ["main.orders", "main.users"]
+    orders = tables["main.orders"]
+    assert [c["name"] for c in orders["columns"]] == ["id", "user_id", "status"]
+    assert orders["pk_columns"] == {"id"}
+    assert orders["foreign_keys"] == [
+        {
+            "columns": ["user_id"],
+            "referred_schema": "main",
+            "referred_table": "users",
+            "referred_columns": ["id"],
+        }
+    ]
+
+
+def test_table_is_sampled_with_one_query(shop_url):
+    generator = SchemaGenerator(shop_url)
+    columns = generator._reflect_tables()["main.users"]["columns"]
+    statements = []
+    event.listen(
+        generator.engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+
+    samples = generator.get_table_samples("main.users", columns, max_samples=2)
+
+    assert len(statements) == 1
+    assert samples == {"id": [1, 2], "name": ["ann", "bob"]}
+    assert generator.rows_read["main.users"] == 3
+
+
+def test_tables_are_sampled_concurrently_in_order(shop_url, monkeypatch):
+    generator = SchemaGenerator(shop_url, workers=2)
+    sample = generator.get_table_samples
+    # Only passes if both tables are sampled at the same time
+    barrier = threading.Barrier(2, timeout=5)
+
+    def concurrent_sample(*args):
+        barrier.wait()
+        return sample(*args)
+
+    monkeypatch.setattr(generator, "get_table_samples", concurrent_sample)
+    tables = [table for table, _ in generator.iter_schema()]
+
+    assert tables == generator.usable_tables
+    assert {t: timing["status"] for t, timing in generator.timings.items()} == {
+        "main.orders": "ok",
+        "main.users": "ok",
+    }
+
+
+def test_slow_table_is_described_without_examples(shop_url, monkeypatch):
+    generator = SchemaGenerator(shop_url, workers=2, table_timeout=0.2)
+    sample = generator.get_table_samples
+    release = threading.Event()
+
+    def slow_sample(table_name, *args):
+        if table_name == "main.users":
+            release.wait(5)
+        return sample(table_name, *args)
+
+    monkeypatch.setattr(generator, "get_table_samples", slow_sample)
+    try:
+        fragments = dict(generator.iter_schema())
+    finally:
+        release.set()
+
+    assert generator.timings["main.users"]["status"] == "timeout"
+    assert "Examples" not in fragments["main.users"]
+    assert "Examples: [paid, open]" in fragments["main.orders"]
+
+
+def test_unchanged_tables_come_from_the_cache(shop_url, tmp_path):
+    cache_path = str(tmp_path / "schema.cache.json")
+    first = SchemaGenerator(shop_url).generate_schema(cache_path)
+
+    generator = SchemaGenerator(shop_url)
+    assert generator.generate_schema(cache_path) == first
+    assert {t["status"] for t in generator.timings.values()} == {"cached"}
+
+    with sqlite3.connect(shop_url[len("sqlite:///") :]) as connection:
+        connection.execute("ALTER TABLE users ADD COLUMN email TEXT")
+    generator = SchemaGenerator(shop_url)
+    schema = generator.generate_schema(cache_path)
+
+    assert generator.timings["main.orders"]["status"] == "cached"
+    assert generator.timings["main.users"]["status"] == "ok"
+    assert "(email: TEXT" in schema
+
+
+def test_interrupted_save_resumes_from_the_checkpoint(shop_url, tmp_path, monkeypatch):
+    output = tmp_path / "schema.txt"
+    expected = SchemaGenerator(shop_url).generate_schema()
+
+    generator = SchemaGenerator(shop_url)
+    format_table = generator._format_table
+
+    def interrupted(table_name, *args):
+        if table_name == "main.users":
+            raise KeyboardInterrupt
+        return format_table(table_name, *args)
+
+    monkeypatch.setattr(generator, "_format_table", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        generator.save_schema(str(output))
+    assert (tmp_path / "schema.txt.checkpoint").exists()
+
+    generator = SchemaGenerator(shop_url)
+    generator.save_schema(str(output))
+
+    assert output.read_text(encoding="utf-8") == expected
+    assert list(generator.timings) == ["main.users"]
+    assert list(generator.table_info) == ["main.orders", "main.users"]
+    assert not (tmp_path / "schema.txt.checkpoint").exists()
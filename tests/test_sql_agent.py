@@ -0,0 +1,37 @@
+import threading
+
+from app.agents.sql_agent import SQLAgent
+
+
+def test_failed_refinement_stops_refining(monkeypatch):
+    def fail(self, sql_code, approximate=False, cancel=None):
+        raise ConnectionError("server closed the connection")
+
+    monkeypatch.setattr(SQLAgent, "_execute_sql", fail)
+    agent = SQLAgent(schema_artifact="")
+
+    agent._start_refinement("SELECT 1")
+    for thread in threading.enumerate():
+        if thread.name == "sql-refine":
+            thread.join(timeout=5)
+
+    assert not agent.memory.refining
+
+
+def test_only_named_tables_are_matched():
+    agent = SQLAgent(
+        schema_artifact="",
+        table_schema={
+            "public.orders": "",
+            "public.users": "",
+            "public.order_items": "",
+        },
+    )
+
+    response = "Orders\npublic.user\nnone, the orders table, `order_items`"
+
+    assert agent._match_table_names(response) == [
+        "public.orders",
+        "public.users",
+        "public.order_items",
+    ]
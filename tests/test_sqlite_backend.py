@@ -0,0 +1,51 @@
+import threading
+
+from app.config import DatabaseSettings
+from app.tools.backends.sqlite_backend import SQLiteBackend
+
+
+def _in_thread(function):
+    results = []
+    thread = threading.Thread(target=lambda: results.append(function()))
+    thread.start()
+    thread.join()
+    return results[0]
+
+
+def test_threads_share_the_in_memory_database():
+    backend = SQLiteBackend(DatabaseSettings(backend="sqlite"))
+    backend.execute_write(
+        ["CREATE TABLE orders (id INTEGER)", "INSERT INTO orders VALUES (1), (2)"]
+    )
+
+    result = _in_thread(lambda: backend.execute("SELECT COUNT(*) AS n FROM orders"))
+
+    assert result["status"] == "success"
+    assert result["data"]["n"].tolist() == [2]
+    backend.close()
+
+
+def test_read_only_refuses_writes(tmp_path):
+    backend = SQLiteBackend(
+        DatabaseSettings(backend="sqlite", path=str(tmp_path / "shop.db"))
+    )
+    backend.execute_write(["CREATE TABLE orders (id INTEGER)"])
+
+    result = backend.execute("INSERT INTO orders VALUES (1)")
+
+    assert result["status"] == "error"
+    assert result["error_type"] == "read_only"
+    backend.close()
+
+
+def test_connections_of_exited_threads_are_closed(tmp_path):
+    backend = SQLiteBackend(
+        DatabaseSettings(backend="sqlite", path=str(tmp_path / "shop.db"))
+    )
+    for _ in range(5):
+        _in_thread(lambda: backend.execute("SELECT 1"))
+
+    backend.execute("SELECT 1")
+
+    assert len(backend._connections) == 1
+    backend.close()
@@ -0,0 +1,36 @@
+import subprocess
+import sys
+
+import pytest
+
+from app.config import PROJECT_ROOT
+from app.startup import lazy_import
+
+CHECK_IMPORT = """
+import sys
+import app.agents
+from app.config import config
+from app.tools.database import db_tool
+
+assert config._config is None, "config was loaded"
+assert db_tool._backend is None, "the database was connected"
+assert "matplotlib" not in sys.modules, "matplotlib was imported"
+openai = sys.modules.get("openai")
+assert openai is None or type(openai).__name__ == "_LazyModule", "openai was loaded"
+"""
+
+
+def test_importing_agents_has_no_side_effects():
+    proc = subprocess.run(
+        [sys.executable, "-c", CHECK_IMPORT],
+        capture_output=True,
+        text=True,
+        cwd=PROJECT_ROOT,
+    )
+
+    assert proc.returncode == 0, proc.stderr
+
+
+def test_lazy_import_of_missing_module():
+    with pytest.raises(ImportError):
+        lazy_import("no_such_module_here")
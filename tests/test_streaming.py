@@ -0,0 +1,48 @@
+import pandas as pd
+import pytest
+
+from app.config import DatabaseSettings
+from app.tools.database import DatabaseTool
+
+
+@pytest.fixture(params=["sqlite", "duckdb"])
+def db(request, tmp_path):
+    if request.param == "duckdb":
+        pytest.importorskip("duckdb")
+    db = DatabaseTool(
+        DatabaseSettings(
+            backend=request.param, path=str(tmp_path / f"shop.{request.param}")
+        )
+    )
+    db.execute_write(
+        [
+            "CREATE TABLE orders (id INTEGER, amount INTEGER)",
+            "INSERT INTO orders VALUES (1, 10), (2, 20), (3, 30), (4, 40), (5, 50)",
+        ]
+    )
+    yield db
+    db.close()
+
+
+def test_row_cap_reports_truncation(db):
+    result = db.execute_query("SELECT * FROM orders ORDER BY id", max_rows=2)
+
+    assert result["data"]["id"].tolist() == [1, 2]
+    assert result["truncated"]
+    assert result["total_rows_estimate"] == 5
+
+
+def test_uncapped_result_is_complete(db):
+    result = db.execute_query("SELECT * FROM orders", max_rows=5)
+
+    assert len(result["data"]) == 5
+    assert not result["truncated"]
+
+
+def test_stream_yields_all_rows_in_chunks(db):
+    chunks = list(db.stream_query("SELECT * FROM orders ORDER BY id", batch_size=2))
+
+    if db.settings.backend == "sqlite":
+        assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    # DuckDB fetches whole vectors of 2048 rows
+    assert pd.concat(chunks)["amount"].tolist() == [10, 20, 30, 40, 50]
@@ -0,0 +1,54 @@
+import threading
+
+import pytest
+
+from app.config import DatabaseSettings
+from app.tools.backends.base import QueryTimeoutError
+from app.tools.database import DatabaseTool
+
+SLOW_SQLITE = (
+    "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) "
+    "SELECT SUM(i) FROM n"
+)
+SLOW_DUCKDB = "SELECT SUM(a.range * b.range) FROM range(200000) a, range(200000) b"
+
+
+@pytest.fixture(params=["sqlite", "duckdb"])
+def slow(request, tmp_path):
+    if request.param == "duckdb":
+        pytest.importorskip("duckdb")
+    db = DatabaseTool(
+        DatabaseSettings(
+            backend=request.param,
+            path=str(tmp_path / f"shop.{request.param}"),
+            statement_timeout=0.2,
+        )
+    )
+    yield db, SLOW_SQLITE if request.param == "sqlite" else SLOW_DUCKDB
+    db.close()
+
+
+def test_statement_timeout(slow):
+    db, sql = slow
+
+    result = db.execute_query(sql)
+
+    assert result["status"] == "error"
+    assert result["error_type"] == "timeout"
+
+
+def test_cancel(slow):
+    db, sql = slow
+    cancel = threading.Event()
+    threading.Timer(0.1, cancel.set).start()
+
+    result = db.execute_query(sql, timeout=0, cancel=cancel)
+
+    assert result["error_type"] == "cancelled"
+
+
+def test_stream_timeout(slow):
+    db, sql = slow
+
+    with pytest.raises(QueryTimeoutError):
+        list(db.stream_query(sql))
@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+from app.config import DatabaseSettings, TracingSettings
+from app.tools.database import DatabaseTool
+from app.tracing import OTLPJsonExporter, Tracer, sql_fingerprint, tracer
+
+
+class Collector:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+
+def test_nested_spans_share_the_trace(tmp_path):
+    spans = Collector()
+    local = Tracer(TracingSettings(enabled=False))
+    local.add_exporter(spans)
+    local.add_exporter(OTLPJsonExporter(tmp_path / "spans.otlp.json"))
+
+    with local.span("agent.run", agent="SQLAgent") as root:
+        with pytest.raises(ValueError):
+            with local.span("sql_agent.generate"):
+                raise ValueError("no SQL")
+
+    child, parent = spans.spans
+    assert parent is root and parent.parent_id is None
+    assert child.parent_id == root.span_id
+    assert child.trace_id == root.trace_id
+    assert child.status == "error" and child.error == "ValueError: no SQL"
+
+    lines = (tmp_path / "spans.otlp.json").read_text().splitlines()
+    otlp = json.loads(lines[0])["resourceSpans"][0]["scopeSpans"][0]["spans"][0]
+    assert otlp["parentSpanId"] == root.span_id
+    assert otlp["status"]["code"] == 2
+
+
+def test_database_queries_get_spans(monkeypatch, tmp_path):
+    spans = Collector()
+    monkeypatch.setattr(tracer, "_exporters", [spans])
+    db = DatabaseTool(
+        DatabaseSettings(backend="sqlite", path=str(tmp_path / "shop.db"))
+    )
+
+    with tracer.span("agent.run") as root:
+        db.execute_query("SELECT 1 AS x")
+
+    [query] = [span for span in spans.spans if span.name == "db.execute"]
+    assert query.parent_id == root.span_id
+    assert query.attributes["sql_fingerprint"] == sql_fingerprint("SELECT 2 AS x")
+    assert query.attributes["rows"] == 1
+    db.close()
+
+
+def test_sql_fingerprint_ignores_literals():
+    assert sql_fingerprint("SELECT * FROM t WHERE id = 1") == sql_fingerprint(
+        "select * from t where id = 99"
+    )
+    assert sql_fingerprint("SELECT * FROM t") != sql_fingerprint("SELECT * FROM u")